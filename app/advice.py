@@ -0,0 +1,248 @@
+"""
+Tax advice module.
+
+This module requests tax advice from the OpenAI chat model through the asynchronous
+`advice_client`, for prompts built by `app.prompt_builder`. Map-reduce prompts first
+have their chunks summarized in parallel. Completed advice is kept in `advice_cache`,
+keyed by the model and the prompt, so that repeated requests for unchanged entries do
+not call the model again.
+
+Incremental prompts first get the advice on every entry (or summary line) from the
+advice store, and only the pieces missing there are sent to the model, in concurrent
+batches of ADVICE_BATCH_SIZE pieces. The overall advice is then requested from the
+pieces. A write clears `advice_cache` but not the store, so the next request costs
+one batched call for the changed entries and one call for the overall advice,
+rather than a pass over every entry.
+
+Attributes:
+    ADVICE_MODEL (str): The chat model used for advice, read from the `OPENAI_MODEL`
+                        environment variable.
+    advice_cache (AdviceCache): The cache of completed advice, configured from the
+                                `ADVICE_CACHE_*` environment variables.
+    ADVICE_BATCH_SIZE (int): The number of pieces advised on by one call in incremental
+                             mode, read from the `ADVICE_BATCH_SIZE` environment variable.
+"""
+
+import asyncio  # Module used to run the map phase concurrently
+import os  # Module for interacting with the operating system
+from typing import AsyncIterator, Callable  # Type hints for the streamed advice and the session factory
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+from starlette.concurrency import run_in_threadpool  # Runs the advice store queries off the event loop
+
+from .advice_cache import AdviceCache
+from .advice_store import load_pieces, piece_key, store_pieces
+from .changes import on_data_change
+from .database import SessionLocal
+from .llm_client import advice_client
+from .prompt_builder import AdvicePrompt, PIECE_PREFIX, batch_prompt, parse_batch_advice, pieces_prompt
+
+# Chat model used to generate the advice
+ADVICE_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+# Instructions given to the model before the entries
+SYSTEM_PROMPT = "You are a tax advisor."
+
+# Cache of completed advice, shared by every request of the worker
+advice_cache = AdviceCache(
+    max_entries=int(os.getenv("ADVICE_CACHE_SIZE", "128")),
+    ttl=float(os.getenv("ADVICE_CACHE_TTL", "3600")),
+    path=os.getenv("ADVICE_CACHE_PATH") or None,
+)
+
+# Advice computed from the previous entries is not served after a write
+on_data_change(advice_cache.clear)
+
+# Number of pieces advised on by one call in incremental mode
+ADVICE_BATCH_SIZE = int(os.getenv("ADVICE_BATCH_SIZE", "20"))
+
+
+def build_messages(prompt: str) -> list[dict]:
+    """
+    Build the chat messages sent to the model for a prompt.
+
+    Args:
+        prompt (str): The prompt built from the entries.
+
+    Returns:
+        list[dict]: The system instructions followed by the prompt.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _with_session(session_factory: Callable[[], Session], function, *args):
+    """
+    Call a function of the advice store with a new database session.
+
+    Args:
+        session_factory (Callable): A factory returning new database sessions.
+        function (Callable): The function, called with the session followed by `args`.
+
+    Returns:
+        The result of the function.
+    """
+    with session_factory() as db:
+        return function(db, *args)
+
+
+async def advise_pieces(texts: list[str], model: str, session_factory: Callable[[], Session]) -> dict[str, str | None]:
+    """
+    Return the advice on every piece, from the advice store or from the model.
+
+    The pieces missing from the store are sent to the model in concurrent batches of
+    ADVICE_BATCH_SIZE pieces, and the advice of the reply is stored. Pieces the reply
+    does not number are not stored, so they are sent again by the next request.
+
+    Args:
+        texts (list[str]): The text of every piece.
+        model (str): The chat model to use.
+        session_factory (Callable): A factory returning new database sessions.
+
+    Returns:
+        dict[str, str | None]: The advice on every piece, keyed by its text, None if the model gave none.
+    """
+    keys = {text: piece_key(model, PIECE_PREFIX + text) for text in texts}
+    stored = await run_in_threadpool(_with_session, session_factory, load_pieces, keys.values())
+
+    missing = [text for text, key in keys.items() if key not in stored]
+    batches = [missing[start:start + ADVICE_BATCH_SIZE] for start in range(0, len(missing), ADVICE_BATCH_SIZE)]
+    replies = await asyncio.gather(*(
+        advice_client.complete(model, build_messages(batch_prompt(batch))) for batch in batches
+    ))
+
+    new_pieces = {}
+    for batch, reply in zip(batches, replies):
+        for text, advice in zip(batch, parse_batch_advice(reply, len(batch))):
+            if advice is not None:
+                new_pieces[keys[text]] = advice
+    await run_in_threadpool(_with_session, session_factory, store_pieces, model, new_pieces)
+    stored.update(new_pieces)
+    return {text: stored.get(key) for text, key in keys.items()}
+
+
+async def summarize_chunks(chunks: list[str], model: str, session_factory: Callable[[], Session]) -> list[str]:
+    """
+    Return the summary of every chunk of an incremental prompt, from the advice store or from the model.
+
+    Args:
+        chunks (list[str]): The map prompts.
+        model (str): The chat model to use.
+        session_factory (Callable): A factory returning new database sessions.
+
+    Returns:
+        list[str]: The summary of every chunk.
+    """
+    keys = [piece_key(model, chunk) for chunk in chunks]
+    stored = await run_in_threadpool(_with_session, session_factory, load_pieces, keys)
+
+    missing = [index for index, key in enumerate(keys) if key not in stored]
+    summaries = await asyncio.gather(*(
+        advice_client.complete(model, build_messages(chunks[index])) for index in missing
+    ))
+    new_pieces = {keys[index]: summary for index, summary in zip(missing, summaries)}
+    await run_in_threadpool(_with_session, session_factory, store_pieces, model, new_pieces)
+    stored.update(new_pieces)
+    return [stored[key] for key in keys]
+
+
+async def resolve_prompt(
+    advice_prompt: AdvicePrompt,
+    model: str = ADVICE_MODEL,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> str:
+    """
+    Return the prompt asking for advice, running the map phase of map-reduce prompts.
+
+    The chunks of a map-reduce prompt are summarized by concurrent calls, within the
+    concurrency limit of the advice client. Incremental prompts get the advice on
+    their pieces first, and the chunks of the pieces are summarized through the
+    advice store when the pieces are over the token budget.
+
+    Args:
+        advice_prompt (AdvicePrompt): The prompt built from the entries.
+        model (str): The chat model to use. Default is ADVICE_MODEL.
+        session_factory (Callable): A factory returning sessions of the database
+            holding the advice store. Default is SessionLocal.
+
+    Returns:
+        str: The prompt to send for the advice.
+    """
+    if advice_prompt.mode == "incremental":
+        advice = await advise_pieces([text for _, text in advice_prompt.units], model, session_factory)
+        overall_prompt = pieces_prompt(advice_prompt.text, advice_prompt.units, advice)
+        if not overall_prompt.chunks:
+            return overall_prompt.text
+        summaries = await summarize_chunks(overall_prompt.chunks, model, session_factory)
+        return overall_prompt.reduce_prompt(summaries)
+
+    if not advice_prompt.chunks:
+        return advice_prompt.text
+    summaries = await asyncio.gather(*(
+        advice_client.complete(model, build_messages(chunk)) for chunk in advice_prompt.chunks
+    ))
+    return advice_prompt.reduce_prompt(summaries)
+
+
+async def get_advice(
+    advice_prompt: AdvicePrompt,
+    model: str = ADVICE_MODEL,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> str:
+    """
+    Return the advice for a prompt from the cache, requesting it from the model on a miss.
+
+    The model is called through the shared asynchronous client, so waiting for the
+    completion does not block the event loop.
+
+    Args:
+        advice_prompt (AdvicePrompt): The prompt built from the entries.
+        model (str): The chat model to use. Default is ADVICE_MODEL.
+        session_factory (Callable): A factory returning sessions of the database
+            holding the advice store. Default is SessionLocal.
+
+    Returns:
+        str: The advice for the prompt.
+    """
+    key = advice_cache.make_key(model, advice_prompt.cache_text)
+    advice = await advice_cache.aget(key)
+    if advice is None:
+        prompt = await resolve_prompt(advice_prompt, model, session_factory)
+        advice = await advice_client.complete(model, build_messages(prompt))
+        await advice_cache.aset(key, advice)
+    return advice
+
+
+async def stream_advice(
+    advice_prompt: AdvicePrompt,
+    model: str = ADVICE_MODEL,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> AsyncIterator[str]:
+    """
+    Stream the advice for a prompt as the model generates it.
+
+    Cached advice is sent as a single piece. Advice streamed to completion is added
+    to the cache, so the full render and the streaming mode share their results.
+
+    Args:
+        advice_prompt (AdvicePrompt): The prompt built from the entries.
+        model (str): The chat model to use. Default is ADVICE_MODEL.
+        session_factory (Callable): A factory returning sessions of the database
+            holding the advice store. Default is SessionLocal.
+
+    Yields:
+        str: The pieces of the advice text.
+    """
+    key = advice_cache.make_key(model, advice_prompt.cache_text)
+    advice = await advice_cache.aget(key)
+    if advice is not None:
+        yield advice
+        return
+
+    prompt = await resolve_prompt(advice_prompt, model, session_factory)
+    pieces = []
+    async for piece in advice_client.stream(model, build_messages(prompt)):
+        pieces.append(piece)
+        yield piece
+    await advice_cache.aset(key, "".join(pieces).strip())
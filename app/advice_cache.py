@@ -0,0 +1,270 @@
+"""
+Advice cache module.
+
+This module provides `AdviceCache`, a two tier cache for completed advice. The first
+tier is an in-process LRU dictionary whose entries expire after a time to live. The
+optional second tier is a SQLite file, which survives restarts and is shared by every
+worker process that points at the same path. With a shared cache (`SHARED_CACHE_URL`),
+advice missing from both is also looked up there, so advice completed by one worker or
+machine is served by the others. The cache counts its hits and misses so that its
+effectiveness can be checked at runtime.
+
+The keys hash the prompt, which holds the entries it was built from, so advice is
+never served for other entries than its own. `clear` only frees the memory and disk
+tiers of a worker after a write; the entries of the shared cache expire on their own.
+"""
+
+import hashlib  # Module used to hash the cache keys
+import sqlite3  # Module used for the on-disk tier
+import threading  # Module used to protect the in-process tier
+import time  # Module used for the expiry times
+from collections import OrderedDict  # Ordered dictionary used for the LRU order
+from contextlib import closing, contextmanager  # Helpers closing the connections of the on-disk tier
+from typing import Iterator  # Type hint for the connection context manager
+from starlette.concurrency import run_in_threadpool  # Runs the disk and shared cache I/O off the event loop
+
+from .changes import get_shared_cache
+
+
+class AdviceCache:
+    """
+    Two tier LRU and TTL cache of advice text.
+
+    Attributes:
+        max_entries (int): The number of entries kept in memory before the least
+                           recently used one is evicted.
+        ttl (float): The number of seconds an entry stays valid.
+        path (str, optional): The SQLite file of the on-disk tier, or None to keep
+                              the cache in memory only.
+        hits (int): The number of lookups answered from memory.
+        disk_hits (int): The number of lookups answered from the on-disk tier.
+        shared_hits (int): The number of lookups answered from the shared cache.
+        misses (int): The number of lookups not found in any tier.
+        evictions (int): The number of entries evicted from memory.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: float = 3600, path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # Maps a key to a tuple (expires_at, value)
+        self._lock = threading.Lock()
+
+        if self.path:
+            with self._connect() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS advice_cache "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        """
+        Build the cache key of a prompt sent to a model.
+
+        Args:
+            model (str): The name of the model.
+            prompt (str): The prompt sent to the model.
+
+        Returns:
+            str: The SHA-256 hex digest of the model and the prompt.
+        """
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the on-disk tier for one transaction.
+
+        Yields:
+            sqlite3.Connection: A new connection, with a busy timeout so that
+                concurrent workers wait for each other instead of failing. The
+                transaction is committed, or rolled back on an error, and the
+                connection is closed afterwards.
+        """
+        # The context manager of a sqlite3 connection ends the transaction but does not close it
+        with closing(sqlite3.connect(self.path, timeout=5)) as connection:
+            with connection:
+                yield connection
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        """
+        Store an entry in memory, evicting the least recently used entries if full.
+
+        Must be called with the lock held.
+        """
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_memory(self, key: str, now: float) -> str | None:
+        """
+        Look up an entry in memory, counting a hit.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _get_stored(self, key: str, now: float) -> str | None:
+        """
+        Look up an entry on disk and in the shared cache, counting a hit or a miss.
+
+        Does blocking I/O, so coroutines call it through `aget`.
+        """
+        if self.path:
+            with self._connect() as connection:
+                row = connection.execute(
+                    "SELECT value, expires_at FROM advice_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            if row is not None:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                return row[0]
+
+        shared = get_shared_cache()
+        if shared is not None:
+            value = shared.get("advice:" + key)
+            if value is not None:
+                # The shared cache does not tell the remaining lifetime, a full one is given in memory
+                with self._lock:
+                    self._remember(key, value, now + self.ttl)
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _has_stored_tiers(self) -> bool:
+        """
+        Return whether entries are also kept outside of the memory of the process.
+        """
+        return bool(self.path) or get_shared_cache() is not None
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up an entry, first in memory, then on disk and in the shared cache.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The cached value, or None if it is missing or expired.
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        return self._get_stored(key, now)
+
+    async def aget(self, key: str) -> str | None:
+        """
+        Look up an entry from a coroutine, like `get`.
+
+        The in-memory tier is read on the event loop, the disk and the shared cache in
+        the threadpool, so a slow or locked disk does not stall the other requests.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The cached value, or None if it is missing or expired.
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        if not self._has_stored_tiers():
+            with self._lock:
+                self.misses += 1
+            return None
+        return await run_in_threadpool(self._get_stored, key, now)
+
+    def _set_stored(self, key: str, value: str, expires_at: float):
+        """
+        Store an entry on disk and in the shared cache.
+
+        Does blocking I/O, so coroutines call it through `aset`.
+        """
+        if self.path:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO advice_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                # Expired rows are removed lazily, whenever a new entry is written
+                connection.execute("DELETE FROM advice_cache WHERE expires_at <= ?", (time.time(),))
+
+        shared = get_shared_cache()
+        if shared is not None:
+            shared.set("advice:" + key, value, self.ttl)
+
+    def set(self, key: str, value: str):
+        """
+        Store an entry in every tier.
+
+        Args:
+            key (str): The cache key.
+            value (str): The value to cache.
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        self._set_stored(key, value, expires_at)
+
+    async def aset(self, key: str, value: str):
+        """
+        Store an entry in every tier from a coroutine, like `set`, writing the disk and
+        the shared cache in the threadpool.
+
+        Args:
+            key (str): The cache key.
+            value (str): The value to cache.
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self._has_stored_tiers():
+            await run_in_threadpool(self._set_stored, key, value, expires_at)
+
+    def clear(self):
+        """
+        Remove every entry from memory and disk. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM advice_cache")
+
+    def stats(self) -> dict:
+        """
+        Return the counters and the size of the in-memory tier.
+
+        Returns:
+            dict: The hits, disk hits, shared hits, misses, evictions and in-memory entry count.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,99 @@
+"""
+Advice store module.
+
+This module persists the advice given on single entries, or on buckets of entries
+for larger tables, in the `advice_pieces` table. A piece is keyed by a hash of the
+model and of the text it advises on, so an entry that did not change since the
+previous advice request is not sent to the model again: after a write, only the new
+or changed entries (or the buckets they fall in) cost a model call.
+
+Pieces older than ADVICE_PIECE_TTL are deleted when new pieces are stored, so the
+table does not keep the advice of long deleted entries, and advice on unchanged
+entries is renewed from time to time.
+
+Attributes:
+    ADVICE_PIECE_TTL (float): Number of seconds a stored piece stays valid, read from
+                              the `ADVICE_PIECE_TTL` environment variable.
+"""
+
+import hashlib  # Module used to hash the advised content into the keys
+import os  # Module for interacting with the operating system
+import time  # Module used to timestamp the pieces
+from typing import Iterable  # Type hint for the keys
+from sqlalchemy import delete, select  # Core statements of the store
+from sqlalchemy.dialects import postgresql, sqlite  # Dialects supporting INSERT ... ON CONFLICT
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .models import AdvicePiece
+
+# Seconds a stored piece stays valid, 30 days by default
+ADVICE_PIECE_TTL = float(os.getenv("ADVICE_PIECE_TTL", str(30 * 24 * 3600)))
+
+# Number of keys looked up per query, below the bound parameter limit of SQLite
+LOOKUP_BATCH_SIZE = 500
+
+
+def piece_key(model: str, text: str) -> str:
+    """
+    Compute the key of the advice of a model on a text.
+
+    Args:
+        model (str): The chat model.
+        text (str): The advised content.
+
+    Returns:
+        str: The hexadecimal SHA-256 hash of the model and the text.
+    """
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def load_pieces(db: Session, keys: Iterable[str], ttl: float = ADVICE_PIECE_TTL) -> dict[str, str]:
+    """
+    Read the stored advice of the given keys.
+
+    Args:
+        db (Session): The database session.
+        keys (Iterable[str]): The keys of the pieces.
+        ttl (float): The number of seconds a piece stays valid. Default is ADVICE_PIECE_TTL.
+
+    Returns:
+        dict[str, str]: The advice of every key found, keyed by key.
+    """
+    keys = list(dict.fromkeys(keys))
+    oldest = time.time() - ttl
+    pieces = {}
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        pieces.update(db.execute(
+            select(AdvicePiece.key, AdvicePiece.advice)
+            .where(AdvicePiece.key.in_(keys[start:start + LOOKUP_BATCH_SIZE]), AdvicePiece.created_at >= oldest)
+        ).all())
+    return pieces
+
+
+def store_pieces(db: Session, model: str, pieces: dict[str, str], ttl: float = ADVICE_PIECE_TTL):
+    """
+    Store new pieces of advice and delete the expired ones.
+
+    A piece stored meanwhile by another worker for the same key is kept.
+
+    Args:
+        db (Session): The database session.
+        model (str): The chat model that gave the advice.
+        pieces (dict[str, str]): The advice keyed by key.
+        ttl (float): The number of seconds a piece stays valid. Default is ADVICE_PIECE_TTL.
+    """
+    if not pieces:
+        return
+    now = time.time()
+    db.execute(delete(AdvicePiece).where(AdvicePiece.created_at < now - ttl))
+
+    rows = [{"key": key, "model": model, "advice": advice, "created_at": now} for key, advice in pieces.items()]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.execute(insert(AdvicePiece).on_conflict_do_nothing(index_elements=[AdvicePiece.key]), rows)
+    else:
+        # Generic fallback for backends without ON CONFLICT support
+        existing = set(load_pieces(db, pieces, ttl))
+        db.add_all(AdvicePiece(**row) for row in rows if row["key"] not in existing)
+    db.commit()
@@ -0,0 +1,329 @@
+"""
+Bulk ingestion module.
+
+This module loads batches of tax information entries into the database. Rows are
+parsed from JSON, NDJSON or CSV, validated per chunk with `validate_entries`, given
+their tax amount with `compute_tax_amount` and inserted with a single executemany
+statement per chunk. Rows that fail parsing or validation are reported back with
+their row number and do not abort the rest of the batch. On SQLite, the
+descriptions of a large chunk are added to the full-text index in one statement
+instead of by the insert trigger.
+
+Attributes:
+    BULK_CHUNK_SIZE (int): Number of rows inserted per transaction, read from the
+                           `BULK_CHUNK_SIZE` environment variable.
+"""
+
+import codecs  # Module used to decode streamed bytes incrementally
+import csv  # Module used to parse CSV uploads
+import json  # Module used to parse JSON and NDJSON rows
+import math  # Module used to reject infinite and NaN amounts
+import os  # Module for interacting with the operating system
+from typing import AsyncIterator, Iterable, Iterator  # Type hints for the row iterators
+from sqlalchemy import Connection, insert, text  # Core statements used for executemany
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+from starlette.concurrency import run_in_threadpool  # Runs the blocking inserts off the event loop
+
+from .migrations import FTS_PAUSE_TABLE, FTS_TABLE
+from .models import TaxInfo
+from .tax import compute_tax_amount
+from .totals import add_to_totals
+from .validation import validate_entries
+
+# Number of rows inserted per transaction
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "5000"))
+
+# Tax rate used when a row does not provide one, same as the submit form
+DEFAULT_TAX_RATE = 24.0
+
+# Number of rows from which a SQLite chunk fills the full-text index in one statement
+FTS_BATCH_MIN_ROWS = 1000
+
+
+class RowError(Exception):
+    """
+    Exception raised for a row that cannot be parsed.
+
+    Attributes:
+        detail (str): The description of the problem.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def parse_row(raw) -> dict:
+    """
+    Convert a raw JSON object or CSV record to the fields of an entry.
+
+    Args:
+        raw: The raw row, a dictionary with `income`, `expenses` and optional
+            `tax_rate` and `description` keys, or a RowError for a row that failed
+            to decode.
+
+    Returns:
+        dict: The income, expenses, tax rate and description of the entry.
+
+    Raises:
+        RowError: If the row is not an object or a field is missing or not a finite number.
+    """
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError("Row must be an object")
+
+    try:
+        income = float(raw["income"])
+        expenses = float(raw["expenses"])
+        tax_rate = raw.get("tax_rate")
+        tax_rate = DEFAULT_TAX_RATE if tax_rate in (None, "") else float(tax_rate)
+    except KeyError as e:
+        raise RowError(f"Missing field {e.args[0]}")
+    except (TypeError, ValueError):
+        raise RowError("income, expenses and tax_rate must be numbers")
+    # "inf" and "nan" parse as floats but cannot be added to the running totals
+    if not (math.isfinite(income) and math.isfinite(expenses) and math.isfinite(tax_rate)):
+        raise RowError("income, expenses and tax_rate must be finite numbers")
+
+    description = raw.get("description")
+    return {
+        "income": income,
+        "expenses": expenses,
+        "tax_rate": tax_rate,
+        "description": None if description in (None, "") else str(description),
+    }
+
+
+def insert_sqlite_batch(connection: Connection, mappings: list[dict]):
+    """
+    Insert a large chunk of entries into a SQLite database and index their descriptions at once.
+
+    Filling the full-text index from a trigger row by row costs several times the
+    insert itself. A row in the pause table turns the insert trigger off for the
+    chunk, the new rows are added to the full-text index with a single
+    INSERT ... SELECT, and the row is deleted again, all in the transaction of the
+    chunk. No other connection ever sees the pause, and unlike dropping the trigger
+    it changes no schema, so the statements cached by the other connections stay valid.
+
+    Args:
+        connection (Connection): The connection of the session, in a transaction.
+        mappings (list[dict]): The column values of the entries.
+    """
+    has_pause = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_PAUSE_TABLE}
+    ).first()
+    if not has_pause:
+        connection.execute(insert(TaxInfo.__table__), mappings)
+        return
+
+    # New rows get IDs above the largest one, whether or not the IDs autoincrement
+    last_id = connection.execute(text("SELECT coalesce(max(id), 0) FROM tax_info")).scalar()
+    connection.execute(text(f"INSERT INTO {FTS_PAUSE_TABLE} (paused) VALUES (1)"))
+    # Positional parameters are passed to the driver as they are, without being processed per row
+    columns = tuple(mappings[0])
+    connection.exec_driver_sql(
+        f"INSERT INTO tax_info ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        [tuple(row.values()) for row in mappings]
+    )
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, description) SELECT id, description FROM tax_info WHERE id > :last_id"),
+        {"last_id": last_id}
+    )
+    connection.execute(text(f"DELETE FROM {FTS_PAUSE_TABLE}"))
+
+
+def insert_mappings(db: Session, mappings: list[dict]):
+    """
+    Insert validated entries and add them to the running totals in one transaction.
+
+    Args:
+        db (Session): The database session.
+        mappings (list[dict]): The columns of every entry, with the amounts rounded
+            and the tax calculated.
+    """
+    # A Core executemany on the session's connection skips the ORM bookkeeping
+    connection = db.connection()
+    if connection.dialect.name == "sqlite" and len(mappings) >= FTS_BATCH_MIN_ROWS:
+        insert_sqlite_batch(connection, mappings)
+    else:
+        connection.execute(insert(TaxInfo.__table__), mappings)
+
+    # Update the running totals once per tax rate instead of once per row
+    groups = {}
+    for row in mappings:
+        group = groups.setdefault(row["tax_rate"], [0, 0.0, 0.0, 0.0])
+        group[0] += 1
+        group[1] += row["income"]
+        group[2] += row["expenses"]
+        group[3] += row["tax_amount"]
+    for tax_rate, (count, income, expenses, tax) in groups.items():
+        add_to_totals(db, tax_rate, income, expenses, tax, count=count)
+
+    db.commit()
+
+
+def insert_chunk(db: Session, rows: list, first_row: int = 1) -> tuple[int, list[dict]]:
+    """
+    Validate and insert one chunk of raw rows in a single transaction.
+
+    The valid rows are inserted with one executemany statement and added to the
+    running totals, grouped by tax rate, before the transaction is committed.
+
+    Args:
+        db (Session): The database session.
+        rows (list): The raw rows of the chunk.
+        first_row (int): The row number of the first row, used in error reports.
+
+    Returns:
+        tuple: The number of inserted rows and the list of row errors, each a
+            dictionary with the `row` number and the error `detail`.
+    """
+    errors = []
+    parsed = []
+    for offset, raw in enumerate(rows):
+        try:
+            parsed.append((first_row + offset, parse_row(raw)))
+        except RowError as e:
+            errors.append({"row": first_row + offset, "detail": e.detail})
+
+    invalid = validate_entries([fields for _, fields in parsed])
+    for index in sorted(invalid):
+        errors.append({"row": parsed[index][0], "detail": invalid[index]})
+
+    # Round the amounts and calculate the tax like the submit route does
+    mappings = [
+        {
+            "income": round(fields["income"], 2),
+            "expenses": round(fields["expenses"], 2),
+            "tax_amount": compute_tax_amount(fields["expenses"], fields["tax_rate"]),
+            "tax_rate": fields["tax_rate"],
+            "description": fields["description"],
+        }
+        for index, (_, fields) in enumerate(parsed)
+        if index not in invalid
+    ]
+    if mappings:
+        insert_mappings(db, mappings)
+
+    errors.sort(key=lambda error: error["row"])
+    return len(mappings), errors
+
+
+def ingest_rows(db: Session, rows: Iterable, chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Insert every row of an iterable, one chunk per transaction.
+
+    Args:
+        db (Session): The database session.
+        rows (Iterable): The raw rows.
+        chunk_size (int): The number of rows per transaction. Default is BULK_CHUNK_SIZE.
+
+    Returns:
+        dict: The number of `inserted` rows and the list of row `errors`.
+    """
+    inserted = 0
+    errors = []
+    chunk = []
+    first_row = 1
+    for raw in rows:
+        chunk.append(raw)
+        if len(chunk) >= chunk_size:
+            count, chunk_errors = insert_chunk(db, chunk, first_row)
+            inserted += count
+            errors.extend(chunk_errors)
+            first_row += len(chunk)
+            chunk = []
+    if chunk:
+        count, chunk_errors = insert_chunk(db, chunk, first_row)
+        inserted += count
+        errors.extend(chunk_errors)
+    return {"inserted": inserted, "errors": errors}
+
+
+def decode_ndjson_line(line: str):
+    """
+    Decode one line of an NDJSON stream.
+
+    Args:
+        line (str): The line to decode.
+
+    Returns:
+        The decoded row, or a RowError if the line is not valid JSON.
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        return RowError("Invalid JSON")
+
+
+def iter_ndjson(lines: Iterable[str]) -> Iterator:
+    """
+    Decode the rows of an NDJSON document, skipping blank lines.
+
+    Args:
+        lines (Iterable[str]): The lines of the document.
+
+    Yields:
+        The decoded rows, or a RowError for every line that is not valid JSON.
+    """
+    for line in lines:
+        if line.strip():
+            yield decode_ndjson_line(line)
+
+
+def iter_csv(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Decode the rows of a CSV document with a header line.
+
+    Args:
+        lines (Iterable[str]): The lines of the document.
+
+    Yields:
+        dict: The records keyed by the header names.
+    """
+    yield from csv.DictReader(lines)
+
+
+async def ingest_ndjson_stream(db: Session, chunks: AsyncIterator[bytes], chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Insert the rows of an NDJSON request body while it is being received.
+
+    Every full chunk of rows is inserted in the threadpool as soon as it has been
+    read, so the body never has to be held in memory as a whole.
+
+    Args:
+        db (Session): The database session.
+        chunks (AsyncIterator[bytes]): The request body as it arrives.
+        chunk_size (int): The number of rows per transaction. Default is BULK_CHUNK_SIZE.
+
+    Returns:
+        dict: The number of `inserted` rows and the list of row `errors`.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    result = {"inserted": 0, "errors": []}
+    pending = ""
+    batch = []
+    first_row = 1
+
+    async def flush():
+        nonlocal batch, first_row
+        count, errors = await run_in_threadpool(insert_chunk, db, batch, first_row)
+        result["inserted"] += count
+        result["errors"].extend(errors)
+        first_row += len(batch)
+        batch = []
+
+    async for data in chunks:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        batch.extend(iter_ndjson(lines))
+        if len(batch) >= chunk_size:
+            await flush()
+
+    # Decode the last line, which has no trailing newline
+    pending += decoder.decode(b"", final=True)
+    batch.extend(iter_ndjson([pending]))
+    if batch:
+        await flush()
+    return result
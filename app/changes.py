@@ -0,0 +1,125 @@
+"""
+Data change notification module.
+
+Caches built from the `tax_info` table register a listener here, and the write routes
+call `notify_data_change` after every committed change, so that each cache can drop
+the results computed from the previous data.
+
+With a shared cache (`SHARED_CACHE_URL`, see `app.shared_cache`), the notifications
+also reach the other worker processes: `notify_data_change` increments the data
+version of the shared cache, and `sync_data_changes`, called by the caches before
+they answer, calls the listeners if the version changed since the worker last saw
+it. As the writer commits before it increments the version, a worker reading the
+new version reads the new data too, so no worker serves results older than a write
+that was already acknowledged, at the cost of one read of the shared version per
+cache lookup.
+"""
+
+import threading  # Module used to protect the last seen version
+from typing import Callable  # Type hint for the listeners
+
+from .shared_cache import shared_cache
+
+# Name of the version counter of the tax information entries in the shared cache
+DATA_VERSION = "data"
+
+# Functions called after every committed change to the tax information entries
+_listeners: list[Callable[[], None]] = []
+
+# Shared cache carrying the notifications between the workers, None within a worker only
+_shared = shared_cache
+
+# Last data version of the shared cache seen by this worker
+_seen_version = None
+_lock = threading.Lock()
+
+
+def on_data_change(listener: Callable[[], None]) -> Callable[[], None]:
+    """
+    Register a function to call after every change to the tax information entries.
+
+    Can be used as a decorator.
+
+    Args:
+        listener (Callable): A function without arguments.
+
+    Returns:
+        Callable: The listener, unchanged.
+    """
+    _listeners.append(listener)
+    return listener
+
+
+def use_shared_cache(cache):
+    """
+    Replace the shared cache carrying the notifications. Used by the tests and benchmarks.
+
+    Args:
+        cache (SQLiteSharedCache | RedisSharedCache, optional): The shared cache, or
+            None to keep the notifications within the process.
+    """
+    global _shared, _seen_version
+    with _lock:
+        _shared = cache
+        _seen_version = None
+
+
+def get_shared_cache():
+    """
+    Return the shared cache carrying the notifications.
+
+    Returns:
+        SQLiteSharedCache | RedisSharedCache | None: The shared cache, or None if not configured.
+    """
+    return _shared
+
+
+def _see_version(version: int) -> bool:
+    """
+    Record a data version of the shared cache.
+
+    Returns:
+        bool: Whether the version is newer than the last one seen.
+    """
+    global _seen_version
+    with _lock:
+        # Versions only grow, a slower thread must not record an older one
+        if _seen_version is not None and version <= _seen_version:
+            return False
+        _seen_version = version
+        return True
+
+
+def _call_listeners():
+    """
+    Call every registered listener.
+    """
+    for listener in list(_listeners):
+        listener()
+
+
+def notify_data_change():
+    """
+    Call every registered listener and, with a shared cache, notify the other workers.
+    Used by the write routes after a commit.
+    """
+    shared = _shared
+    if shared is not None:
+        _see_version(shared.bump_version(DATA_VERSION))
+    _call_listeners()
+
+
+def sync_data_changes() -> int | None:
+    """
+    Call every registered listener if another worker changed the data since the last call.
+
+    Returns:
+        int: The current data version of the shared cache, or None without a shared cache.
+    """
+    shared = _shared
+    if shared is None:
+        return None
+    version = shared.get_version(DATA_VERSION)
+    if _see_version(version):
+        _call_listeners()
+    return version
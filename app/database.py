@@ -2,21 +2,40 @@
 Database configuration module.
 
 This module is responsible for setting up the database connection and ORM base class
-using SQLAlchemy. It also loads environment variables required for the database 
+using SQLAlchemy. It also loads environment variables required for the database
 configuration from a .env.local file.
 
+The engines are created with a profile that depends on the database backend:
+
+- SQLite: the connections use write-ahead logging, so readers never wait for the
+  writer, `synchronous=NORMAL`, which only syncs the log at checkpoints, and a busy
+  timeout. Writes go through a pool of a single connection whose transactions begin
+  with `BEGIN IMMEDIATE`, so concurrent writers of a process queue for that
+  connection instead of failing with "database is locked", and writers of other
+  processes wait for the lock instead of failing when upgrading a read. Reads use
+  a separate pool of read-only connections.
+- Server databases (PostgreSQL, MySQL, ...): a sized connection pool, with a
+  liveness check before a pooled connection is used and a maximum connection age.
+  Reads go to a replica if `DATABASE_READ_URL` is set.
+
 Attributes:
     BASEDIR (str): The base directory of the current file.
-    DATABASE_URL (str): The database URL, retrieved from environment variables or 
+    DATABASE_URL (str): The database URL, retrieved from environment variables or
                         defaulting to a SQLite database.
-    engine (Engine): SQLAlchemy engine created with the specified DATABASE_URL.
-    SessionLocal (sessionmaker): A sessionmaker factory bound to the engine, with 
+    DATABASE_READ_URL (str): The URL of the database used for reads, defaulting to
+                             DATABASE_URL.
+    engine (Engine): SQLAlchemy engine created with the specified DATABASE_URL, used
+                     for writes.
+    read_engine (Engine): SQLAlchemy engine used for reads.
+    SessionLocal (sessionmaker): A sessionmaker factory bound to the engine, with
                                  autocommit and autoflush settings.
+    ReadSessionLocal (sessionmaker): A sessionmaker factory bound to the read engine.
     Base (DeclarativeMeta): A base class for all ORM models.
 """
 
 import os  # Module for interacting with the operating system
-from sqlalchemy import create_engine  # Function to create a SQLAlchemy engine
+from sqlalchemy import create_engine, event  # Functions to create a SQLAlchemy engine and listen to its events
+from sqlalchemy.engine import Engine, make_url  # Engine type and URL parser
 from sqlalchemy.ext.declarative import declarative_base  # Function to create a base class for ORM models
 from sqlalchemy.orm import sessionmaker  # Function to create a sessionmaker factory
 from dotenv import load_dotenv  # Function to load environment variables from a .env file
@@ -30,14 +49,116 @@ load_dotenv(os.path.join(BASEDIR, '.env.local'))
 # Get the database URL from the environment variables; default to a SQLite database if not set
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test_db.sqlite")
 
-# Create a SQLAlchemy engine with the specified DATABASE_URL
-# For SQLite, the `connect_args` parameter is used to allow multi-threading
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Get the URL of the database used for reads, for example a replica; default to the same database
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", DATABASE_URL)
+
+# Connection pool settings of server databases
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Connections kept open
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Extra connections opened under load
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+
+# SQLite settings
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # Milliseconds to wait for a lock
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # Durability level of the commits
+
+
+def is_sqlite_memory(url: str) -> bool:
+    """
+    Tell whether a URL points to an in-memory SQLite database.
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        bool: True for an in-memory SQLite database.
+    """
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    )
+
+
+def create_sqlite_engine(url: str, read_only: bool = False) -> Engine:
+    """
+    Create a SQLite engine with the WAL profile.
+
+    Args:
+        url (str): The database URL.
+        read_only (bool): Whether the engine is used for reads only. Default is False.
+
+    Returns:
+        Engine: The engine.
+    """
+    if read_only:
+        pool = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    else:
+        # A single connection serializes the writers of the process in the pool's queue
+        pool = {"pool_size": 1, "max_overflow": 0, "pool_timeout": DB_POOL_TIMEOUT}
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself instead of the sqlite3 module
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(sqlite_engine, "begin")
+    def _begin(connection):
+        # Take the write lock up front, a read transaction upgraded later can fail at once
+        connection.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return sqlite_engine
+
+
+def create_app_engine(url: str, read_only: bool = False) -> Engine:
+    """
+    Create an engine with the profile of its database backend.
+
+    Args:
+        url (str): The database URL.
+        read_only (bool): Whether the engine is used for reads only. Default is False.
+
+    Returns:
+        Engine: The engine.
+    """
+    if is_sqlite_memory(url):
+        # An in-memory database only lives in its connection, it cannot be pooled or shared
+        return create_engine(url, connect_args={"check_same_thread": False})
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_sqlite_engine(url, read_only)
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+# Create the SQLAlchemy engine used for writes with the specified DATABASE_URL
+engine = create_app_engine(DATABASE_URL)
+
+# Create the engine used for reads. A server database without a replica shares the
+# write engine's pool, while SQLite gets a pool of its own next to the single writer
+if DATABASE_READ_URL != DATABASE_URL or (make_url(DATABASE_URL).get_backend_name() == "sqlite" and not is_sqlite_memory(DATABASE_URL)):
+    read_engine = create_app_engine(DATABASE_READ_URL, read_only=True)
+else:
+    read_engine = engine
 
-# Create a sessionmaker factory bound to the engine
+# Create sessionmaker factories bound to the engines
 # autocommit=False ensures that sessions do not automatically commit after each transaction
 # autoflush=False ensures that changes are not automatically flushed to the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Create a base class for all ORM models using the declarative_base function
 Base = declarative_base()
@@ -0,0 +1,170 @@
+"""
+Entry deletion module.
+
+This module removes tax information entries in bulk. Entries are selected by ID, by
+the filters of an `EntryFilter`, or both, and deleted with `DELETE ... WHERE id IN`
+statements of at most DELETE_CHUNK_SIZE entries. Every chunk is one transaction
+that also subtracts the deleted entries from the running totals, so other writers
+get the database between two chunks: clearing a large table does not hold the
+SQLite write lock, or grow the write-ahead log, for the whole operation.
+
+The statements return the deleted rows with RETURNING where the backend supports it
+(SQLite and PostgreSQL), so the totals are updated from exactly the rows that were
+deleted. Other backends read the rows first, in the same transaction.
+
+In the archive mode the deleted rows are inserted into the `tax_info_archive`
+table in the same transaction instead of being dropped, and `archive_entries` moves
+the oldest entries there to keep the `tax_info` table small.
+
+Attributes:
+    DELETE_CHUNK_SIZE (int): Number of entries deleted per transaction, read from the
+                             `DELETE_CHUNK_SIZE` environment variable.
+    ARCHIVE_DELETED (bool): Whether the delete routes move the entries to the archive
+                            table by default, read from `ARCHIVE_DELETED`.
+"""
+
+import os  # Module for interacting with the operating system
+import time  # Module used to timestamp the archived entries
+from typing import Iterable  # Type hint for the IDs
+from sqlalchemy import delete, func, insert, select  # Core statements of the deletions
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .listing import ENTRY_COLUMNS, ENTRY_FIELDS, EntryFilter
+from .models import TaxInfo, TaxInfoArchive
+from .totals import remove_from_totals
+
+# Number of entries deleted per transaction
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "5000"))
+
+# Columns read from a deleted entry to update the totals, the first ones of ENTRY_COLUMNS
+AMOUNT_COLUMNS = ENTRY_COLUMNS[:5]
+
+# Whether deleted entries are moved to the archive table instead of being dropped
+ARCHIVE_DELETED = os.getenv("ARCHIVE_DELETED", "0") != "0"
+
+
+def delete_chunk(db: Session, condition, archive: bool = False) -> int:
+    """
+    Delete the entries matching a condition in one transaction.
+
+    Args:
+        db (Session): The database session.
+        condition: The SQL condition selecting the entries, which should select at
+            most one chunk of entries.
+        archive (bool): Whether to move the entries to the archive table. Default is False.
+
+    Returns:
+        int: The number of deleted entries.
+    """
+    table = TaxInfo.__table__
+    connection = db.connection()
+    # Only the amounts are needed to update the totals, the archive needs every column
+    columns = ENTRY_COLUMNS if archive else AMOUNT_COLUMNS
+    if connection.dialect.delete_returning:
+        rows = connection.execute(delete(table).where(condition).returning(*columns)).all()
+    else:
+        rows = connection.execute(select(*columns).where(condition)).all()
+        if rows:
+            connection.execute(delete(table).where(table.c.id.in_([row.id for row in rows])))
+
+    if rows:
+        if archive:
+            archived_at = time.time()
+            connection.execute(
+                insert(TaxInfoArchive.__table__),
+                [dict(zip(ENTRY_FIELDS[1:], row[1:]), entry_id=row.id, archived_at=archived_at) for row in rows]
+            )
+
+        # Update the running totals once per tax rate instead of once per entry
+        groups = {}
+        for row in rows:
+            _, income, expenses, tax, tax_rate = row[:5]
+            group = groups.get(tax_rate)
+            if group is None:
+                group = groups[tax_rate] = [0, 0.0, 0.0, 0.0]
+            group[0] += 1
+            group[1] += income
+            group[2] += expenses
+            group[3] += tax
+        for tax_rate, (count, income, expenses, tax) in groups.items():
+            remove_from_totals(db, tax_rate, income, expenses, tax, count=count)
+
+    db.commit()
+    return len(rows)
+
+
+def delete_entries(
+    db: Session,
+    ids: Iterable[int] | None = None,
+    entry_filter: EntryFilter | None = None,
+    archive: bool = ARCHIVE_DELETED,
+    chunk_size: int = DELETE_CHUNK_SIZE,
+    up_to_id: int | None = None,
+) -> int:
+    """
+    Delete entries by ID, by filters or both, one chunk per transaction.
+
+    Without IDs, every entry matching the filters is deleted, up to the largest ID
+    found when the deletion starts, so entries added meanwhile are kept.
+
+    Args:
+        db (Session): The database session.
+        ids (Iterable[int], optional): The IDs of the entries to delete. If set, only
+            these entries are deleted, and only if they match the filters.
+        entry_filter (EntryFilter, optional): The filters of the entries to delete.
+            The sort order is ignored.
+        archive (bool): Whether to move the entries to the archive table. Default is ARCHIVE_DELETED.
+        chunk_size (int): The number of entries per transaction. Default is DELETE_CHUNK_SIZE.
+        up_to_id (int, optional): Only entries up to this ID are deleted.
+
+    Returns:
+        int: The number of deleted entries.
+    """
+    matching = None
+    if entry_filter is not None:
+        dialect = db.get_bind().dialect.name
+        matching = entry_filter.apply(select(TaxInfo.id), dialect).order_by(None)
+
+    if ids is not None:
+        ids = sorted(set(ids))
+        deleted = 0
+        for start in range(0, len(ids), chunk_size):
+            condition = TaxInfo.id.in_(ids[start:start + chunk_size])
+            if matching is not None:
+                condition = TaxInfo.id.in_(matching.where(condition))
+            deleted += delete_chunk(db, condition, archive)
+        return deleted
+
+    if up_to_id is None:
+        up_to_id = db.execute(select(func.max(TaxInfo.id))).scalar()
+        if up_to_id is None:
+            return 0
+    chunk = (matching if matching is not None else select(TaxInfo.id)).where(TaxInfo.id <= up_to_id)
+    chunk = chunk.order_by(TaxInfo.id).limit(chunk_size)
+
+    deleted = 0
+    while True:
+        count = delete_chunk(db, TaxInfo.id.in_(chunk), archive)
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
+def archive_entries(db: Session, keep: int, chunk_size: int = DELETE_CHUNK_SIZE) -> int:
+    """
+    Move every entry but the newest ones to the archive table, one chunk per transaction.
+
+    Args:
+        db (Session): The database session.
+        keep (int): The number of entries with the largest IDs to keep in the `tax_info` table.
+        chunk_size (int): The number of entries per transaction. Default is DELETE_CHUNK_SIZE.
+
+    Returns:
+        int: The number of archived entries.
+    """
+    newest_archived = db.execute(
+        select(TaxInfo.id).order_by(TaxInfo.id.desc()).offset(keep).limit(1)
+    ).scalar()
+    if newest_archived is None:
+        return 0
+    return delete_entries(db, archive=True, chunk_size=chunk_size, up_to_id=newest_archived)
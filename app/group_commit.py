@@ -0,0 +1,221 @@
+"""
+Group commit module.
+
+This module batches the entries of the "/submit/" route into shared transactions.
+Without it, every submission commits its own transaction, so a burst of submissions
+is bound by the cost of a commit (a sync of the log, or of the database file) and,
+on SQLite, waits for the write lock one submission at a time.
+
+With GROUP_COMMIT set, the route puts the entry on the asyncio queue of the
+`group_writer` and waits. A single writer task takes the entries queued so far, up
+to GROUP_COMMIT_MAX_ROWS of them, waiting at most GROUP_COMMIT_DELAY_MS after the
+first one for more to arrive, and inserts them with the running totals in one
+transaction. While a transaction is being committed, the next entries queue up, so
+the batches grow with the load even without a delay, which is why the delay is 0
+by default: a single client is then not slowed down. A delay helps when commits are
+slow to sync but cheap to start, as with `SQLITE_SYNCHRONOUS=FULL` on a network disk.
+Every request is answered only once the transaction holding its entry is committed.
+A batch whose transaction fails is retried in halves, down to single entries, so
+only a submission that fails on its own gets the error of its transaction. If the
+writer task ends on an unexpected error, the submissions of its batch get that error
+and the next submission restarts it on the same queue, so no entry is left waiting.
+
+Attributes:
+    GROUP_COMMIT (bool): Whether the submit route uses the group writer, read from
+                         the `GROUP_COMMIT` environment variable.
+    GROUP_COMMIT_MAX_ROWS (int): The largest number of entries per transaction, read
+                                 from the `GROUP_COMMIT_MAX_ROWS` environment variable.
+    GROUP_COMMIT_DELAY_MS (float): The number of milliseconds the writer waits for more
+                                   entries after the first one, read from the
+                                   `GROUP_COMMIT_DELAY_MS` environment variable.
+    group_writer (GroupCommitWriter): The group writer of the web process.
+"""
+
+import asyncio  # Module used to run the writer task and queue the entries
+import logging  # Module used to report failed notifications
+import os  # Module for interacting with the operating system
+from typing import Callable  # Type hint for the session factory
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+from starlette.concurrency import run_in_threadpool  # Runs the transactions off the event loop
+
+from .bulk import insert_mappings
+from .changes import notify_data_change
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Whether the submit route batches the entries into shared transactions
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0") != "0"
+
+# Largest number of entries per transaction
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "100"))
+
+# Milliseconds the writer waits for more entries after the first one
+GROUP_COMMIT_DELAY_MS = float(os.getenv("GROUP_COMMIT_DELAY_MS", "0"))
+
+
+class GroupCommitWriter:
+    """
+    A writer task inserting the queued entries in multi-row transactions.
+
+    Attributes:
+        max_rows (int): The largest number of entries per transaction.
+        delay (float): The number of seconds the writer waits for more entries after the first one.
+        transactions (int): The number of transactions committed.
+        rows (int): The number of entries inserted.
+    """
+
+    def __init__(self, max_rows: int = GROUP_COMMIT_MAX_ROWS, delay_ms: float = GROUP_COMMIT_DELAY_MS):
+        self.max_rows = max_rows
+        self.delay = delay_ms / 1000
+        self.transactions = 0
+        self.rows = 0
+        self._session_factory = None
+        self._loop = None
+        self._queue = None
+        self._full = None
+        self._task = None
+
+    def ensure_started(self, session_factory: Callable[[], Session] = SessionLocal):
+        """
+        Start the writer task on the running event loop, if it is not running yet.
+
+        Args:
+            session_factory (Callable): A factory returning new database sessions.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._session_factory = session_factory
+        # A writer restarted on the same loop writes the entries its predecessor left queued
+        if self._loop is not loop or self._queue is None:
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+        self._loop = loop
+        self._task = asyncio.ensure_future(self._run())
+
+    async def submit(self, values: dict, session_factory: Callable[[], Session] = SessionLocal):
+        """
+        Queue an entry and wait until the transaction inserting it is committed.
+
+        Args:
+            values (dict): The columns of the entry, with the amounts rounded and the tax calculated.
+            session_factory (Callable): A factory returning new database sessions, used
+                if the writer task is not running yet.
+
+        Raises:
+            Exception: The error of the transaction, if it failed.
+        """
+        self.ensure_started(session_factory)
+        future = self._loop.create_future()
+        self._queue.put_nowait((values, future))
+        # The writer holds the first entry of the batch it is waiting to fill
+        if self._queue.qsize() + 1 >= self.max_rows:
+            self._full.set()
+        await future
+
+    def _write(self, mappings: list[dict]):
+        """
+        Insert a batch of entries in one transaction.
+        """
+        db = self._session_factory()
+        try:
+            insert_mappings(db, mappings)
+        finally:
+            db.close()
+
+    async def _collect(self) -> list:
+        """
+        Wait for the next batch of queued entries.
+
+        Returns:
+            list: The queued `(values, future)` pairs, and None at the end if the writer is stopping.
+        """
+        batch = [await self._queue.get()]
+        # Give the other submissions of a burst the time to join the transaction
+        if batch[0] is not None and self.delay > 0 and self._queue.qsize() + 1 < self.max_rows:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.delay)
+            except asyncio.TimeoutError:
+                pass
+        while batch[-1] is not None and len(batch) < self.max_rows and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """
+        Write the queued entries until the writer is stopped.
+        """
+        while True:
+            batch = await self._collect()
+            entries = [item for item in batch if item is not None]
+            try:
+                committed = bool(entries) and await self._commit(entries)
+            except BaseException as e:
+                # The writer is going down, answer the submissions it holds
+                for _, future in entries:
+                    if future.done():
+                        continue
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                    else:
+                        future.cancel()
+                raise
+            if committed:
+                # The entries are committed, a failed notification must not stop the writer
+                try:
+                    await run_in_threadpool(notify_data_change)
+                except Exception:
+                    logger.exception("Failed to notify the data change of a group commit")
+            if batch[-1] is None:
+                return
+
+    async def _commit(self, entries: list) -> bool:
+        """
+        Insert a batch of entries, splitting it in halves if its transaction fails.
+
+        A failed batch is retried in two halves, down to single entries, so a bad
+        entry or a transient error only fails the submissions it affects.
+
+        Args:
+            entries (list): The queued `(values, future)` pairs.
+
+        Returns:
+            bool: Whether any entry was committed.
+        """
+        try:
+            await run_in_threadpool(self._write, [values for values, _ in entries])
+        except Exception as e:
+            if len(entries) == 1:
+                _, future = entries[0]
+                if not future.done():
+                    future.set_exception(e)
+                return False
+            middle = len(entries) // 2
+            first = await self._commit(entries[:middle])
+            second = await self._commit(entries[middle:])
+            return first or second
+        self.transactions += 1
+        self.rows += len(entries)
+        for _, future in entries:
+            # The request may have been cancelled while it waited
+            if not future.done():
+                future.set_result(None)
+        return True
+
+    async def stop(self):
+        """
+        Write the entries queued so far and stop the writer task.
+        """
+        if self._task is None:
+            return
+        if self._loop is asyncio.get_running_loop() and not self._task.done():
+            self._queue.put_nowait(None)
+            self._full.set()
+            await self._task
+        self._task = None
+
+
+# Group writer of the web process
+group_writer = GroupCommitWriter()
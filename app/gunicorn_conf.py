@@ -0,0 +1,146 @@
+"""
+Gunicorn configuration of the production serving mode.
+
+Gunicorn runs several uvicorn worker processes, one per available core by default,
+each serving the application on uvloop with the httptools HTTP parser. Workers are
+recycled after a number of requests, with some jitter so they do not all restart at
+once, and are given time to finish their requests when they are stopped. Start it
+with:
+
+    gunicorn -c python:app.gunicorn_conf app.main:app
+
+The migrations run once in the gunicorn master before the workers are started
+(unless `RUN_MIGRATIONS=0`), instead of in every worker. The application is not
+preloaded in the master, so every worker opens its own database connections.
+
+The page cache and the in-memory tier of the advice cache belong to a worker, and
+the workers learn about each other's writes through the shared cache of
+`app.shared_cache`. While there is more than one worker and `SHARED_CACHE_URL` is not
+set, it defaults to a SQLite file in the temporary directory, named after the master
+and removed when it exits. With `SHARED_CACHE_URL` set to an empty value, the caches
+have no way to see the writes of the other workers, so both are disabled unless
+`PAGE_CACHE_SIZE` and `ADVICE_CACHE_SIZE` are set explicitly.
+
+An in-memory SQLite database cannot be shared by several processes, so it is served
+by a single worker.
+
+Attributes:
+    bind (str): The address to listen on, read from the `BIND` environment variable.
+    workers (int): The number of worker processes, read from the `WEB_CONCURRENCY`
+                   environment variable and defaulting to the number of available cores.
+    worker_class (str): The uvicorn worker running on uvloop and httptools.
+    max_requests (int): The number of requests after which a worker is replaced, read
+                        from the `MAX_REQUESTS` environment variable.
+    max_requests_jitter (int): The random number of requests added to max_requests
+                               for every worker, read from `MAX_REQUESTS_JITTER`.
+    graceful_timeout (int): The number of seconds a stopped worker has to finish its
+                            requests, read from `GRACEFUL_TIMEOUT`.
+    timeout (int): The number of seconds a silent worker is given before it is killed
+                   and replaced, read from `WORKER_TIMEOUT`.
+    default_shared_cache (str, optional): The SQLite file of the shared cache created
+                                          for the workers, if `SHARED_CACHE_URL` is not set.
+"""
+
+import os  # Module for interacting with the operating system
+import sys  # Module used to find the modules imported by the master
+import tempfile  # Module used to find the directory of the default shared cache
+
+from uvicorn_worker import UvicornWorker  # Gunicorn worker class running an ASGI application
+
+# Also loads the environment variables of .env.local before they are read below
+from app.database import DATABASE_URL, is_sqlite_memory
+
+
+def available_cores() -> int:
+    """
+    Return the number of cores the process may run on.
+
+    Returns:
+        int: The number of cores of the CPU affinity of the process, which respects
+            the limits of a container, or of the machine where affinity is not supported.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class UvloopWorker(UvicornWorker):
+    """
+    Uvicorn worker that requires uvloop and httptools instead of picking them when installed.
+    """
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = 1 if is_sqlite_memory(DATABASE_URL) else int(os.getenv("WEB_CONCURRENCY") or available_cores())
+worker_class = "app.gunicorn_conf.UvloopWorker"
+
+# Replace workers regularly to bound the growth of their memory
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+
+# Every worker imports the application and opens its own database connections
+preload_app = False
+
+# The workers are forked after this file is read and import the application themselves
+default_shared_cache = None
+if workers > 1 and "SHARED_CACHE_URL" not in os.environ:
+    default_shared_cache = os.path.join(tempfile.gettempdir(), f"tax-shared-cache-{os.getpid()}.sqlite")
+    os.environ["SHARED_CACHE_URL"] = f"sqlite:///{default_shared_cache}"
+
+if workers > 1 and not os.environ.get("SHARED_CACHE_URL"):
+    # The per-worker caches would keep serving results of other workers' writes
+    os.environ.setdefault("PAGE_CACHE_SIZE", "0")
+    os.environ.setdefault("ADVICE_CACHE_SIZE", "0")
+
+
+def on_starting(server):
+    """
+    Run the migrations once in the master, before the workers are started.
+
+    Args:
+        server (Arbiter): The gunicorn master.
+    """
+    from app import migrations
+    from app.database import engine, read_engine
+
+    if migrations.RUN_MIGRATIONS:
+        server.log.info("Running the database migrations")
+        migrations.run_migrations(engine)
+        # The workers inherit the imported modules, they must not run them again
+        migrations.RUN_MIGRATIONS = False
+
+    # Connections must not be shared with the forked workers
+    engine.dispose()
+    read_engine.dispose()
+
+
+def post_fork(server, worker):
+    """
+    Drop the pooled connections inherited from the master, without closing them.
+
+    Args:
+        server (Arbiter): The gunicorn master.
+        worker (Worker): The new worker.
+    """
+    database = sys.modules.get("app.database")
+    if database is not None:
+        database.engine.dispose(close=False)
+        database.read_engine.dispose(close=False)
+
+
+def on_exit(server):
+    """
+    Remove the default shared cache of the workers.
+
+    Args:
+        server (Arbiter): The gunicorn master.
+    """
+    if default_shared_cache is not None:
+        for path in (default_shared_cache, default_shared_cache + "-wal", default_shared_cache + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,313 @@
+"""
+Advice job module.
+
+This module runs advice generation in the background, so the web routes answer at
+constant latency however slow the model is. A job is a row of the `advice_jobs`
+table, which also serves as the queue: workers claim pending jobs with an atomic
+conditional UPDATE, so several worker pools (in the web processes or in a separate
+process) can share the same database without running a job twice.
+
+An identical job that is still pending or running is reused instead of queued again.
+
+The workers can be run in a separate process with:
+
+    python -m app.jobs
+
+Attributes:
+    ADVICE_JOB_WORKERS (int): Number of worker tasks started in the web process,
+                              read from the `ADVICE_JOB_WORKERS` environment variable.
+                              Set it to 0 when the jobs run in a separate process.
+    ADVICE_JOB_STALE_AFTER (float): Number of seconds after which a running job is
+                                    assumed to belong to a crashed worker and is
+                                    claimed again.
+    job_workers (JobWorkerPool): The worker pool of the web process.
+"""
+
+import asyncio  # Module used to run the worker tasks
+import logging  # Module used to report failed jobs
+import os  # Module for interacting with the operating system
+import time  # Module used for the job timestamps
+import uuid  # Module used to generate the job IDs
+from typing import Callable  # Type hint for the session factory
+from sqlalchemy import or_, update  # SQL expression helpers for the atomic claim
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+from starlette.concurrency import run_in_threadpool  # Runs the database calls off the event loop
+
+from .advice import ADVICE_MODEL, advice_cache, get_advice
+from .database import ReadSessionLocal, SessionLocal
+from .models import AdviceJob
+from .prompt_builder import AdvicePrompt
+
+logger = logging.getLogger(__name__)
+
+# Number of worker tasks started in the web process
+ADVICE_JOB_WORKERS = int(os.getenv("ADVICE_JOB_WORKERS", "4"))
+
+# Seconds after which a running job is claimed again
+ADVICE_JOB_STALE_AFTER = float(os.getenv("ADVICE_JOB_STALE_AFTER", "600"))
+
+# Seconds an idle worker waits before checking the queue for jobs created elsewhere
+ADVICE_JOB_POLL_INTERVAL = float(os.getenv("ADVICE_JOB_POLL_INTERVAL", "1"))
+
+# Longest wait of a worker before it retries after an error of the queue
+ADVICE_JOB_MAX_BACKOFF = 30
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def create_job(db: Session, advice_prompt: AdvicePrompt, model: str = ADVICE_MODEL) -> AdviceJob:
+    """
+    Queue an advice job, reusing an identical job that is still pending or running.
+
+    If the advice is already cached, the job is created as done.
+
+    Args:
+        db (Session): The database session.
+        advice_prompt (AdvicePrompt): The prompt built from the entries.
+        model (str): The chat model to use. Default is ADVICE_MODEL.
+
+    Returns:
+        AdviceJob: The new or reused job.
+    """
+    key = advice_cache.make_key(model, advice_prompt.cache_text)
+    job = db.query(AdviceJob).filter(
+        AdviceJob.prompt_key == key, AdviceJob.status.in_((PENDING, RUNNING))
+    ).first()
+    if job is not None:
+        return job
+
+    now = time.time()
+    cached = advice_cache.get(key)
+    job = AdviceJob(
+        id=uuid.uuid4().hex,
+        prompt_key=key,
+        model=model,
+        prompt=advice_prompt.to_json(),
+        status=PENDING if cached is None else DONE,
+        result=cached,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _claimable(now: float):
+    """
+    Build the filter of the jobs a worker may claim at the given time.
+    """
+    return or_(
+        AdviceJob.status == PENDING,
+        (AdviceJob.status == RUNNING) & (AdviceJob.updated_at < now - ADVICE_JOB_STALE_AFTER),
+    )
+
+
+def has_claimable_job(db: Session) -> bool:
+    """
+    Check whether a job is waiting to be claimed, without taking the write lock.
+
+    Idle workers poll the queue with this check on a read session, and open a write
+    session for claim_job only when it finds a job.
+
+    Args:
+        db (Session): The database session, usually a read session.
+
+    Returns:
+        bool: True if a pending or stale running job exists.
+    """
+    return db.query(db.query(AdviceJob).filter(_claimable(time.time())).exists()).scalar()
+
+
+def claim_job(db: Session) -> AdviceJob | None:
+    """
+    Claim the oldest pending job, or a running job whose worker stopped responding.
+
+    The claim is a conditional UPDATE, so when several workers race for the same
+    job only one of them gets it.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        AdviceJob: The claimed job, or None if the queue is empty.
+    """
+    now = time.time()
+    claimable = _claimable(now)
+    while True:
+        job = db.query(AdviceJob).filter(claimable).order_by(AdviceJob.created_at).first()
+        if job is None:
+            return None
+
+        claimed = db.execute(
+            update(AdviceJob)
+            .where(AdviceJob.id == job.id, AdviceJob.status == job.status, AdviceJob.updated_at == job.updated_at)
+            .values(status=RUNNING, updated_at=now)
+        ).rowcount
+        db.commit()
+        if claimed:
+            db.refresh(job)
+            return job
+        # Another worker claimed the job first, try the next one
+
+
+def finish_job(db: Session, job_id: str, result: str | None = None, error: str | None = None):
+    """
+    Store the outcome of a job.
+
+    Args:
+        db (Session): The database session.
+        job_id (str): The ID of the job.
+        result (str, optional): The advice, if the job succeeded.
+        error (str, optional): The error message, if the job failed.
+    """
+    db.execute(
+        update(AdviceJob)
+        .where(AdviceJob.id == job_id)
+        .values(status=FAILED if error is not None else DONE, result=result, error=error, updated_at=time.time())
+    )
+    db.commit()
+
+
+class JobWorkerPool:
+    """
+    A bounded pool of asyncio tasks executing advice jobs.
+
+    Attributes:
+        workers (int): The number of worker tasks, which bounds the number of jobs
+                       executed at the same time.
+        poll_interval (float): The number of seconds an idle worker waits before
+                               checking the queue again.
+    """
+
+    def __init__(self, workers: int = ADVICE_JOB_WORKERS, poll_interval: float = ADVICE_JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._session_factory = None
+        self._read_session_factory = None
+        self._loop = None
+        self._tasks = []
+        self._wakeup = None
+
+    def ensure_started(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        read_session_factory: Callable[[], Session] | None = None,
+    ):
+        """
+        Start the worker tasks on the running event loop, if they are not running yet.
+
+        Args:
+            session_factory (Callable): A factory returning new database sessions.
+            read_session_factory (Callable, optional): A factory returning read sessions,
+                                                       used to poll the queue. Defaults
+                                                       to session_factory.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            # A task that ended anyway is replaced, so the pool never shrinks
+            self._tasks = [asyncio.ensure_future(self._work()) if task.done() else task for task in self._tasks]
+            return
+        self._session_factory = session_factory
+        self._read_session_factory = read_session_factory or session_factory
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    def notify(self):
+        """
+        Wake up an idle worker after a job was queued.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _with_session(self, function, *args, read: bool = False):
+        """
+        Call a function with a new database session, closing the session afterwards.
+        """
+        db = (self._read_session_factory if read else self._session_factory)()
+        try:
+            return function(db, *args)
+        finally:
+            db.close()
+
+    async def _work(self):
+        """
+        Claim and execute jobs until the task is cancelled.
+
+        An error of the queue itself, such as a locked database, is logged and retried
+        after a backoff growing up to ADVICE_JOB_MAX_BACKOFF seconds. A job whose
+        result could not be stored stays running and is claimed again once stale.
+        """
+        failures = 0
+        while True:
+            try:
+                await self._work_once()
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("Advice job worker failed, retrying")
+                await asyncio.sleep(min(self.poll_interval * 2 ** (failures - 1), ADVICE_JOB_MAX_BACKOFF))
+
+    async def _work_once(self):
+        """
+        Claim and execute one job, or wait for one to be queued.
+
+        The queue is polled on a read session, so idle workers do not hold the write
+        lock; the write session is only opened to claim a job that was found.
+        """
+        job = None
+        if await run_in_threadpool(self._with_session, has_claimable_job, read=True):
+            job = await run_in_threadpool(self._with_session, claim_job)
+        if job is None:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            return
+
+        try:
+            advice = await get_advice(AdvicePrompt.from_json(job.prompt), job.model, self._session_factory)
+        except Exception as e:
+            logger.exception("Advice job %s failed", job.id)
+            await run_in_threadpool(self._with_session, finish_job, job.id, None, str(e))
+        else:
+            await run_in_threadpool(self._with_session, finish_job, job.id, advice)
+
+    async def stop(self):
+        """
+        Cancel the worker tasks and wait for them to finish.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Worker pool of the web process
+job_workers = JobWorkerPool()
+
+
+async def run_workers(workers: int):
+    """
+    Run a worker pool until the process is stopped.
+
+    Args:
+        workers (int): The number of worker tasks.
+    """
+    pool = JobWorkerPool(workers=workers)
+    pool.ensure_started(SessionLocal, ReadSessionLocal)
+    try:
+        await asyncio.gather(*pool._tasks)
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_workers(int(os.getenv("ADVICE_JOB_PROCESS_WORKERS", "4"))))
@@ -0,0 +1,403 @@
+"""
+Entry listing module.
+
+This module provides bounded reads of the `tax_info` table for the listing routes.
+Pages are selected with keyset pagination on `TaxInfo.id`, so the cost of a page
+does not depend on how far into the table it is, and full listings are streamed
+in batches with `yield_per` so that memory use stays constant regardless of the
+size of the table.
+
+The reads select the columns with Core statements instead of loading `TaxInfo`
+objects: pages are returned as `EntryRecord` objects, which have `__slots__` and no
+ORM state, and streamed listings are serialized straight from the row tuples with
+orjson.
+
+Listings can be filtered and sorted with an `EntryFilter`. Every filter is served by
+an index created from the models or by `app.migrations`, and sorted listings use a
+keyset cursor made of the sort value and the ID of the last entry.
+
+Attributes:
+    PAGE_SIZE (int): Default number of entries per page, read from the `PAGE_SIZE`
+                     environment variable.
+    MAX_PAGE_SIZE (int): Largest page size a client may request.
+    STREAM_BATCH_SIZE (int): Number of rows fetched per round trip when streaming.
+    SORT_COLUMNS (dict): The columns a listing can be sorted by, keyed by name.
+    ENTRY_FIELDS (tuple): The names of the columns read for an entry, in order.
+"""
+
+import os  # Module for interacting with the operating system
+from typing import Callable, Iterator  # Type hints for the session factory and generators
+import orjson  # Fast JSON encoder used to serialize the streamed entries
+from sqlalchemy import Select, column, select, text, tuple_  # SQL expression helpers for the filters
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .migrations import FTS_TABLE
+from .models import TaxInfo
+
+# Default and maximum number of entries shown per page
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Number of rows fetched from the database per batch when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# Columns a listing can be sorted by, each backed by an index ending with the ID
+SORT_COLUMNS = {
+    "id": TaxInfo.id,
+    "income": TaxInfo.income,
+    "expenses": TaxInfo.expenses,
+    "tax_rate": TaxInfo.tax_rate,
+}
+
+# Largest code point, used as the upper bound of a prefix range
+MAX_CHAR = "\U0010ffff"
+
+# Columns read for an entry, in the order of the record fields
+ENTRY_FIELDS = ("id", "income", "expenses", "tax_amount", "tax_rate", "description")
+ENTRY_COLUMNS = tuple(getattr(TaxInfo, name) for name in ENTRY_FIELDS)
+
+
+class EntryRecord:
+    """
+    A read-only tax information entry, as read by the listings.
+
+    Records are plain objects with `__slots__`: they hold the column values only,
+    without the identity map, change tracking or validation of ORM objects and
+    Pydantic models.
+
+    Attributes:
+        id (int): ID of the entry.
+        income (float): Income amount.
+        expenses (float): Expenses amount.
+        tax_amount (float): Tax amount.
+        tax_rate (float): Tax rate.
+        description (str, optional): Description of the entry.
+    """
+
+    __slots__ = ENTRY_FIELDS
+
+    def __init__(self, id: int, income: float, expenses: float, tax_amount: float, tax_rate: float, description: str | None):
+        self.id = id
+        self.income = income
+        self.expenses = expenses
+        self.tax_amount = tax_amount
+        self.tax_rate = tax_rate
+        self.description = description
+
+
+class EntryFilter:
+    """
+    The filters and the sort order of an entry listing.
+
+    Attributes:
+        min_income (float, optional): The smallest income to include.
+        max_income (float, optional): The largest income to include.
+        min_expenses (float, optional): The smallest expenses to include.
+        max_expenses (float, optional): The largest expenses to include.
+        tax_rate (float, optional): The tax rate of the entries to include.
+        description (str, optional): The prefix the descriptions must start with.
+        search (str, optional): Words the descriptions must contain, matched by
+                                the full-text index.
+        sort (str): The name of the sort column from SORT_COLUMNS, prefixed with
+                    "-" for descending order. Default is "id".
+    """
+
+    def __init__(
+        self,
+        min_income: float | None = None,
+        max_income: float | None = None,
+        min_expenses: float | None = None,
+        max_expenses: float | None = None,
+        tax_rate: float | None = None,
+        description: str | None = None,
+        search: str | None = None,
+        sort: str = "id",
+    ):
+        self.min_income = min_income
+        self.max_income = max_income
+        self.min_expenses = min_expenses
+        self.max_expenses = max_expenses
+        self.tax_rate = tax_rate
+        self.description = description or None
+        self.search = search.strip() if search and search.strip() else None
+        self.sort = sort
+
+    @property
+    def sort_name(self) -> str:
+        """
+        The name of the sort column.
+        """
+        return self.sort.lstrip("-")
+
+    @property
+    def descending(self) -> bool:
+        """
+        Whether the listing is sorted in descending order.
+        """
+        return self.sort.startswith("-")
+
+    def query_params(self) -> dict:
+        """
+        Return the filters that are set, to carry them over to the links of a page.
+
+        Returns:
+            dict: The query parameters keyed by name.
+        """
+        params = {
+            "min_income": self.min_income,
+            "max_income": self.max_income,
+            "min_expenses": self.min_expenses,
+            "max_expenses": self.max_expenses,
+            "tax_rate": self.tax_rate,
+            "description": self.description,
+            "search": self.search,
+            "sort": None if self.sort == "id" else self.sort,
+        }
+        return {name: value for name, value in params.items() if value is not None}
+
+    def sort_value(self, entry: TaxInfo) -> float | None:
+        """
+        Return the sort value of an entry, the first part of a sorted cursor.
+
+        Args:
+            entry (TaxInfo): The entry.
+
+        Returns:
+            float: The value of the sort column, or None when sorting by ID.
+        """
+        return None if self.sort_name == "id" else getattr(entry, self.sort_name)
+
+    def search_condition(self, dialect: str):
+        """
+        Build the condition matching the search words on the given database backend.
+
+        SQLite uses the FTS5 table, where every word must appear in the description.
+        Other backends match the whole search text as a substring, which PostgreSQL
+        serves with the trigram index.
+
+        Args:
+            dialect (str): The name of the SQLAlchemy dialect.
+
+        Returns:
+            The SQL condition.
+        """
+        if dialect == "sqlite":
+            # Quote every word, so that FTS5 operators in the input are matched literally
+            match = " ".join('"' + word.replace('"', '""') + '"' for word in self.search.split())
+            matching_ids = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :search")
+            return TaxInfo.id.in_(matching_ids.bindparams(search=match).columns(column("rowid")))
+        return TaxInfo.description.ilike(f"%{self.search}%")
+
+    def apply(self, query: Select, dialect: str, after: int | None = None, after_value: float | None = None) -> Select:
+        """
+        Filter and sort a select statement of entries, starting after the given cursor.
+
+        Args:
+            query (Select): The select statement of TaxInfo columns.
+            dialect (str): The name of the SQLAlchemy dialect the statement runs on.
+            after (int, optional): The ID of the last entry of the previous page.
+            after_value (float, optional): The sort value of the last entry of the
+                previous page when not sorting by ID. If it is not given, it is
+                read from the entry with the ID `after`.
+
+        Returns:
+            Select: The filtered and sorted statement.
+        """
+        if self.min_income is not None:
+            query = query.filter(TaxInfo.income >= self.min_income)
+        if self.max_income is not None:
+            query = query.filter(TaxInfo.income <= self.max_income)
+        if self.min_expenses is not None:
+            query = query.filter(TaxInfo.expenses >= self.min_expenses)
+        if self.max_expenses is not None:
+            query = query.filter(TaxInfo.expenses <= self.max_expenses)
+        if self.tax_rate is not None:
+            query = query.filter(TaxInfo.tax_rate == self.tax_rate)
+        if self.description is not None:
+            # A range instead of LIKE, so that the description index is used
+            query = query.filter(
+                TaxInfo.description >= self.description, TaxInfo.description < self.description + MAX_CHAR
+            )
+        if self.search is not None:
+            query = query.filter(self.search_condition(dialect))
+
+        sort_column = SORT_COLUMNS[self.sort_name]
+        if after is not None:
+            if self.sort_name == "id":
+                query = query.filter(TaxInfo.id < after if self.descending else TaxInfo.id > after)
+            else:
+                if after_value is None:
+                    # Look up the sort value of the cursor entry
+                    after_value = select(sort_column).where(TaxInfo.id == after).scalar_subquery()
+                # Row value comparison, served by the (column, id) index
+                key, cursor = tuple_(sort_column, TaxInfo.id), tuple_(after_value, after)
+                query = query.filter(key < cursor if self.descending else key > cursor)
+
+        if self.descending:
+            return query.order_by(sort_column.desc(), TaxInfo.id.desc())
+        if self.sort_name == "id":
+            return query.order_by(TaxInfo.id)
+        return query.order_by(sort_column, TaxInfo.id)
+
+
+def entries_statement(
+    db: Session,
+    after: int | None = None,
+    entry_filter: EntryFilter | None = None,
+    after_value: float | None = None,
+) -> Select:
+    """
+    Build the select statement of the entry columns with the filters and sort order.
+
+    Args:
+        db (Session): The database session.
+        after (int, optional): Only entries after the one with this ID are selected.
+        entry_filter (EntryFilter, optional): The filters and sort order. Entries
+            are listed in ID order if not set.
+        after_value (float, optional): The sort value of the entry with the ID `after`.
+
+    Returns:
+        Select: The statement.
+    """
+    dialect = db.get_bind().dialect.name
+    return (entry_filter or EntryFilter()).apply(select(*ENTRY_COLUMNS), dialect, after, after_value)
+
+
+def fetch_page(
+    db: Session,
+    after: int | None = None,
+    limit: int = PAGE_SIZE,
+    entry_filter: EntryFilter | None = None,
+    after_value: float | None = None,
+) -> tuple[list[EntryRecord], int | None]:
+    """
+    Fetch one page of entries, starting after the given cursor.
+
+    One row more than requested is read to find out whether another page follows.
+
+    Args:
+        db (Session): The database session.
+        after (int, optional): The ID of the last entry of the previous page.
+        limit (int): The maximum number of entries to return.
+        entry_filter (EntryFilter, optional): The filters and sort order. Entries
+            are listed in ID order if not set.
+        after_value (float, optional): The sort value of the last entry of the previous page.
+
+    Returns:
+        tuple: The entries of the page and the cursor of the next page, which is
+            None on the last page.
+    """
+    statement = entries_statement(db, after, entry_filter, after_value).limit(limit + 1)
+    # Executing on the connection skips the ORM layer of the session
+    rows = [EntryRecord(*row) for row in db.connection().execute(statement)]
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+
+def iter_entry_batches(
+    db: Session,
+    after: int | None = None,
+    limit: int | None = None,
+    entry_filter: EntryFilter | None = None,
+    after_value: float | None = None,
+) -> Iterator[list[tuple]]:
+    """
+    Iterate over batches of entry rows, fetched from the database with `yield_per`.
+
+    Args:
+        db (Session): The database session.
+        after (int, optional): Only entries after the one with this ID are returned.
+        limit (int, optional): The maximum number of entries to return.
+        entry_filter (EntryFilter, optional): The filters and sort order. Entries
+            are listed in ID order if not set.
+        after_value (float, optional): The sort value of the entry with the ID `after`.
+
+    Yields:
+        list[tuple]: The rows of a batch, with the columns of ENTRY_FIELDS.
+    """
+    statement = entries_statement(db, after, entry_filter, after_value)
+    if limit is not None:
+        statement = statement.limit(limit)
+    result = db.connection().execution_options(yield_per=STREAM_BATCH_SIZE).execute(statement)
+    for rows in result.partitions():
+        yield rows
+
+
+def iter_entries(
+    db: Session,
+    after: int | None = None,
+    limit: int | None = None,
+    entry_filter: EntryFilter | None = None,
+    after_value: float | None = None,
+) -> Iterator[EntryRecord]:
+    """
+    Iterate over entries, fetching them from the database in batches.
+
+    Args:
+        db (Session): The database session.
+        after (int, optional): Only entries after the one with this ID are returned.
+        limit (int, optional): The maximum number of entries to return.
+        entry_filter (EntryFilter, optional): The filters and sort order. Entries
+            are listed in ID order if not set.
+        after_value (float, optional): The sort value of the entry with the ID `after`.
+
+    Yields:
+        EntryRecord: The entries, one at a time.
+    """
+    for rows in iter_entry_batches(db, after, limit, entry_filter, after_value):
+        for row in rows:
+            yield EntryRecord(*row)
+
+
+def entry_to_dict(entry) -> dict:
+    """
+    Convert an entry to a JSON serializable dictionary.
+
+    Args:
+        entry (EntryRecord | TaxInfo): The entry to convert.
+
+    Returns:
+        dict: The entry fields keyed by column name.
+    """
+    return {name: getattr(entry, name) for name in ENTRY_FIELDS}
+
+
+def stream_entries_json(
+    session_factory: Callable[[], Session],
+    after: int | None = None,
+    limit: int | None = None,
+    entry_filter: EntryFilter | None = None,
+    after_value: float | None = None,
+) -> Iterator[bytes]:
+    """
+    Stream entries as a JSON array, one chunk per batch of entries.
+
+    The generator owns its own database session because it keeps running after
+    the route function has returned, while the response body is being sent.
+
+    Args:
+        session_factory (Callable): A factory returning new database sessions.
+        after (int, optional): Only entries after the one with this ID are returned.
+        limit (int, optional): The maximum number of entries to return.
+        entry_filter (EntryFilter, optional): The filters and sort order.
+        after_value (float, optional): The sort value of the entry with the ID `after`.
+
+    Yields:
+        bytes: Chunks of the JSON document.
+    """
+    db = session_factory()
+    try:
+        yield b"["
+        separator = b""
+        for rows in iter_entry_batches(db, after, limit, entry_filter, after_value):
+            # Encode the whole batch at once and drop the brackets of the array
+            chunk = orjson.dumps([dict(zip(ENTRY_FIELDS, row)) for row in rows])[1:-1]
+            if chunk:
+                yield separator + chunk
+                separator = b","
+        yield b"]"
+    finally:
+        db.close()
@@ -0,0 +1,324 @@
+"""
+Asynchronous LLM client module.
+
+This module provides `AdviceClient`, which sends chat completion requests to OpenAI
+without blocking the event loop. All requests of a worker share one pooled HTTP
+session, run under a concurrency limit and a per-call timeout, and are retried with
+jittered exponential backoff on transient errors. Concurrent requests for the same
+model and prompt are coalesced into a single call whose result is shared. Completions
+can also be streamed token by token as the model generates them.
+
+The OpenAI library and aiohttp are only imported by the first call, which keeps them
+out of the start of the application and of the workers that never request advice.
+
+Attributes:
+    advice_client (AdviceClient): The client used by the advice routes, configured
+                                  from the `ADVICE_*` environment variables.
+"""
+
+import asyncio  # Module used for the concurrency limit, timeouts and coalescing
+import functools  # Module used to import the OpenAI library once
+import hashlib  # Module used to build the coalescing keys
+import os  # Module for interacting with the operating system
+import random  # Module used for the backoff jitter
+import time  # Module used to measure the duration of the calls
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable  # Type hints for the backends
+
+from .metrics import record_llm_call, record_llm_tokens
+
+if TYPE_CHECKING:
+    import aiohttp  # HTTP client used by the async OpenAI API
+
+
+@functools.cache
+def load_openai():
+    """
+    Import the OpenAI library and set its API key from the `OPENAI-API-KEY` environment variable.
+
+    Returns:
+        module: The `openai` module.
+    """
+    import openai  # OpenAI client used to request the completions
+
+    openai.api_key = os.getenv("OPENAI-API-KEY") or openai.api_key
+    return openai
+
+
+@functools.cache
+def retryable_errors() -> tuple[type[BaseException], ...]:
+    """
+    Return the errors after which a call is tried again.
+
+    Returns:
+        tuple: The timeout and the transient OpenAI error types.
+    """
+    openai = load_openai()
+    return (
+        asyncio.TimeoutError,
+        openai.error.APIConnectionError,
+        openai.error.RateLimitError,
+        openai.error.ServiceUnavailableError,
+        openai.error.Timeout,
+        openai.error.TryAgain,
+    )
+
+
+class AdviceClient:
+    """
+    Pooled, rate limited and coalescing client for chat completions.
+
+    The semaphore, the HTTP session and the in-flight calls belong to the event loop
+    that created them, so they are recreated when the client is used from another
+    loop (for example by a test client that starts a loop per request).
+
+    Attributes:
+        max_concurrency (int): The maximum number of calls in flight at the same time.
+        timeout (float): The number of seconds a single call may take.
+        retries (int): The number of times a failed call is tried again.
+        backoff (float): The base delay before a retry, doubled after every attempt.
+        pool_size (int): The maximum number of pooled HTTP connections.
+        backend (Callable, optional): A coroutine function `(model, messages)`
+                                      returning the completion text. Defaults to
+                                      the OpenAI chat completion API.
+        stream_backend (Callable, optional): An async generator function
+                                             `(model, messages)` yielding the
+                                             completion text piece by piece.
+                                             Defaults to the streaming OpenAI
+                                             chat completion API.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        timeout: float = 60,
+        retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 20,
+        backend: Callable[[str, list[dict]], Awaitable[str]] | None = None,
+        stream_backend: Callable[[str, list[dict]], AsyncIterator[str]] | None = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.backend = backend or self._openai_backend
+        self.stream_backend = stream_backend or self._openai_stream_backend
+        self._loop = None
+        self._semaphore = None
+        self._session = None
+        self._inflight = {}
+        self._closing = set()  # Tasks closing the sessions of previous event loops
+
+    @classmethod
+    def from_env(cls) -> "AdviceClient":
+        """
+        Create a client configured from the environment variables.
+
+        Returns:
+            AdviceClient: A client using `ADVICE_CONCURRENCY`, `ADVICE_TIMEOUT`,
+                `ADVICE_RETRIES`, `ADVICE_BACKOFF` and `ADVICE_POOL_SIZE`.
+        """
+        return cls(
+            max_concurrency=int(os.getenv("ADVICE_CONCURRENCY", "8")),
+            timeout=float(os.getenv("ADVICE_TIMEOUT", "60")),
+            retries=int(os.getenv("ADVICE_RETRIES", "3")),
+            backoff=float(os.getenv("ADVICE_BACKOFF", "0.5")),
+            pool_size=int(os.getenv("ADVICE_POOL_SIZE", "20")),
+        )
+
+    def _bind_loop(self):
+        """
+        Create the per event loop state if the running loop changed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._release_session()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+
+    def _release_session(self):
+        """
+        Close the pooled HTTP session of the previous event loop, which cannot be used on the running one.
+        """
+        session, self._session = self._session, None
+        if session is None or session.closed:
+            return
+        if self._loop is not None and self._loop.is_running():
+            # The previous loop runs in another thread, the session is closed there
+            asyncio.run_coroutine_threadsafe(session.close(), self._loop)
+        else:
+            # The previous loop has stopped, its connector is closed from the running one
+            task = asyncio.ensure_future(self._close_session(session))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_session(session: "aiohttp.ClientSession"):
+        """
+        Close a session whose event loop has stopped, ignoring the errors of its dead connections.
+        """
+        try:
+            await session.close()
+        except Exception:
+            pass
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """
+        Return the pooled HTTP session of the running loop, creating it if needed.
+
+        Returns:
+            aiohttp.ClientSession: The shared session.
+        """
+        if self._session is None or self._session.closed:
+            import aiohttp  # HTTP client used by the async OpenAI API
+
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _openai_backend(self, model: str, messages: list[dict]) -> str:
+        """
+        Request a chat completion from OpenAI through the pooled session.
+
+        Args:
+            model (str): The chat model to use.
+            messages (list[dict]): The chat messages.
+
+        Returns:
+            str: The completion text.
+        """
+        openai = load_openai()
+        # The OpenAI library picks up the session from this context variable
+        openai.aiosession.set(self._get_session())
+        response = await openai.ChatCompletion.acreate(model=model, messages=messages)
+        record_llm_tokens(model, getattr(response, "usage", None))
+        return response.choices[0].message['content'].strip()
+
+    async def _openai_stream_backend(self, model: str, messages: list[dict]) -> AsyncIterator[str]:
+        """
+        Request a streamed chat completion from OpenAI through the pooled session.
+
+        Args:
+            model (str): The chat model to use.
+            messages (list[dict]): The chat messages.
+
+        Yields:
+            str: The pieces of the completion text as the model generates them.
+        """
+        openai = load_openai()
+        openai.aiosession.set(self._get_session())
+        response = await openai.ChatCompletion.acreate(model=model, messages=messages, stream=True)
+        async for chunk in response:
+            content = chunk.choices[0].delta.get("content")
+            if content:
+                yield content
+
+    async def _call(self, model: str, messages: list[dict]) -> str:
+        """
+        Call the backend under the concurrency limit, with a timeout and retries.
+
+        Args:
+            model (str): The chat model to use.
+            messages (list[dict]): The chat messages.
+
+        Returns:
+            str: The completion text.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    try:
+                        result = await asyncio.wait_for(self.backend(model, messages), self.timeout)
+                    except Exception as e:
+                        record_llm_call(model, time.perf_counter() - start, "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                        raise
+                    record_llm_call(model, time.perf_counter() - start, "ok")
+                    return result
+            except retryable_errors():
+                if attempt >= self.retries:
+                    raise
+                # Full jitter spreads the retries of concurrent callers apart
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                attempt += 1
+
+    async def complete(self, model: str, messages: list[dict]) -> str:
+        """
+        Request a chat completion, sharing the result of an identical call in flight.
+
+        Args:
+            model (str): The chat model to use.
+            messages (list[dict]): The chat messages.
+
+        Returns:
+            str: The completion text.
+        """
+        self._bind_loop()
+        key = hashlib.sha256(repr((model, messages)).encode("utf-8")).hexdigest()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(model, messages))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield the shared call, so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+
+    async def stream(self, model: str, messages: list[dict]) -> AsyncIterator[str]:
+        """
+        Stream a chat completion under the concurrency limit.
+
+        The timeout applies to the wait for every piece of the completion. A call
+        that fails before its first piece is retried like `complete`; once pieces
+        have been yielded the error is raised to the caller.
+
+        Args:
+            model (str): The chat model to use.
+            messages (list[dict]): The chat messages.
+
+        Yields:
+            str: The pieces of the completion text as the model generates them.
+        """
+        self._bind_loop()
+        attempt = 0
+        started = False
+        while True:
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    pieces = self.stream_backend(model, messages).__aiter__()
+                    try:
+                        while True:
+                            try:
+                                piece = await asyncio.wait_for(pieces.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                record_llm_call(model, time.perf_counter() - start, "ok")
+                                return
+                            started = True
+                            yield piece
+                    except Exception as e:
+                        record_llm_call(model, time.perf_counter() - start, "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                        raise
+                    finally:
+                        await pieces.aclose()
+            except retryable_errors():
+                if started or attempt >= self.retries:
+                    raise
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                attempt += 1
+
+    async def close(self):
+        """
+        Close the pooled HTTP session.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Client shared by every advice request of the worker
+advice_client = AdviceClient.from_env()
@@ -1,28 +1,80 @@
+import io
+import json
 import os
-from dotenv import load_dotenv
-import openai
-from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+import tempfile
+from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-
-from .models import TaxInfo, TaxInfoResponse
-from .database import SessionLocal, engine, Base
-from .validation import validate_expenses, validate_income
-
-# Set the base directory and load environment variables
+from starlette.concurrency import run_in_threadpool
+
+from .models import TaxInfo, TaxInfoResponse, BulkIngestResponse, BulkDeleteRequest, BulkDeleteResponse, AdviceJob, AdviceJobResponse, TaxScenario, TaxScenarioResponse
+from .database import SessionLocal, ReadSessionLocal, engine
+from .validation import validate_expenses, validate_income, validate_tax_rate
+from .tax import compute_tax_amount
+from .totals import add_to_totals, get_totals
+from .listing import PAGE_SIZE, MAX_PAGE_SIZE, EntryFilter, fetch_page, stream_entries_json
+from .migrations import RUN_MIGRATIONS, run_migrations
+from .bulk import BULK_CHUNK_SIZE, ingest_rows, ingest_ndjson_stream, iter_csv, iter_ndjson
+from .deletion import ARCHIVE_DELETED, archive_entries, delete_entries
+from .transfer import EXPORT_FORMATS, PARQUET_SPOOL_SIZE, iter_parquet, stream_export
+from .advice import advice_cache, get_advice, stream_advice
+from .prompt_builder import INCREMENTAL_ADVICE, build_advice_prompt
+from .changes import notify_data_change
+from .page_cache import page_cache
+from .metrics import MetricsMiddleware, TimedTemplate, render_metrics
+from .profiling import ProfiledRoute, ProfilingMiddleware
+from .llm_client import advice_client
+from .jobs import job_workers, create_job
+from .group_commit import GROUP_COMMIT, group_writer
+
+# Set the base directory; the environment variables of .env.local are loaded by the database module
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
-load_dotenv(os.path.join(BASEDIR, '.env.local'))
-
-# Set OpenAI API key from environment variable
-openai.api_key = os.getenv("OPENAI-API-KEY")
 
-# Create all database tables
-Base.metadata.create_all(bind=engine)
+# Jinja2 templates, resolved from the package directory whatever the working directory.
+# Compiled templates are kept in a bytecode cache on disk (TEMPLATE_CACHE_DIR, by default
+# a directory of the system temporary folder), so new workers load them without compiling.
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader(os.path.join(BASEDIR, "templates")),
+    autoescape=True,
+    bytecode_cache=FileSystemBytecodeCache(os.getenv("TEMPLATE_CACHE_DIR") or None)
+))
+# Record the render time of every template
+templates.env.template_class = TimedTemplate
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Manage the resources shared by the requests of the application.
 
-# Initialize FastAPI app and Jinja2 templates
-app = FastAPI()
-templates = Jinja2Templates(directory="app/templates")
+    On startup the missing database tables and indexes are created, unless the 
+    migrations are run separately (`RUN_MIGRATIONS=0`), and every template is loaded, 
+    so the first requests do not compile them. On shutdown the entries queued for 
+    the group writer are committed, the advice job workers are stopped and the 
+    pooled HTTP session of the advice client is closed.
+    """
+    if RUN_MIGRATIONS:
+        await run_in_threadpool(run_migrations, engine)
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+    yield
+    await group_writer.stop()
+    await job_workers.stop()
+    await advice_client.close()
+
+# Initialize FastAPI app, with the latency and query metrics of every request and
+# the route functions wrapped for the opt-in profiling
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = ProfiledRoute
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Routes that use the synchronous database session are declared with `def` rather
+# than `async def`, so FastAPI runs them in its threadpool and a database round trip
+# never blocks the event loop for the other requests of the worker.
 
 # Dependency to get database session
 def get_db():
@@ -32,44 +84,193 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get a database session for routes that only read, served by the read engine
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get the session factory, for responses that outlive the route function
+def get_session_factory():
+    return SessionLocal
+
+# Dependency to get the read session factory, for streamed responses that only read
+def get_read_session_factory():
+    return ReadSessionLocal
+
+# Dependency to get the filters and sort order of an entry listing
+def get_entry_filter(
+    min_income: float | None = Query(None),
+    max_income: float | None = Query(None),
+    min_expenses: float | None = Query(None),
+    max_expenses: float | None = Query(None),
+    tax_rate: float | None = Query(None),
+    description: str | None = Query(None),
+    search: str | None = Query(None),
+    sort: str = Query("id", pattern="^-?(id|income|expenses|tax_rate)$")
+) -> EntryFilter:
+    return EntryFilter(min_income, max_income, min_expenses, max_expenses, tax_rate, description, search, sort)
+
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, db: Session = Depends(get_db)):
+def home(
+    request: Request,
+    after: int | None = Query(None),
+    after_value: float | None = Query(None),
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    entry_filter: EntryFilter = Depends(get_entry_filter),
+    db: Session = Depends(get_read_db)
+):
     """
-    Home route to display all tax information entries and totals.
+    Home route to display a page of tax information entries and the totals.
+
+    This function handles GET requests to the root URL ("/"). It queries one page 
+    of tax information entries matching the filters from the database, reads the 
+    total income, expenses, and tax amounts of all entries from the running totals 
+    table, and then renders the "home.html" template with the retrieved data.
 
-    This function handles GET requests to the root URL ("/"). It queries all tax 
-    information entries from the database, calculates total income, expenses, and 
-    tax amounts, and then renders the "home.html" template with the retrieved data.
+    Rendered pages are kept in the page cache until the next write. The entries table 
+    of every page and the totals shared by all pages are cached as separate fragments, 
+    so a page with other filters only queries and renders what it does not share. 
+    The response carries an ETag of the data version, and a request whose 
+    `If-None-Match` header still matches it is answered with a 304 response without 
+    touching the database.
 
     Args:
         request (Request): The request object, which includes all information about the HTTP request.
-        db (Session): The database session dependency, provided by FastAPI's Depends function.
+        after (int, optional): The ID of the last entry of the previous page.
+        after_value (float, optional): The sort value of the last entry of the previous page.
+        limit (int): The number of entries per page. Default is PAGE_SIZE.
+        entry_filter (EntryFilter): The filters and sort order, provided by FastAPI's Depends function.
+        db (Session): The read database session dependency, provided by FastAPI's Depends function.
 
     Returns:
         HTMLResponse: The rendered "home.html" template with the following context:
             - request: The original request object.
-            - entries: A list of TaxInfoResponse objects representing all tax entries.
-            - total_income: The total income calculated from all entries.
-            - total_expenses: The total expenses calculated from all entries.
-            - total_tax: The total tax amount calculated from all entries.
-    """
-    # Query all tax info entries from the database
-    taxinfo_entries = db.query(TaxInfo).all()
-    entries = [TaxInfoResponse.from_orm(entry) for entry in taxinfo_entries]
-    
-    # Calculate total income, expenses, and tax
-    total_income = round(sum(entry.income for entry in entries), 2)
-    total_expenses = round(sum(entry.expenses for entry in entries), 2)
-    total_tax = round(sum(entry.tax_amount for entry in entries), 2)
-    
-    # Render home template with the entries and totals
-    return templates.TemplateResponse("home.html", {
-        "request": request,
-        "entries": entries,
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "total_tax": total_tax
-    })
+            - entries_html: The rendered entries table and page links ("_entries.html").
+            - totals_html: The rendered totals ("_totals.html").
+            - limit: The number of entries per page.
+            - filters: The filters that are set, to show them in the filter form.
+        Response: An empty 304 response if the page did not change since the ETag sent by the client.
+    """
+    filters = entry_filter.query_params()
+    entries_key = ("entries", after, after_value, limit, tuple(sorted(filters.items())))
+    page_key = ("home",) + entries_key[1:]
+    etag = page_cache.etag(page_key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    # The client already has this page and no entry was written since
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+
+    def render_entries():
+        # Query one page of tax info entries from the database
+        # The entries are lightweight records rendered as they are, without a Pydantic model per row
+        entries, next_cursor = fetch_page(db, after, limit, entry_filter, after_value)
+        next_value = entry_filter.sort_value(entries[-1]) if next_cursor is not None else None
+        return templates.get_template("_entries.html").render(
+            entries=entries,
+            after=after,
+            next_cursor=next_cursor,
+            next_value=next_value,
+            limit=limit,
+            filter_query=urlencode(filters)
+        )
+
+    def render_totals():
+        # Read total income, expenses, and tax from the running totals table
+        totals = get_totals(db)
+        return templates.get_template("_totals.html").render(
+            total_income=totals["total_income"],
+            total_expenses=totals["total_expenses"],
+            total_tax=totals["total_tax"],
+            totals_by_rate=totals["breakdown"]
+        )
+
+    def render_page():
+        # Render home template around the entries and totals fragments
+        return templates.get_template("home.html").render(
+            request=request,
+            entries_html=page_cache.get_or_render(entries_key, render_entries),
+            totals_html=page_cache.get_or_render(("totals",), render_totals),
+            limit=limit,
+            filters=filters
+        )
+
+    return HTMLResponse(page_cache.get_or_render(page_key, render_page), headers=headers)
+
+@app.get("/entries/")
+async def list_entries(
+    after: int | None = Query(None),
+    after_value: float | None = Query(None),
+    limit: int | None = Query(None, ge=1),
+    entry_filter: EntryFilter = Depends(get_entry_filter),
+    session_factory=Depends(get_read_session_factory)
+):
+    """
+    Route to list tax information entries as JSON.
+
+    This function handles GET requests to the "/entries/" URL. The entries matching 
+    the filters are streamed in the requested order as a JSON array while they are 
+    read from the database in batches, so the first bytes are sent immediately and 
+    a full export runs in constant memory.
+
+    Args:
+        after (int, optional): Only entries after the one with this ID are returned.
+        after_value (float, optional): The sort value of the entry with the ID `after`.
+        limit (int, optional): The maximum number of entries to return. All entries are returned if not set.
+        entry_filter (EntryFilter): The filters and sort order, provided by FastAPI's Depends function.
+        session_factory (Callable): The read session factory dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        StreamingResponse: A JSON array of tax information entries.
+    """
+    return StreamingResponse(
+        stream_entries_json(session_factory, after, limit, entry_filter, after_value),
+        media_type="application/json"
+    )
+
+@app.get("/export/")
+def export_entries(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    entry_filter: EntryFilter = Depends(get_entry_filter),
+    session_factory=Depends(get_read_session_factory)
+):
+    """
+    Route to download the tax information entries as a file.
+
+    This function handles GET requests to the "/export/" URL. The entries matching 
+    the filters are streamed as a CSV, NDJSON or Parquet file while they are read 
+    from the database in batches, so an export of any size runs in constant memory. 
+    The file can be loaded into another database with the "/bulk/" route or with 
+    `python -m app.transfer import`.
+
+    Args:
+        format (str): The file format, "csv", "ndjson" or "parquet". Default is "csv".
+        entry_filter (EntryFilter): The filters and sort order, provided by FastAPI's Depends function.
+        session_factory (Callable): The read session factory dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        StreamingResponse: The file, sent as an attachment.
+    """
+    return StreamingResponse(
+        stream_export(session_factory, format, entry_filter),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="tax_entries.{format}"'}
+    )
+
+def write_entry(db: Session, values: dict):
+    """
+    Insert one entry and add it to the running totals in its own transaction.
+
+    Args:
+        db (Session): The database session.
+        values (dict): The columns of the entry.
+    """
+    db.add(TaxInfo(**values))
+    add_to_totals(db, values["tax_rate"], values["income"], values["expenses"], values["tax_amount"])
+    db.commit()
 
 @app.post("/submit/", response_model=TaxInfoResponse)
 async def submit_tax_info(
@@ -77,15 +278,21 @@ async def submit_tax_info(
     expenses: float = Form(...),
     tax_rate: float = Form(24),
     description: str = Form(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    session_factory=Depends(get_session_factory)
 ):
     """
     Route to submit new tax information entry.
 
     This function handles POST requests to the "/submit/" URL. It validates the 
     provided income and expenses, calculates the tax amount based on the tax rate, 
-    creates a new tax information entry, and saves it to the database. After 
-    submission, it redirects to the home page.
+    creates a new tax information entry, and saves it to the database together 
+    with the updated running totals. After submission, it redirects to the home page.
+
+    The entry is written in the threadpool in its own transaction or, with 
+    `GROUP_COMMIT` set, queued for the group writer, which commits the entries of 
+    concurrent submissions together (see app.group_commit). Either way the 
+    redirect is only sent once the entry is committed.
 
     Args:
         income (float): The income amount submitted via the form.
@@ -93,44 +300,166 @@ async def submit_tax_info(
         tax_rate (float): The tax rate to be applied. Default is 24.
         description (str, optional): An optional description for the tax entry.
         db (Session): The database session dependency, provided by FastAPI's Depends function.
+        session_factory (Callable): The session factory dependency used by the group writer.
 
     Returns:
         RedirectResponse: Redirects to the home page ("/") with status code 303.
     """
-    # Validate income and expenses
+    # Validate income, expenses and tax rate
     validate_income(income)
     validate_expenses(expenses)
+    validate_tax_rate(tax_rate)
 
     # Calculate tax amount
-    tax_amount = round(expenses * (tax_rate / 100), 2)
-    
-    # Create new TaxInfo entry
-    db_tax_info = TaxInfo(
-        income=round(income, 2),
-        expenses=round(expenses, 2),
-        tax_amount=tax_amount,
-        tax_rate=tax_rate,
-        description=description
-    )
-    
-    # Add and commit the new entry to the database
-    db.add(db_tax_info)
-    db.commit()
-    db.refresh(db_tax_info)
+    values = {
+        "income": round(income, 2),
+        "expenses": round(expenses, 2),
+        "tax_amount": compute_tax_amount(expenses, tax_rate),
+        "tax_rate": tax_rate,
+        "description": description,
+    }
+
+    if GROUP_COMMIT:
+        # The group writer notifies the caches once per transaction
+        await group_writer.submit(values, session_factory)
+    else:
+        # Add the new entry and its amounts to the running totals in one transaction
+        await run_in_threadpool(write_entry, db, values)
+        # With a shared cache the notification is a write of its own, kept off the event loop
+        await run_in_threadpool(notify_data_change)
     
     # Redirect to home page after submission
     return RedirectResponse(url="/", status_code=303)
 
 
+@app.post("/tax_scenarios/", response_model=TaxScenarioResponse)
+def calculate_tax_scenario(scenario: TaxScenario, db: Session = Depends(get_read_db)):
+    """
+    Route to calculate the totals of all tax information entries under a what-if scenario.
+
+    This function handles POST requests to the "/tax_scenarios/" URL. The tax of every 
+    entry is recalculated with the rates or the progressive brackets of the scenario 
+    by the vectorized tax engine, which reads the entries in batches of columns, and 
+    the totals are returned next to the current ones. The entries are not changed.
+
+    Args:
+        scenario (TaxScenario): The scenario, sent as a JSON body.
+        db (Session): The read database session dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        TaxScenarioResponse: The current and scenario totals, overall and per current tax rate.
+    """
+    # NumPy is imported by the first scenario rather than by every worker at startup
+    from .tax_engine import scenario_totals
+
+    return scenario_totals(db, scenario)
+
+
+def read_parquet_upload(file, chunk_size: int):
+    """
+    Open an uploaded Parquet file, answering with a 400 error if it is not valid Parquet.
+    """
+    try:
+        return iter_parquet(file, chunk_size)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Parquet file")
+
+@app.post("/bulk/", response_model=BulkIngestResponse)
+async def bulk_submit_tax_info(
+    request: Request,
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db)
+):
+    """
+    Route to submit a batch of tax information entries.
+
+    This function handles POST requests to the "/bulk/" URL. The batch can be sent 
+    as a JSON array ("application/json"), an NDJSON stream ("application/x-ndjson"), 
+    a CSV document with a header line ("text/csv"), a Parquet file 
+    ("application/vnd.apache.parquet"), or as a "file" upload in a multipart form, 
+    in which case the format is taken from the file extension (.json, .ndjson/.jsonl, 
+    .csv or .parquet). Every row is validated with the same rules as 
+    the submit route and the valid rows are inserted in chunks, one transaction per 
+    chunk. Invalid rows are reported and skipped without aborting the batch.
+
+    Args:
+        request (Request): The request object, which includes all information about the HTTP request.
+        chunk_size (int): The number of rows inserted per transaction. Default is BULK_CHUNK_SIZE.
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        BulkIngestResponse: The number of inserted entries and the errors of the rejected rows.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    # NDJSON bodies are inserted chunk by chunk while they are being received
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        try:
+            return await ingest_ndjson_stream(db, request.stream(), chunk_size)
+        finally:
+            # Chunks are committed one by one, so notify even if a later chunk failed
+            await run_in_threadpool(notify_data_change)
+
+    if content_type == "application/json":
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of entries")
+    elif content_type == "text/csv":
+        text = (await request.body()).decode("utf-8-sig")
+        rows = iter_csv(io.StringIO(text, newline=""))
+    elif content_type == "application/vnd.apache.parquet":
+        # Parquet files are read from their footer, so the body is spooled to a seekable file first
+        spool = tempfile.SpooledTemporaryFile(max_size=PARQUET_SPOOL_SIZE)
+        async for data in request.stream():
+            await run_in_threadpool(spool.write, data)
+        rows = read_parquet_upload(spool, chunk_size)
+    elif content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Expected a file upload named 'file'")
+
+        filename = (upload.filename or "").lower()
+        if filename.endswith(".parquet"):
+            rows = read_parquet_upload(upload.file, chunk_size)
+        elif not filename.endswith((".csv", ".ndjson", ".jsonl", ".json")):
+            raise HTTPException(status_code=400, detail="Unsupported file type, expected .json, .ndjson, .jsonl, .csv or .parquet")
+        else:
+            # Read the uploaded file as a text stream instead of loading it in memory
+            text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            if filename.endswith(".csv"):
+                rows = iter_csv(text)
+            elif filename.endswith((".ndjson", ".jsonl")):
+                rows = iter_ndjson(text)
+            else:
+                try:
+                    rows = await run_in_threadpool(json.load, text)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Invalid JSON")
+                if not isinstance(rows, list):
+                    raise HTTPException(status_code=400, detail="Expected a JSON array of entries")
+    else:
+        raise HTTPException(status_code=415, detail="Unsupported content type")
+
+    # Insert the rows in the threadpool so the event loop is not blocked
+    try:
+        return await run_in_threadpool(ingest_rows, db, rows, chunk_size)
+    finally:
+        await run_in_threadpool(notify_data_change)
+
+
 @app.post("/delete/{entry_id}", response_class=HTMLResponse)
-async def delete_entry(entry_id: int, db: Session = Depends(get_db)):
+def delete_entry(entry_id: int, db: Session = Depends(get_db)):
     """
     Route to delete a specific tax information entry by ID.
 
-    This function handles POST requests to the "/delete/{entry_id}" URL. It queries 
-    the database for the tax information entry with the specified ID. If the entry 
-    exists, it is deleted from the database. After deletion, the function redirects 
-    to the home page.
+    This function handles POST requests to the "/delete/{entry_id}" URL. The entry 
+    is deleted with a single statement returning its amounts, which are subtracted 
+    from the running totals in the same transaction, or moved to the archive table 
+    when `ARCHIVE_DELETED` is set. After deletion, the function redirects to the home page.
 
     Args:
         entry_id (int): The ID of the tax information entry to be deleted.
@@ -139,25 +468,62 @@ async def delete_entry(entry_id: int, db: Session = Depends(get_db)):
     Returns:
         RedirectResponse: Redirects to the home page ("/") with status code 303.
     """
-    # Query the entry by ID
-    entry = db.query(TaxInfo).filter(TaxInfo.id == entry_id).first()
-    
-    # If entry exists, delete it from the database
-    if entry:
-        db.delete(entry)
-        db.commit()
+    # Delete the entry if it exists, together with its share of the running totals
+    if delete_entries(db, ids=[entry_id]):
+        notify_data_change()
     
     # Redirect to home page after deletion
     return RedirectResponse(url="/", status_code=303)
 
 
+@app.post("/bulk_delete/", response_model=BulkDeleteResponse)
+def bulk_delete_tax_info(
+    request_body: BulkDeleteRequest | None = None,
+    archive: bool = Query(ARCHIVE_DELETED),
+    entry_filter: EntryFilter = Depends(get_entry_filter),
+    db: Session = Depends(get_db)
+):
+    """
+    Route to delete a batch of tax information entries.
+
+    This function handles POST requests to the "/bulk_delete/" URL. The entries are 
+    selected by the IDs of the JSON body, by the filters of the query string, or 
+    both, in which case only the listed entries matching the filters are deleted. 
+    They are deleted with `DELETE ... WHERE id IN` statements of DELETE_CHUNK_SIZE 
+    entries, one transaction per chunk, which also updates the running totals.
+
+    Args:
+        request_body (BulkDeleteRequest, optional): The IDs of the entries to delete.
+        archive (bool): Whether to move the entries to the archive table. Default is ARCHIVE_DELETED.
+        entry_filter (EntryFilter): The filters, provided by FastAPI's Depends function.
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        BulkDeleteResponse: The number of deleted entries.
+    """
+    ids = request_body.ids if request_body and request_body.ids else None
+    filtered = bool(set(entry_filter.query_params()) - {"sort"})
+    if ids is None and not filtered:
+        raise HTTPException(status_code=400, detail="Expected entry IDs or a filter, use /clear_all/ to delete every entry")
+
+    try:
+        deleted = delete_entries(db, ids, entry_filter if filtered else None, archive)
+    finally:
+        # Chunks are committed one by one, so notify even if a later chunk failed
+        notify_data_change()
+    return BulkDeleteResponse(deleted=deleted, archived=archive)
+
+
 @app.post("/clear_all/", response_class=HTMLResponse)
-async def clear_all_entries(db: Session = Depends(get_db)):
+def clear_all_entries(db: Session = Depends(get_db)):
     """
     Route to clear all tax information entries.
 
-    This function handles POST requests to the "/clear_all/" URL. It deletes all 
-    tax information entries from the database and then redirects to the home page.
+    This function handles POST requests to the "/clear_all/" URL. It deletes every 
+    tax information entry, or moves it to the archive table when `ARCHIVE_DELETED` 
+    is set, in chunks of DELETE_CHUNK_SIZE entries with one transaction each, so 
+    other requests can write between two chunks. The running totals are updated 
+    with every chunk. It then redirects to the home page.
 
     Args:
         db (Session): The database session dependency, provided by FastAPI's Depends function.
@@ -165,57 +531,91 @@ async def clear_all_entries(db: Session = Depends(get_db)):
     Returns:
         RedirectResponse: Redirects to the home page ("/") with status code 303.
     """
-    # Delete all entries from the database
-    db.query(TaxInfo).delete()
-    db.commit()
+    # Delete all entries and their totals from the database, chunk by chunk
+    try:
+        delete_entries(db)
+    finally:
+        notify_data_change()
     
     # Redirect to home page after clearing entries
     return RedirectResponse(url="/", status_code=303)
 
+
+@app.post("/archive/", response_model=BulkDeleteResponse)
+def archive_tax_info(keep: int = Query(..., ge=0), db: Session = Depends(get_db)):
+    """
+    Route to move the oldest tax information entries to the archive table.
+
+    This function handles POST requests to the "/archive/" URL. Every entry but the 
+    `keep` entries with the largest IDs is moved to the `tax_info_archive` table, one 
+    chunk per transaction, and removed from the running totals, so the table read 
+    by the listings stays small.
+
+    Args:
+        keep (int): The number of newest entries to keep.
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        BulkDeleteResponse: The number of archived entries.
+    """
+    try:
+        archived = archive_entries(db, keep)
+    finally:
+        notify_data_change()
+    return BulkDeleteResponse(deleted=archived, archived=True)
+
 @app.get("/get_all_advice/", response_class=HTMLResponse)
-async def get_all_advice(request: Request, db: Session = Depends(get_db)):
+async def get_all_advice(
+    request: Request,
+    stream: bool = False,
+    db: Session = Depends(get_read_db),
+    session_factory=Depends(get_session_factory)
+):
     """
     Route to get tax advice based on all tax information entries.
 
-    This function handles GET requests to the "/get_all_advice/" URL. It queries all 
-    tax information entries from the database and uses OpenAI's GPT-3.5-turbo model 
-    to provide tax advice based on the retrieved data. The advice is then rendered 
-    on the "advice.html" template.
+    This function handles GET requests to the "/get_all_advice/" URL. It builds a 
+    prompt from the tax information entries in the database (listing small tables 
+    entry by entry and summarizing larger ones in SQL, see app.prompt_builder) and 
+    uses OpenAI's GPT-3.5-turbo model to provide tax advice based on it. The 
+    database is read in the threadpool and the model is called through the 
+    asynchronous advice client, so the event loop keeps serving other requests 
+    meanwhile. Advice for entries that did not change since a previous request is 
+    served from the advice cache. In incremental mode the advice on every entry is 
+    kept in the advice store, so after a write only the changed entries are sent 
+    to the model before the overall advice is requested. The advice is then 
+    rendered on the "advice.html" template.
+
+    With `stream` set, the page is rendered immediately and loads the advice from 
+    "/get_all_advice/stream" as it is generated. The full render stays available 
+    as a fallback when `stream` is not set.
 
     Args:
         request (Request): The request object, which includes all information about the HTTP request.
+        stream (bool): Whether to render the page immediately and stream the advice into it. Default is False.
         db (Session): The database session dependency, provided by FastAPI's Depends function.
+        session_factory (Callable): The session factory dependency used by the advice store.
 
     Returns:
         HTMLResponse: The rendered "advice.html" template with the following context:
             - request: The original request object.
             - advice_list: A list of tax advice strings. If no entries are found, a message indicating no entries are available is returned.
+            - stream: Whether the page loads the advice as a stream.
     """
-    # Query all tax info entries from the database
-    taxinfo_entries = db.query(TaxInfo).all()
-    entries = [TaxInfoResponse.from_orm(entry) for entry in taxinfo_entries]
+    # In streaming mode the page is sent right away and the advice follows as events
+    if stream:
+        return templates.TemplateResponse(request, "advice.html", {"advice_list": [], "stream": True})
 
-    # If no entries found, return with a message
-    if not entries:
-        return templates.TemplateResponse("advice.html", {"request": request, "advice_list": ["No tax information entries found."]})
+    # Build the prompt from the entries in the database
+    advice_prompt = await run_in_threadpool(build_advice_prompt, db, incremental=INCREMENTAL_ADVICE)
 
-    # Prepare the prompt for OpenAI API
-    prompt_entries = "\n".join([
-        f"Entry {entry.id}: Income = {entry.income}, Expenses = {entry.expenses}, Tax Rate = {entry.tax_rate}%"
-        for entry in entries
-    ])
-    prompt = f"Based on the following tax information entries, provide tax advice: {prompt_entries}"
+    # If no entries found, return with a message
+    if advice_prompt is None:
+        return templates.TemplateResponse(request, "advice.html", {"advice_list": ["No tax information entries found."]})
 
     try:
-        # Get advice from OpenAI's GPT-3.5-turbo model
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a tax advisor."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        advice = response.choices[0].message['content'].strip()
+        # Get advice from the cache, or from OpenAI's model if these entries were not seen before
+        advice = await get_advice(advice_prompt, session_factory=session_factory)
         # Split the advice into a list of sentences or bullet points
         advice_list = advice.split('\n')
     except Exception as e:
@@ -223,5 +623,156 @@ async def get_all_advice(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
     # Render advice template with the advice list
-    return templates.TemplateResponse("advice.html", {"request": request, "advice_list": advice_list})
+    return templates.TemplateResponse(request, "advice.html", {"advice_list": advice_list})
+
+def _sse_event(data: str, event: str | None = None) -> str:
+    """
+    Format a Server-Sent Event whose data is JSON encoded, so it can hold newlines.
+
+    Args:
+        data (str): The data of the event.
+        event (str, optional): The name of the event. Unnamed events are "message" events.
+
+    Returns:
+        str: The event in the text/event-stream format.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.get("/get_all_advice/stream")
+async def stream_all_advice(db: Session = Depends(get_read_db), session_factory=Depends(get_session_factory)):
+    """
+    Route to stream tax advice based on all tax information entries.
+
+    This function handles GET requests to the "/get_all_advice/stream" URL. It builds 
+    the same prompt as "/get_all_advice/" and forwards the advice to the browser as 
+    Server-Sent Events while the model generates it, so the first lines arrive after 
+    the model's first-token latency instead of after the whole completion.
+
+    Args:
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+        session_factory (Callable): The session factory dependency used by the advice store.
+
+    Returns:
+        StreamingResponse: A text/event-stream response. Each "message" event holds a 
+            JSON encoded piece of the advice, a "done" event marks the end of the 
+            advice and a "failure" event carries the error message if the model call fails.
+    """
+    # Build the prompt from the entries in the database
+    advice_prompt = await run_in_threadpool(build_advice_prompt, db, incremental=INCREMENTAL_ADVICE)
+
+    async def events():
+        if advice_prompt is None:
+            yield _sse_event("No tax information entries found.")
+            yield _sse_event("", event="done")
+            return
+        try:
+            async for piece in stream_advice(advice_prompt, session_factory=session_factory):
+                yield _sse_event(piece)
+        except Exception as e:
+            yield _sse_event(str(e), event="failure")
+            return
+        yield _sse_event("", event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _job_response(job: AdviceJob) -> AdviceJobResponse:
+    """
+    Build the response describing an advice job.
+
+    Args:
+        job (AdviceJob): The job.
+
+    Returns:
+        AdviceJobResponse: The status of the job, with the advice split into lines once it is done.
+    """
+    return AdviceJobResponse(
+        job_id=job.id,
+        status=job.status,
+        advice_list=job.result.split('\n') if job.result is not None else None,
+        error=job.error
+    )
+
+@app.post("/advice_jobs/", response_model=AdviceJobResponse, status_code=202)
+async def create_advice_job(
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+    session_factory=Depends(get_session_factory),
+    read_session_factory=Depends(get_read_session_factory)
+):
+    """
+    Route to queue the generation of tax advice for all tax information entries.
+
+    This function handles POST requests to the "/advice_jobs/" URL. It builds the 
+    advice prompt from the current entries and queues a job for it, which the 
+    advice workers execute in the background. An identical job that is still 
+    pending or running is returned instead of queueing a new one. The job is 
+    polled with "/advice_jobs/{job_id}".
+
+    Args:
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+        read_db (Session): The read database session dependency, used to build the prompt.
+        session_factory (Callable): The session factory dependency used by the workers.
+        read_session_factory (Callable): The read session factory dependency used by the workers to poll the queue.
+
+    Returns:
+        AdviceJobResponse: The ID and status of the job.
+    """
+    # Build the prompt from the entries in the database
+    advice_prompt = await run_in_threadpool(build_advice_prompt, read_db, incremental=INCREMENTAL_ADVICE)
+    if advice_prompt is None:
+        raise HTTPException(status_code=400, detail="No tax information entries found.")
+
+    job = await run_in_threadpool(create_job, db, advice_prompt)
 
+    # Make sure the workers of this process are running and wake one of them up
+    job_workers.ensure_started(session_factory, read_session_factory)
+    job_workers.notify()
+    return _job_response(job)
+
+@app.get("/advice_jobs/{job_id}", response_model=AdviceJobResponse)
+def get_advice_job(job_id: str, db: Session = Depends(get_read_db)):
+    """
+    Route to get the status of an advice job.
+
+    This function handles GET requests to the "/advice_jobs/{job_id}" URL.
+
+    Args:
+        job_id (str): The ID of the job.
+        db (Session): The database session dependency, provided by FastAPI's Depends function.
+
+    Returns:
+        AdviceJobResponse: The status of the job, with the advice once it is done.
+    """
+    job = db.get(AdviceJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Advice job not found")
+    return _job_response(job)
+
+@app.get("/advice_cache/stats")
+def advice_cache_stats():
+    """
+    Route to get the counters of the advice cache.
+
+    This function handles GET requests to the "/advice_cache/stats" URL.
+
+    Returns:
+        dict: The hits, disk hits, misses and evictions of the advice cache, and the 
+            number of entries it holds in memory.
+    """
+    return advice_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Route to get the performance metrics of the worker in the Prometheus text format.
+
+    This function handles GET requests to the "/metrics" URL. It returns the latency 
+    histograms of every route, the number and duration of the database queries per 
+    request and per statement type, the render time of the templates, and the 
+    duration and token usage of the LLM calls.
+
+    Returns:
+        PlainTextResponse: The metrics in the Prometheus text exposition format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
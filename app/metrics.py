@@ -0,0 +1,314 @@
+"""
+Performance metrics module.
+
+This module records where the time of the application goes and exposes it in the
+Prometheus text format on "/metrics":
+
+- the latency of every route, by method, route path and status code,
+- the number and the total duration of the database queries of every request, and
+  the duration of every query by statement type, through SQLAlchemy engine events,
+- the render time of every template, through the Jinja template class,
+- the duration, outcome and token usage of the calls to the LLM.
+
+The metrics are kept in the memory of each worker process, so with several workers
+every scrape of "/metrics" reports the worker that served it.
+
+Attributes:
+    REQUEST_SECONDS (Histogram): The latency of the requests.
+    REQUEST_QUERIES (Histogram): The number of database queries per request.
+    REQUEST_DB_SECONDS (Histogram): The total database time per request.
+    QUERY_SECONDS (Histogram): The duration of every database query.
+    TEMPLATE_SECONDS (Histogram): The render time of the templates.
+    LLM_SECONDS (Histogram): The duration of the calls to the LLM.
+    LLM_TOKENS (Counter): The tokens used by the calls to the LLM.
+"""
+
+import bisect  # Module used to find the bucket of an observation
+import contextvars  # Module used to attribute the queries to the current request
+import threading  # Module used to protect the metrics from concurrent updates
+import time  # Module used to measure durations
+
+from jinja2 import Template  # Base class of the timed templates
+from sqlalchemy import event  # Function to listen to the engine events
+from sqlalchemy.engine import Engine  # Engine class, to listen to the events of every engine
+
+# Default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Every metric, in the order they are exposed
+_registry = []
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        labelnames (tuple[str]): The names of the labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}  # Maps a tuple of label values to the count
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Add an amount to the counter of the given labels.
+
+        Args:
+            amount (float): The amount to add. Default is 1.
+            **labels: The value of every label.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """
+        Return the count of the given labels.
+        """
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def expose(self) -> list[str]:
+        """
+        Return the lines of the metric in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogram of observations with labels, with cumulative buckets as in Prometheus.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        labelnames (tuple[str]): The names of the labels.
+        buckets (tuple[float]): The upper bounds of the buckets, in ascending order.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # Maps a tuple of label values to [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        """
+        Record an observation for the given labels.
+
+        Args:
+            value (float): The observed value.
+            **labels: The value of every label.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        """
+        Return the number of observations of the given labels.
+        """
+        series = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[-1] if series else 0
+
+    def expose(self) -> list[str]:
+        """
+        Return the lines of the metric in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames + ("le",), key + (repr(float(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    """
+    Format the labels of a sample, escaping the backslashes, quotes and new lines of the values.
+    """
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def render_metrics() -> str:
+    """
+    Return every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition, one sample per line.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Latency of the HTTP requests.", ("method", "route", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Number of database queries per HTTP request.", ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500)
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_duration_seconds", "Total duration of the database queries per HTTP request.", ("route",)
+)
+QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Duration of the database queries.", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+TEMPLATE_SECONDS = Histogram(
+    "template_render_duration_seconds", "Render time of the templates.", ("template",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+LLM_SECONDS = Histogram(
+    "llm_call_duration_seconds", "Duration of the calls to the LLM.", ("model", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by the calls to the LLM.", ("model", "kind"))
+
+
+class RequestStats:
+    """
+    Database statistics of one request.
+
+    Attributes:
+        queries (int): The number of queries run for the request.
+        db_seconds (float): The total duration of the queries.
+    """
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Statistics of the request being served, shared with the threadpool through the context
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+    # Label the query with its first keyword: SELECT, INSERT, UPDATE, DELETE, ...
+    words = statement.split(None, 1)
+    QUERY_SECONDS.observe(elapsed, statement=words[0].upper() if words else "OTHER")
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+class TimedTemplate(Template):
+    """
+    Jinja template recording its render time. Set as the `template_class` of an environment.
+    """
+
+    def render(self, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_SECONDS.observe(time.perf_counter() - start, template=self.name)
+
+
+def record_llm_call(model: str, seconds: float, outcome: str):
+    """
+    Record the duration of a call to the LLM.
+
+    Args:
+        model (str): The chat model.
+        seconds (float): The duration of the call.
+        outcome (str): "ok", "error" or "timeout".
+    """
+    LLM_SECONDS.observe(seconds, model=model, outcome=outcome)
+
+
+def record_llm_tokens(model: str, usage: dict | None):
+    """
+    Record the token usage of a call to the LLM.
+
+    Args:
+        model (str): The chat model.
+        usage (dict, optional): The usage reported by the API, with the prompt and
+            completion token counts. Nothing is recorded if it is missing.
+    """
+    if usage:
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=model, kind="completion")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and the database queries of every request.
+
+    The route is labelled with its path template (for example "/delete/{entry_id}"),
+    so the number of series does not grow with the IDs. Requests that match no
+    route are labelled "unmatched". The latency includes the whole body of streamed
+    responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route, status=status)
+            REQUEST_QUERIES.observe(stats.queries, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route)
@@ -0,0 +1,168 @@
+"""
+Database migration module.
+
+This module brings the schema of a database up to date with the models. Missing
+tables are created, and the indexes declared on the models are added to tables that
+already exist, which `create_all` alone does not do. The running totals of a database
+that predates them are computed from its entries. It also creates the full-text
+index of the entry descriptions, which depends on the database backend:
+
+- SQLite: an external content FTS5 table, `tax_info_fts`, kept in sync with
+  `tax_info` by triggers. The insert trigger is skipped while the
+  `tax_info_fts_paused` table holds a row, which a bulk insert does within its own
+  transaction so that it can index its rows in one statement.
+- PostgreSQL: a trigram GIN index on `tax_info.description`, from the `pg_trgm`
+  extension, which serves `ILIKE '%...%'` searches.
+
+Every step is idempotent. They are run on their own, before the application is
+started, with:
+
+    python -m app.migrations
+
+For convenience the application also runs them when it starts, unless the
+`RUN_MIGRATIONS` environment variable is set to 0, which deployments running several
+workers should do so that the workers do not all migrate the database at once.
+
+Attributes:
+    FTS_TABLE (str): The name of the SQLite full-text table.
+    FTS_PAUSE_TABLE (str): The name of the SQLite table pausing the insert trigger.
+    RUN_MIGRATIONS (bool): Whether the application runs the migrations at startup,
+                           read from the `RUN_MIGRATIONS` environment variable.
+"""
+
+import logging  # Module used to report the migration steps
+import os  # Module for interacting with the operating system
+from sqlalchemy import text  # Function to declare raw SQL statements
+from sqlalchemy.engine import Connection, Engine  # SQLAlchemy connection types
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .database import Base, engine
+from . import models  # noqa: F401 - registers the tables on Base.metadata
+from .totals import rebuild_totals
+
+logger = logging.getLogger(__name__)
+
+# Whether the application runs the migrations when it starts
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "1") != "0"
+
+# Name of the SQLite full-text table
+FTS_TABLE = "tax_info_fts"
+
+# Name of the SQLite table whose rows turn off the insert trigger of the full-text table
+FTS_PAUSE_TABLE = "tax_info_fts_paused"
+
+# Triggers keeping the external content FTS5 table in sync with tax_info
+SQLITE_FTS_TRIGGERS = {
+    "tax_info_fts_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS tax_info_fts_insert AFTER INSERT ON tax_info
+        WHEN NOT EXISTS (SELECT 1 FROM {FTS_PAUSE_TABLE}) BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, description) VALUES (new.id, new.description);
+        END
+    """,
+    "tax_info_fts_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS tax_info_fts_delete AFTER DELETE ON tax_info BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        END
+    """,
+    "tax_info_fts_update": f"""
+        CREATE TRIGGER IF NOT EXISTS tax_info_fts_update AFTER UPDATE OF description ON tax_info BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+            INSERT INTO {FTS_TABLE} (rowid, description) VALUES (new.id, new.description);
+        END
+    """,
+}
+
+
+def create_indexes(connection: Connection):
+    """
+    Create the indexes declared on the models that do not exist yet.
+
+    Args:
+        connection (Connection): The database connection.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def create_sqlite_fts(connection: Connection):
+    """
+    Create the FTS5 table of the descriptions and the triggers maintaining it.
+
+    When the triggers are missing, because the database predates them or the
+    `tax_info` table was recreated, the full-text index is rebuilt from the table.
+    An insert trigger created before the pause table is replaced.
+
+    Args:
+        connection (Connection): The database connection.
+    """
+    existing = {
+        name: sql for name, sql in connection.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+    }
+    # detail=none keeps only the rowids of every word, which is enough for word
+    # searches and makes the per-row trigger cheaper for bulk inserts
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(description, content='tax_info', content_rowid='id', detail=none, columnsize=0)"
+    ))
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {FTS_PAUSE_TABLE} (paused INTEGER)"))
+    if "tax_info_fts_insert" in existing and FTS_PAUSE_TABLE not in existing["tax_info_fts_insert"]:
+        # The index is complete, only the trigger needs the pause condition
+        connection.execute(text("DROP TRIGGER tax_info_fts_insert"))
+    for statement in SQLITE_FTS_TRIGGERS.values():
+        connection.execute(text(statement))
+
+    if not set(SQLITE_FTS_TRIGGERS) <= set(existing):
+        logger.info("Rebuilding the full-text index of the descriptions")
+        connection.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def create_postgres_trigram(connection: Connection):
+    """
+    Create the trigram index of the descriptions.
+
+    Args:
+        connection (Connection): The database connection.
+    """
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tax_info_description_trgm ON tax_info USING gin (description gin_trgm_ops)"
+    ))
+
+
+def fill_totals(bind: Engine):
+    """
+    Compute the running totals of a database whose entries predate them.
+
+    The write routes only adjust the totals, so an empty totals table next to
+    existing entries would be the wrong starting point for every later write.
+
+    Args:
+        bind (Engine): The engine of the database.
+    """
+    with Session(bind=bind) as db:
+        if db.query(models.TaxTotals.tax_rate).first() is None and db.query(models.TaxInfo.id).first() is not None:
+            logger.info("Computing the running totals of the existing entries")
+            rebuild_totals(db)
+
+
+def run_migrations(bind: Engine = engine):
+    """
+    Create the missing tables, indexes and full-text index of a database, and fill its running totals.
+
+    Args:
+        bind (Engine): The engine of the database. Default is the application engine.
+    """
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        create_indexes(connection)
+        if bind.dialect.name == "sqlite":
+            create_sqlite_fts(connection)
+        elif bind.dialect.name == "postgresql":
+            create_postgres_trigram(connection)
+    fill_totals(bind)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, Float, String
+from typing import Literal
+from pydantic import BaseModel, model_validator
+from sqlalchemy import Column, Integer, Float, String, Text, Index
 from .database import Base
 
 class TaxInfo(Base):
@@ -9,6 +10,10 @@ class TaxInfo(Base):
     This class represents the tax information table in the database. It includes 
     columns for income, expenses, tax amount, tax rate, and an optional description.
 
+    The filtered columns are indexed together with the ID, so that a listing filtered
+    or sorted by one of them is read in keyset order from the index. The full-text
+    index of the descriptions is created by `app.migrations`.
+
     Attributes:
         id (int): Primary key column.
         income (float): Income amount, cannot be null.
@@ -26,6 +31,126 @@ class TaxInfo(Base):
     tax_rate = Column(Float, nullable=False)  # Column for tax rate, cannot be null
     description = Column(String, nullable=True)  # Optional column for description
 
+    __table_args__ = (
+        Index("ix_tax_info_tax_rate_id", "tax_rate", "id"),  # Tax rate filters and sorting
+        Index("ix_tax_info_income_id", "income", "id"),  # Income ranges and sorting
+        Index("ix_tax_info_expenses_id", "expenses", "id"),  # Expenses ranges and sorting
+        Index("ix_tax_info_description", "description"),  # Description prefix search
+    )
+
+
+class TaxInfoArchive(Base):
+    """
+    SQLAlchemy model for the archived tax information entries.
+
+    Entries are moved here from the `tax_info` table by the archive route, and by the
+    delete routes in the archive mode, so that the table read by every page stays
+    small. Archived entries no longer count in the running totals. They keep the ID
+    they had in `tax_info` as `entry_id`, which is not unique: SQLite gives the IDs of
+    the deleted entries with the largest IDs to the next new entries.
+
+    Attributes:
+        id (int): Primary key column.
+        entry_id (int): ID the entry had in the `tax_info` table.
+        income (float): Income amount.
+        expenses (float): Expenses amount.
+        tax_amount (float): Tax amount.
+        tax_rate (float): Tax rate.
+        description (str, optional): Optional description of the tax info.
+        archived_at (float): Time the entry was archived as a UNIX timestamp.
+    """
+    __tablename__ = "tax_info_archive"  # Name of the table in the database
+
+    id = Column(Integer, primary_key=True)  # Primary key column
+    entry_id = Column(Integer, nullable=False, index=True)  # ID of the entry in tax_info
+    income = Column(Float, nullable=False)  # Income amount
+    expenses = Column(Float, nullable=False)  # Expenses amount
+    tax_amount = Column(Float, nullable=False)  # Tax amount
+    tax_rate = Column(Float, nullable=False)  # Tax rate
+    description = Column(String, nullable=True)  # Optional description
+    archived_at = Column(Float, nullable=False, index=True)  # Time the entry was archived
+
+
+class AdvicePiece(Base):
+    """
+    SQLAlchemy model for the stored advice on one entry or one bucket of entries.
+
+    Pieces are keyed by a hash of the model and of the content they advise on, not
+    by entry ID, so unchanged entries are never sent to the model again, and
+    identical entries share their advice. The intermediate summaries of the pieces
+    are stored the same way.
+
+    Attributes:
+        key (str): SHA-256 hash of the model and of the content, primary key.
+        model (str): Chat model that gave the advice.
+        advice (str): The advice.
+        created_at (float): Creation time as a UNIX timestamp.
+    """
+    __tablename__ = "advice_pieces"  # Name of the table in the database
+
+    key = Column(String(64), primary_key=True)  # Hash of the model and of the content
+    model = Column(String, nullable=False)  # Chat model that gave the advice
+    advice = Column(Text, nullable=False)  # The advice
+    created_at = Column(Float, nullable=False, index=True)  # Creation time
+
+
+class TaxTotals(Base):
+    """
+    SQLAlchemy model for the running totals of the tax information table.
+
+    Each row holds the aggregated income, expenses and tax of every `TaxInfo` entry
+    sharing the same tax rate. The rows are kept up to date by the write routes in
+    the same transaction as the entries themselves, so reading the totals costs one
+    row per distinct tax rate instead of a scan of the whole `tax_info` table.
+
+    Attributes:
+        tax_rate (float): Tax rate the row aggregates, primary key.
+        entry_count (int): Number of entries with this tax rate.
+        total_income (float): Sum of the income of these entries.
+        total_expenses (float): Sum of the expenses of these entries.
+        total_tax (float): Sum of the tax amount of these entries.
+    """
+    __tablename__ = "tax_totals"  # Name of the table in the database
+
+    tax_rate = Column(Float, primary_key=True)  # One row per distinct tax rate
+    entry_count = Column(Integer, nullable=False, default=0)  # Number of aggregated entries
+    total_income = Column(Float, nullable=False, default=0)  # Running sum of income
+    total_expenses = Column(Float, nullable=False, default=0)  # Running sum of expenses
+    total_tax = Column(Float, nullable=False, default=0)  # Running sum of tax amounts
+
+
+class AdviceJob(Base):
+    """
+    SQLAlchemy model for an advice generation job.
+
+    Jobs are created by the web routes and executed by the advice workers, which may
+    run in the web process or in a separate process using the same database. The
+    prompt is stored with the job, so the advice is generated for the entries as
+    they were when the job was created.
+
+    Attributes:
+        id (str): Random hexadecimal job ID, primary key.
+        prompt_key (str): Cache key of the model and prompt, used to deduplicate jobs.
+        model (str): Chat model used for the advice.
+        prompt (str): JSON serialized advice prompt.
+        status (str): "pending", "running", "done" or "failed".
+        result (str, optional): The advice, once the job is done.
+        error (str, optional): The error message, if the job failed.
+        created_at (float): Creation time as a UNIX timestamp.
+        updated_at (float): Time of the last status change as a UNIX timestamp.
+    """
+    __tablename__ = "advice_jobs"  # Name of the table in the database
+
+    id = Column(String, primary_key=True)  # Random hexadecimal job ID
+    prompt_key = Column(String, nullable=False, index=True)  # Deduplication key
+    model = Column(String, nullable=False)  # Chat model used for the advice
+    prompt = Column(Text, nullable=False)  # JSON serialized advice prompt
+    status = Column(String, nullable=False, index=True)  # Job status
+    result = Column(Text, nullable=True)  # The advice once the job is done
+    error = Column(Text, nullable=True)  # The error message if the job failed
+    created_at = Column(Float, nullable=False)  # Creation time
+    updated_at = Column(Float, nullable=False)  # Time of the last status change
+
 
 class TaxInfoResponse(BaseModel):
     """
@@ -64,3 +189,149 @@ class TaxInfoResponse(BaseModel):
         orm_mode = True  # Enable ORM mode to work with SQLAlchemy models
         from_attributes = True  # Include attributes from the SQLAlchemy model
 
+
+
+class BulkRowError(BaseModel):
+    """
+    Pydantic model for a row rejected by the bulk ingestion endpoint.
+
+    Attributes:
+        row (int): Number of the rejected row in the submitted batch, starting at 1.
+        detail (str): Reason the row was rejected.
+    """
+    row: int  # Number of the rejected row
+    detail: str  # Reason the row was rejected
+
+
+class BulkIngestResponse(BaseModel):
+    """
+    Pydantic model for the response of the bulk ingestion endpoint.
+
+    Attributes:
+        inserted (int): Number of entries saved to the database.
+        errors (list[BulkRowError]): The rows that were rejected.
+    """
+    inserted: int  # Number of entries saved to the database
+    errors: list[BulkRowError] = []  # The rows that were rejected
+
+
+class BulkDeleteRequest(BaseModel):
+    """
+    Pydantic model for the IDs sent to the bulk delete endpoint.
+
+    Attributes:
+        ids (list[int]): IDs of the entries to delete.
+    """
+    ids: list[int] = []  # IDs of the entries to delete
+
+
+class BulkDeleteResponse(BaseModel):
+    """
+    Pydantic model for the response of the bulk delete and archive endpoints.
+
+    Attributes:
+        deleted (int): Number of entries removed from the `tax_info` table.
+        archived (bool): Whether the entries were moved to the archive table.
+    """
+    deleted: int  # Number of entries removed from the tax_info table
+    archived: bool  # Whether the entries were moved to the archive table
+
+
+class AdviceJobResponse(BaseModel):
+    """
+    Pydantic model for the status of an advice job.
+
+    Attributes:
+        job_id (str): ID of the job.
+        status (str): "pending", "running", "done" or "failed".
+        advice_list (list[str], optional): The lines of the advice, once the job is done.
+        error (str, optional): The error message, if the job failed.
+    """
+    job_id: str  # ID of the job
+    status: str  # Status of the job
+    advice_list: list[str] | None = None  # The lines of the advice
+    error: str | None = None  # The error message
+
+
+class TaxBracket(BaseModel):
+    """
+    Pydantic model for one bracket of a progressive tax schedule.
+
+    Attributes:
+        up_to (float, optional): Upper bound of the bracket, None for the last, open ended bracket.
+        rate (float): Tax rate applied to the part of the amount within the bracket.
+    """
+    up_to: float | None = None  # Upper bound of the bracket
+    rate: float  # Tax rate of the bracket
+
+
+class TaxScenario(BaseModel):
+    """
+    Pydantic model for a what-if tax scenario.
+
+    The tax of every entry is recalculated with either a progressive schedule of
+    `brackets`, or a flat rate: `rate` for every entry if set, otherwise the rate of
+    the entry after applying `rate_changes`.
+
+    Attributes:
+        base (str): The amount the tax applies to, "expenses" (as for the stored entries) or "income".
+        rate (float, optional): Tax rate applied to every entry.
+        rate_changes (dict[float, float]): New tax rates keyed by the current tax rate.
+        brackets (list[TaxBracket], optional): Progressive schedule, in ascending order.
+    """
+    base: Literal["expenses", "income"] = "expenses"  # Amount the tax applies to
+    rate: float | None = None  # Tax rate applied to every entry
+    rate_changes: dict[float, float] = {}  # New tax rates keyed by the current tax rate
+    brackets: list[TaxBracket] | None = None  # Progressive schedule
+
+    @model_validator(mode="after")
+    def check_brackets(self):
+        """
+        Check that the brackets are in ascending order and only the last one is open ended.
+        """
+        if self.brackets:
+            bounds = [bracket.up_to for bracket in self.brackets]
+            if None in bounds[:-1]:
+                raise ValueError("Only the last bracket may be open ended")
+            closed = [bound for bound in bounds if bound is not None]
+            if closed != sorted(closed) or len(set(closed)) != len(closed) or (closed and closed[0] <= 0):
+                raise ValueError("Bracket bounds must be positive and in ascending order")
+        return self
+
+
+class ScenarioRateTotals(BaseModel):
+    """
+    Pydantic model for the tax of the entries sharing a tax rate under a scenario.
+
+    Attributes:
+        tax_rate (float): Current tax rate of the entries.
+        entry_count (int): Number of entries with this tax rate.
+        current_tax (float): Sum of the stored tax amounts.
+        scenario_tax (float): Sum of the tax amounts under the scenario.
+    """
+    tax_rate: float  # Current tax rate of the entries
+    entry_count: int  # Number of entries
+    current_tax: float  # Sum of the stored tax amounts
+    scenario_tax: float  # Sum of the tax amounts under the scenario
+
+
+class TaxScenarioResponse(BaseModel):
+    """
+    Pydantic model for the totals of a what-if tax scenario.
+
+    Attributes:
+        entry_count (int): Number of entries.
+        total_income (float): Total income of the entries.
+        total_expenses (float): Total expenses of the entries.
+        current_tax (float): Total of the stored tax amounts.
+        scenario_tax (float): Total tax under the scenario.
+        difference (float): Scenario tax minus current tax.
+        breakdown (list[ScenarioRateTotals]): The tax per current tax rate.
+    """
+    entry_count: int  # Number of entries
+    total_income: float  # Total income
+    total_expenses: float  # Total expenses
+    current_tax: float  # Total of the stored tax amounts
+    scenario_tax: float  # Total tax under the scenario
+    difference: float  # Scenario tax minus current tax
+    breakdown: list[ScenarioRateTotals] = []  # The tax per current tax rate
@@ -0,0 +1,182 @@
+"""
+Rendered page cache module.
+
+This module provides `PageCache`, an LRU cache of rendered HTML keyed by the page
+and its query parameters. Every entry is tagged with the data version it was
+rendered from. The version is bumped by the write routes through
+`notify_data_change`, so a page is only served from the cache while the entries it
+shows are unchanged.
+
+The same version is used to build the ETag of a page, so a browser that sends it
+back in `If-None-Match` gets a 304 response without any query or rendering. The
+ETag also holds a random ID of the process, so a tag issued before a restart never
+matches the data of the new process.
+
+With a shared cache (`SHARED_CACHE_URL`), the cache first syncs with the writes of
+the other workers through `sync_data_changes`, and the ETag is built from the data
+version of the shared cache instead, so every worker issues and accepts the same
+tags. A page missing from the memory of a worker is then looked up in the shared
+cache, under the shared data version, before it is rendered, so a page rendered by
+one worker is served by the others until the next write.
+
+Attributes:
+    page_cache (PageCache): The cache of the home page and its fragments, configured
+                            from the `PAGE_CACHE_*` environment variables.
+"""
+
+import hashlib  # Module used to hash the cache keys into ETags
+import os  # Module for interacting with the operating system
+import threading  # Module used to protect the cache from concurrent requests
+import uuid  # Module used to generate the process ID of the ETags
+from collections import OrderedDict  # Ordered dictionary used for the LRU order
+from typing import Callable  # Type hint for the render functions
+
+from .changes import DATA_VERSION, get_shared_cache, on_data_change, sync_data_changes
+
+
+class PageCache:
+    """
+    LRU cache of rendered HTML, invalidated by a data version counter.
+
+    Attributes:
+        max_entries (int): The number of rendered pages and fragments kept before
+                           the least recently used one is evicted. 0 disables the cache.
+        max_bytes (int): The total size of the cached HTML, in characters, above
+                         which the least recently used entries are evicted.
+        version (int): The data version, incremented after every write.
+        hits (int): The number of renders answered from the cache.
+        misses (int): The number of renders that had to run.
+        evictions (int): The number of entries evicted to respect the bounds.
+        shared_ttl (float): The number of seconds a page stays in the shared cache.
+                            0 keeps the pages in the memory of the worker only.
+        shared_hits (int): The number of renders answered from the shared cache.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 2 ** 20, shared_ttl: float = 300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared_ttl = shared_ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._entries = OrderedDict()  # Maps a key to a tuple ((version, shared version), html)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Bump the data version and drop every cached entry.
+        """
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._size = 0
+
+    def etag(self, key: tuple) -> str:
+        """
+        Build the ETag of a page for the current data version.
+
+        Args:
+            key (tuple): The key identifying the page and its parameters.
+
+        Returns:
+            str: The quoted entity tag.
+        """
+        shared_version = sync_data_changes()
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        if shared_version is not None:
+            return f'"{shared_version}-{digest}"'
+        return f'"{self._boot_id}-{self.version}-{digest}"'
+
+    def _store(self, key: tuple, version: tuple, html: str):
+        """
+        Store rendered HTML in memory, evicting the least recently used entries if needed.
+
+        Must be called with the lock held.
+        """
+        # A write during the render bumped the version, the HTML may be stale already
+        if version[0] == self.version and self.max_entries > 0 and len(html) <= self.max_bytes:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (version, html)
+            self._size += len(html)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def get_or_render(self, key: tuple, render: Callable[[], str]) -> str:
+        """
+        Return the cached HTML of a key, rendering and caching it if needed.
+
+        Args:
+            key (tuple): The key identifying the page or fragment and its parameters.
+            render (Callable): A function returning the HTML, called on a miss.
+
+        Returns:
+            str: The HTML.
+        """
+        shared_version = sync_data_changes()
+        with self._lock:
+            version = (self.version, shared_version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        shared = get_shared_cache() if self.max_entries > 0 and self.shared_ttl > 0 else None
+        if shared is not None and shared_version is not None:
+            shared_key = f"page:{shared_version}:{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()}"
+            html = shared.get(shared_key)
+            if html is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, version, html)
+                return html
+
+        with self._lock:
+            self.misses += 1
+
+        html = render()
+
+        with self._lock:
+            self._store(key, version, html)
+        # Pages rendered while another worker wrote are not shared, they may be stale already
+        if shared is not None and shared_version is not None and len(html) <= self.max_bytes:
+            if shared.get_version(DATA_VERSION) == shared_version:
+                shared.set(shared_key, html, self.shared_ttl)
+        return html
+
+    def stats(self) -> dict:
+        """
+        Return the counters and the size of the cache.
+
+        Returns:
+            dict: The version, hits, shared hits, misses, evictions, entry count and size in characters.
+        """
+        with self._lock:
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self._size,
+            }
+
+
+# Cache of the rendered home pages and fragments, shared by every request of the worker
+page_cache = PageCache(
+    max_entries=int(os.getenv("PAGE_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", str(32 * 2 ** 20))),
+    shared_ttl=float(os.getenv("PAGE_CACHE_SHARED_TTL", "300")),
+)
+
+# Pages rendered from the previous entries are not served after a write
+on_data_change(page_cache.invalidate)
@@ -0,0 +1,227 @@
+"""
+Per-request profiling module.
+
+This module profiles route functions with cProfile on demand. It is disabled
+unless the `PROFILING` environment variable is set:
+
+- `PROFILING=header`: a request sent with the `X-Profile: 1` header is answered
+  with the cProfile report of its route function, sorted by cumulative time,
+  instead of its normal response.
+- `PROFILING=all`: every request is profiled and its stats are written to a
+  `.prof` file in `PROFILE_DIR`, which can be read with `pstats` or snakeviz.
+
+The profiler runs in the thread that runs the route function, so routes served by
+the threadpool are profiled too. A coroutine route function is profiled only while
+it runs: the profiler is turned off whenever it awaits, so the other requests served
+by the event loop meanwhile are not part of its profile. Only one request is profiled
+at a time; requests arriving meanwhile are served without profiling.
+
+Attributes:
+    PROFILING (str): The profiling mode, read from the `PROFILING` environment variable.
+    PROFILE_DIR (str): The directory of the `.prof` files, read from `PROFILE_DIR`.
+"""
+
+import asyncio  # Module used to tell coroutine route functions apart
+import contextvars  # Module used to collect the profile of the current request
+import cProfile  # Deterministic profiler of the route functions
+import functools  # Module used to wrap the route functions
+import io  # Module used to format the reports
+import os  # Module for interacting with the operating system
+import pstats  # Module used to format and save the profiles
+import re  # Module used to build the file names
+import tempfile  # Module used to find the default profile directory
+import threading  # Module used to allow a single profiler at a time
+import time  # Module used to name the profile files
+import types  # Module used to step the profiled coroutines
+
+from fastapi.routing import APIRoute  # Route class extended to profile the route functions
+
+# Profiling mode: "" (disabled), "header" or "all"
+PROFILING = os.getenv("PROFILING", "").lower()
+
+# Directory of the profile files written in the "all" mode
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "tax-assistant-profiles")
+
+# Number of functions listed in a report
+PROFILE_REPORT_LINES = 40
+
+# Profiles of the request being served, shared with the threadpool through the context
+_request_profiles: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_profiles", default=None)
+
+# cProfile cannot run two profilers at the same time on Python 3.12
+_profiler_lock = threading.Lock()
+
+
+@types.coroutine
+def _run_profiled(coroutine, profile: cProfile.Profile):
+    """
+    Run a coroutine with the profiler enabled only between its suspensions.
+
+    Args:
+        coroutine (Coroutine): The coroutine of the route function.
+        profile (cProfile.Profile): The profiler of the request.
+
+    Returns:
+        Any: The result of the coroutine.
+    """
+    value, error = None, None
+    while True:
+        profile.enable()
+        try:
+            if error is None:
+                awaited = coroutine.send(value)
+            else:
+                awaited = coroutine.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profile.disable()
+        # The event loop serves the other requests while the coroutine waits
+        try:
+            value, error = (yield awaited), None
+        except BaseException as e:
+            value, error = None, e
+
+
+def profiled(call):
+    """
+    Wrap a route function to profile it when the current request asks for it.
+
+    Args:
+        call (Callable): The route function, a coroutine function or a plain function.
+
+    Returns:
+        Callable: A function of the same kind, so FastAPI still runs plain functions in its threadpool.
+    """
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            profiles = _request_profiles.get()
+            if profiles is None or not _profiler_lock.acquire(blocking=False):
+                return await call(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                return await _run_profiled(call(*args, **kwargs), profile)
+            finally:
+                _profiler_lock.release()
+                profiles.append(profile)
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        profiles = _request_profiles.get()
+        if profiles is None or not _profiler_lock.acquire(blocking=False):
+            return call(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(call, *args, **kwargs)
+        finally:
+            _profiler_lock.release()
+            profiles.append(profile)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class whose route function is profiled when the request asks for it.
+
+    The wrapper costs a context variable lookup per request when profiling is off.
+    """
+
+    def get_route_handler(self):
+        if self.dependant.call is not None:
+            self.dependant.call = profiled(self.dependant.call)
+        return super().get_route_handler()
+
+
+def format_report(profiles: list) -> str:
+    """
+    Format the profiles of a request as a text report.
+
+    Args:
+        profiles (list[cProfile.Profile]): The profiles of the request.
+
+    Returns:
+        str: The functions with the highest cumulative time.
+    """
+    if not profiles:
+        return "No profile was recorded: another request was being profiled.\n"
+    output = io.StringIO()
+    stats = pstats.Stats(*profiles, stream=output)
+    stats.sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+    return output.getvalue()
+
+
+def save_profile(profiles: list, method: str, path: str) -> str | None:
+    """
+    Write the profiles of a request to a `.prof` file in PROFILE_DIR.
+
+    Args:
+        profiles (list[cProfile.Profile]): The profiles of the request.
+        method (str): The HTTP method of the request.
+        path (str): The path of the request.
+
+    Returns:
+        str: The path of the file, or None if nothing was recorded.
+    """
+    if not profiles:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    filename = os.path.join(PROFILE_DIR, f"{time.time():.6f}-{method}-{name}.prof")
+    pstats.Stats(*profiles).dump_stats(filename)
+    return filename
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware collecting the profiles of the requests to profile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING:
+            await self.app(scope, receive, send)
+            return
+
+        if PROFILING == "all":
+            profiles = []
+            token = _request_profiles.set(profiles)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _request_profiles.reset(token)
+                save_profile(profiles, scope["method"], scope["path"])
+            return
+
+        if dict(scope["headers"]).get(b"x-profile") != b"1":
+            await self.app(scope, receive, send)
+            return
+
+        # The response is discarded and replaced by the report
+        profiles = []
+        status = 500
+        token = _request_profiles.set(profiles)
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            _request_profiles.reset(token)
+        body = format_report(profiles).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,393 @@
+"""
+Advice prompt building module.
+
+This module decides how the tax information entries are presented to the model so
+that the prompt stays within a token budget however large the table grows:
+
+- detailed: small tables are listed entry by entry, as they always were.
+- summary: larger tables are pre-aggregated in SQL into overall totals, totals per
+  tax rate, income bands and the largest entries.
+- map-reduce: when even the summary does not fit (for example with thousands of
+  distinct tax rates), the summary is split into chunks that the model summarizes
+  in parallel, and the advice is requested from the combined chunk summaries.
+- incremental: the entries (or, for larger tables, the lines of the summary) are
+  advised on one by one, in batched calls, and the overall advice is requested
+  from these pieces. The pieces are kept in the advice store (`app.advice_store`),
+  so after a write only the new or changed entries are sent to the model again.
+  The advice routes use this mode when INCREMENTAL_ADVICE is turned on. It costs
+  an extra call for the overall advice on every request, so it only pays off for
+  large tables of which each write changes a few entries.
+
+Token counts are estimated locally from the length of the text, without calling the
+model's tokenizer.
+
+Attributes:
+    PROMPT_TOKEN_BUDGET (int): The maximum estimated size of a prompt in tokens.
+    DETAIL_MAX_ROWS (int): The largest number of entries listed one by one.
+    OUTLIER_COUNT (int): The number of largest entries listed in a summary.
+    INCREMENTAL_ADVICE (bool): Whether the advice routes build incremental prompts,
+                               read from the `INCREMENTAL_ADVICE` environment variable.
+"""
+
+import json  # Module used to serialize prompts stored with advice jobs
+import math  # Module used to round the token estimate up
+import os  # Module for interacting with the operating system
+import re  # Module used to parse the numbered lines of batched advice
+from sqlalchemy import case, func, select  # SQL expression helpers for the aggregates
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .models import TaxInfo
+from .totals import get_totals
+
+# Maximum estimated size of a prompt, in tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+
+# Largest number of entries listed one by one in the prompt
+DETAIL_MAX_ROWS = int(os.getenv("PROMPT_DETAIL_MAX_ROWS", "200"))
+
+# Number of largest entries by income and by expenses listed in a summary
+OUTLIER_COUNT = int(os.getenv("PROMPT_OUTLIER_COUNT", "5"))
+
+# Whether the advice routes advise on every entry separately and reuse the stored pieces
+INCREMENTAL_ADVICE = os.getenv("INCREMENTAL_ADVICE", "0") != "0"
+
+# Upper bounds of the income bands used in a summary, the last band is open ended
+INCOME_BANDS = (10000, 25000, 50000, 100000, 250000)
+
+# Average number of characters per token of English text for GPT models
+CHARS_PER_TOKEN = 4
+
+# Columns of the entries listed in a prompt
+PROMPT_COLUMNS = (TaxInfo.id, TaxInfo.income, TaxInfo.expenses, TaxInfo.tax_rate)
+
+ADVICE_PREFIX = "Based on the following tax information entries, provide tax advice: "
+SUMMARY_PREFIX = "Based on the following summary of tax information entries, provide tax advice:\n"
+MAP_PREFIX = "Summarize the main tax observations in the following part of a summary of tax information entries:\n"
+REDUCE_PREFIX = "Based on the following summaries of tax information entries, provide tax advice:\n"
+PIECE_PREFIX = "Give one line of tax advice for each of the following numbered tax information items, starting with its number:\n"
+PIECES_PREFIX = "Based on the following tax information entries and the advice given on each of them, provide overall tax advice:\n"
+PIECES_MAP_PREFIX = "Summarize the main tax observations in the following advice on tax information entries:\n"
+
+# Line of batched advice starting with the number of its item, as "3." or "3)" or "3:"
+NUMBERED_LINE = re.compile(r"^\s*(\d+)\s*[.):]\s*(.*)$")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class AdvicePrompt:
+    """
+    The prompt used to request advice, possibly preceded by a map phase.
+
+    Attributes:
+        mode (str): "detailed", "summary", "map-reduce" or "incremental".
+        text (str): The prompt sent for the advice. In map-reduce mode this is the
+                    header placed before the chunk summaries, in incremental mode the
+                    header placed before the advised pieces.
+        chunks (list[str]): The map prompts of map-reduce mode, empty otherwise.
+        units (list[list]): The `[label, text]` pair of every piece advised on
+                            separately in incremental mode, empty otherwise. The
+                            label (such as "Entry 3") is None for summary lines.
+    """
+
+    def __init__(self, mode: str, text: str, chunks: list[str] | None = None, units: list[list] | None = None):
+        self.mode = mode
+        self.text = text
+        self.chunks = chunks or []
+        self.units = units or []
+
+    @property
+    def cache_text(self) -> str:
+        """
+        The text identifying the advice of this prompt, used as the cache key.
+        """
+        units = [f"{label}: {text}" if label else text for label, text in self.units]
+        return "\n\n".join([self.text] + self.chunks + units)
+
+    def to_json(self) -> str:
+        """
+        Serialize the prompt, to store it with an advice job.
+
+        Returns:
+            str: The JSON document of the prompt.
+        """
+        return json.dumps({"mode": self.mode, "text": self.text, "chunks": self.chunks, "units": self.units})
+
+    @classmethod
+    def from_json(cls, document: str) -> "AdvicePrompt":
+        """
+        Deserialize a prompt stored with an advice job.
+
+        Args:
+            document (str): The JSON document created by `to_json`.
+
+        Returns:
+            AdvicePrompt: The prompt.
+        """
+        data = json.loads(document)
+        # Jobs queued before incremental prompts existed have no units
+        return cls(data["mode"], data["text"], data["chunks"], data.get("units"))
+
+    def reduce_prompt(self, summaries: list[str]) -> str:
+        """
+        Build the advice prompt of map-reduce mode from the chunk summaries.
+
+        Args:
+            summaries (list[str]): The model's summary of every chunk.
+
+        Returns:
+            str: The prompt asking for advice.
+        """
+        return self.text + "\n".join(f"Part {number}: {summary}" for number, summary in enumerate(summaries, 1))
+
+
+def detailed_prompt(entries) -> str:
+    """
+    Build the prompt listing every entry.
+
+    Args:
+        entries: The tax information entries, objects with `id`, `income`,
+            `expenses` and `tax_rate` attributes.
+
+    Returns:
+        str: The prompt for the model.
+    """
+    prompt_entries = "\n".join([
+        f"Entry {entry.id}: Income = {entry.income}, Expenses = {entry.expenses}, Tax Rate = {entry.tax_rate}%"
+        for entry in entries
+    ])
+    return f"{ADVICE_PREFIX}{prompt_entries}"
+
+
+def totals_line(totals: dict) -> str:
+    """
+    Format the overall totals of the entries as the header line of a summary.
+
+    Args:
+        totals (dict): The totals returned by `get_totals`.
+
+    Returns:
+        str: The header line.
+    """
+    return (
+        f"Entries: {totals['entry_count']}, Total Income = {totals['total_income']}, "
+        f"Total Expenses = {totals['total_expenses']}, Total Tax = {totals['total_tax']}"
+    )
+
+
+def summary_lines(db: Session) -> tuple[list[str], list[str]]:
+    """
+    Aggregate the entries in SQL into the lines of a summary.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        tuple: The header lines with the overall totals, and the detail lines with
+            the totals per tax rate, per income band and the largest entries.
+    """
+    totals = get_totals(db)
+    header = [totals_line(totals)]
+
+    lines = [
+        f"Tax Rate {row['tax_rate']}%: {row['entry_count']} entries, Income = {row['total_income']}, "
+        f"Expenses = {row['total_expenses']}, Tax = {row['total_tax']}"
+        for row in totals["breakdown"]
+    ]
+
+    # Group the entries into income bands
+    band = case(
+        *[(TaxInfo.income < upper, index) for index, upper in enumerate(INCOME_BANDS)],
+        else_=len(INCOME_BANDS)
+    )
+    bands = db.query(
+        band, func.count(TaxInfo.id), func.sum(TaxInfo.income), func.sum(TaxInfo.expenses), func.sum(TaxInfo.tax_amount)
+    ).group_by(band).order_by(band).all()
+    for index, count, income, expenses, tax in bands:
+        lower = INCOME_BANDS[index - 1] if index > 0 else 0
+        label = f"Income {lower} to {INCOME_BANDS[index]}" if index < len(INCOME_BANDS) else f"Income over {lower}"
+        lines.append(
+            f"{label}: {count} entries, Income = {round(income, 2)}, Expenses = {round(expenses, 2)}, Tax = {round(tax, 2)}"
+        )
+
+    # List the largest entries, which averages would hide
+    for column, name in ((TaxInfo.income, "income"), (TaxInfo.expenses, "expenses")):
+        for entry in db.connection().execute(select(*PROMPT_COLUMNS).order_by(column.desc()).limit(OUTLIER_COUNT)):
+            lines.append(
+                f"Large {name}: Entry {entry.id}: Income = {entry.income}, Expenses = {entry.expenses}, "
+                f"Tax Rate = {entry.tax_rate}%"
+            )
+
+    return header, lines
+
+
+def chunk_lines(lines: list[str], budget: int) -> list[list[str]]:
+    """
+    Split lines into consecutive groups whose estimated size stays within a budget.
+
+    Args:
+        lines (list[str]): The lines to split.
+        budget (int): The maximum estimated number of tokens per group.
+
+    Returns:
+        list[list[str]]: The groups of lines.
+    """
+    chunks = [[]]
+    size = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line + "\n")
+        if chunks[-1] and size + line_tokens > budget:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(line)
+        size += line_tokens
+    return chunks
+
+
+def batch_prompt(texts: list[str]) -> str:
+    """
+    Build the prompt asking for advice on several pieces at once.
+
+    Args:
+        texts (list[str]): The text of every piece.
+
+    Returns:
+        str: The prompt, listing the pieces as a numbered list.
+    """
+    return PIECE_PREFIX + "\n".join(f"{number}. {text}" for number, text in enumerate(texts, 1))
+
+
+def parse_batch_advice(reply: str, count: int) -> list[str | None]:
+    """
+    Split the reply to a batch prompt into the advice on every piece.
+
+    The advice on a piece starts at the line beginning with its number, and goes on
+    until the next numbered line. The whole reply is the advice when the batch has a
+    single piece.
+
+    Args:
+        reply (str): The reply of the model to `batch_prompt`.
+        count (int): The number of pieces of the batch.
+
+    Returns:
+        list: The advice on every piece, None for the pieces the reply does not number.
+    """
+    if count == 1:
+        return [reply.strip() or None]
+    advice = [None] * count
+    current = None
+    for line in reply.splitlines():
+        match = NUMBERED_LINE.match(line)
+        if match:
+            # A number outside of the batch ends the advice of the previous item
+            current = int(match[1]) - 1 if 1 <= int(match[1]) <= count else None
+            if current is not None:
+                advice[current] = match[2].strip()
+        elif current is not None and line.strip():
+            advice[current] = f"{advice[current]} {line.strip()}".strip()
+    return [piece or None for piece in advice]
+
+
+def pieces_prompt(header: str, units: list[list], advice: dict[str, str | None], budget: int | None = None) -> AdvicePrompt:
+    """
+    Build the prompt asking for overall advice from the advice on every piece.
+
+    Pieces without advice are listed on their own. When the pieces are over the
+    budget, they are split into chunks summarized separately, as in map-reduce mode.
+
+    Args:
+        header (str): The header of the incremental prompt.
+        units (list[list]): The `[label, text]` pair of every piece.
+        advice (dict[str, str | None]): The advice on every piece, keyed by its text.
+        budget (int, optional): The maximum estimated number of tokens of a prompt. Default is PROMPT_TOKEN_BUDGET.
+
+    Returns:
+        AdvicePrompt: A summary prompt, or a map-reduce prompt when the pieces are over the budget.
+    """
+    lines = []
+    for label, text in units:
+        line = f"{label}: {text}" if label else text
+        if advice.get(text):
+            line += " Advice: " + " ".join(advice[text].split())
+        lines.append(line)
+
+    budget = budget or PROMPT_TOKEN_BUDGET
+    prompt = PIECES_PREFIX + header + "\n".join(lines)
+    if estimate_tokens(prompt) <= budget:
+        return AdvicePrompt("summary", prompt)
+    chunk_budget = budget - estimate_tokens(PIECES_MAP_PREFIX)
+    chunks = [PIECES_MAP_PREFIX + "\n".join(chunk) for chunk in chunk_lines(lines, chunk_budget)]
+    return AdvicePrompt("map-reduce", REDUCE_PREFIX + header, chunks)
+
+
+def incremental_prompt(db: Session, entries: list) -> AdvicePrompt:
+    """
+    Build the incremental prompt, which advises on every entry or summary line separately.
+
+    Entries are advised on without their ID, so that identical entries share their
+    stored advice.
+
+    Args:
+        db (Session): The database session.
+        entries (list): The entries read by `build_advice_prompt`, one more than
+            DETAIL_MAX_ROWS when the table is larger.
+
+    Returns:
+        AdvicePrompt: The incremental prompt.
+    """
+    if len(entries) <= DETAIL_MAX_ROWS:
+        header = [totals_line(get_totals(db))]
+        units = [
+            [f"Entry {entry.id}", f"Income = {entry.income}, Expenses = {entry.expenses}, Tax Rate = {entry.tax_rate}%"]
+            for entry in entries
+        ]
+    else:
+        # Every line of the summary is a bucket, which only changes with its entries
+        header, lines = summary_lines(db)
+        units = [[None, line] for line in lines]
+    return AdvicePrompt("incremental", "\n".join(header) + "\n", units=units)
+
+
+def build_advice_prompt(db: Session, budget: int = PROMPT_TOKEN_BUDGET, incremental: bool = False) -> AdvicePrompt | None:
+    """
+    Build the prompt asking for advice on the entries of the database.
+
+    Args:
+        db (Session): The database session.
+        budget (int): The maximum estimated number of tokens of a prompt. Default is PROMPT_TOKEN_BUDGET.
+        incremental (bool): Whether to build an incremental prompt. Default is False.
+
+    Returns:
+        AdvicePrompt: The prompt, or None if there are no entries.
+    """
+    # Read one entry more than can be listed, to know whether the table is small
+    # Only the listed columns are selected, as rows rather than ORM objects
+    entries = db.connection().execute(select(*PROMPT_COLUMNS).order_by(TaxInfo.id).limit(DETAIL_MAX_ROWS + 1)).all()
+    if not entries:
+        return None
+    if incremental:
+        return incremental_prompt(db, entries)
+    if len(entries) <= DETAIL_MAX_ROWS:
+        prompt = detailed_prompt(entries)
+        if estimate_tokens(prompt) <= budget:
+            return AdvicePrompt("detailed", prompt)
+
+    header, lines = summary_lines(db)
+    prompt = SUMMARY_PREFIX + "\n".join(header + lines)
+    if estimate_tokens(prompt) <= budget:
+        return AdvicePrompt("summary", prompt)
+
+    # The summary is too large for one prompt, each chunk is summarized separately
+    chunk_budget = budget - estimate_tokens(MAP_PREFIX)
+    chunks = [MAP_PREFIX + "\n".join(chunk) for chunk in chunk_lines(lines, chunk_budget)]
+    return AdvicePrompt("map-reduce", REDUCE_PREFIX + "\n".join(header) + "\n", chunks)
@@ -0,0 +1,254 @@
+"""
+Shared cache module.
+
+This module provides the cache shared by the worker processes of the application,
+configured with the `SHARED_CACHE_URL` environment variable:
+
+- `sqlite:///path/to/file.sqlite`: a SQLite file in write-ahead log mode, shared by
+  the workers of one machine. Reads are local file reads, in the page cache of the
+  operating system, and take microseconds.
+- `redis://host:6379/0` (or `rediss://`, `unix://`): a Redis-compatible server,
+  shared by the workers of several machines. It needs the `redis` package.
+
+The shared cache holds a data version, incremented by every write, which the change
+bus of `app.changes` compares with the version each worker last saw, and values
+with a time to live, used as the second tier of the page and advice caches.
+Without `SHARED_CACHE_URL` the caches and the change notifications stay in the
+worker process, which is enough for a single worker.
+
+Attributes:
+    SHARED_CACHE_URL (str, optional): The URL of the shared cache, read from the
+                                      `SHARED_CACHE_URL` environment variable.
+    shared_cache (SQLiteSharedCache | RedisSharedCache | None): The shared cache, or
+                                                                None if not configured.
+"""
+
+import os  # Module for interacting with the operating system
+import sqlite3  # Module used for the SQLite shared cache
+import threading  # Module used to keep one SQLite connection per thread
+import time  # Module used for the expiry times
+
+# URL of the cache shared by the workers, None to keep every cache in its worker
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL") or None
+
+
+def initial_version() -> int:
+    """
+    Return the first value of a version counter, the current time in milliseconds.
+
+    A counter does not start at 0, so that its values are not reused when the shared
+    cache is created again, and the ETags built from them stay unique.
+
+    Returns:
+        int: The first value of a counter.
+    """
+    return int(time.time() * 1000)
+
+
+class SQLiteSharedCache:
+    """
+    Shared cache in a SQLite file, for the workers of one machine.
+
+    Every thread keeps its own connection, so a version check costs one indexed
+    read without opening the file again.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS shared_cache_expires_at ON shared_cache (expires_at)")
+            connection.execute("CREATE TABLE IF NOT EXISTS shared_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return the connection of the current thread, opening it if needed.
+
+        Returns:
+            sqlite3.Connection: The connection, in write-ahead log mode with a busy
+                timeout, so readers do not wait for writers and concurrent writers
+                wait for each other instead of failing.
+        """
+        # A worker forked from the master must not use the connection it inherited
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a value.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            str: The value, or None if it is missing or expired.
+        """
+        row = self._connection().execute(
+            "SELECT value FROM shared_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: str, ttl: float):
+        """
+        Store a value.
+
+        Args:
+            key (str): The key.
+            value (str): The value.
+            ttl (float): The number of seconds the value stays valid.
+        """
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO shared_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+            )
+            # Expired rows are removed lazily, whenever a new value is written
+            connection.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+
+    def get_version(self, name: str) -> int:
+        """
+        Read a version counter.
+
+        Args:
+            name (str): The name of the counter.
+
+        Returns:
+            int: The value of the counter, created if needed.
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT version FROM shared_versions WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            return row[0]
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO shared_versions (name, version) VALUES (?, ?)", (name, initial_version())
+            )
+        return connection.execute("SELECT version FROM shared_versions WHERE name = ?", (name,)).fetchone()[0]
+
+    def bump_version(self, name: str) -> int:
+        """
+        Increment a version counter atomically.
+
+        Args:
+            name (str): The name of the counter.
+
+        Returns:
+            int: The new value of the counter.
+        """
+        with self._connection() as connection:
+            return connection.execute(
+                "INSERT INTO shared_versions (name, version) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET version = version + 1 RETURNING version",
+                (name, initial_version())
+            ).fetchone()[0]
+
+
+class RedisSharedCache:
+    """
+    Shared cache in a Redis-compatible server, for the workers of several machines.
+
+    Attributes:
+        url (str): The URL of the server.
+        prefix (str): The prefix of every key, so several applications can share a server.
+    """
+
+    def __init__(self, url: str, prefix: str = "tax:"):
+        # The client is only needed, and only has to be installed, when Redis is configured
+        import redis
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a value.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            str: The value, or None if it is missing or expired.
+        """
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: float):
+        """
+        Store a value, which the server expires by itself.
+
+        Args:
+            key (str): The key.
+            value (str): The value.
+            ttl (float): The number of seconds the value stays valid.
+        """
+        self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def get_version(self, name: str) -> int:
+        """
+        Read a version counter.
+
+        Args:
+            name (str): The name of the counter.
+
+        Returns:
+            int: The value of the counter, created if needed.
+        """
+        key = f"{self.prefix}version:{name}"
+        version = self._client.get(key)
+        if version is None:
+            self._client.set(key, initial_version(), nx=True)
+            version = self._client.get(key)
+        return int(version)
+
+    def bump_version(self, name: str) -> int:
+        """
+        Increment a version counter atomically.
+
+        Args:
+            name (str): The name of the counter.
+
+        Returns:
+            int: The new value of the counter.
+        """
+        key = f"{self.prefix}version:{name}"
+        self._client.set(key, initial_version(), nx=True)
+        return self._client.incr(key)
+
+
+def create_shared_cache(url: str | None):
+    """
+    Create the shared cache of a URL.
+
+    Args:
+        url (str, optional): A `sqlite:///` path or a `redis://`, `rediss://` or `unix://` URL.
+
+    Returns:
+        SQLiteSharedCache | RedisSharedCache | None: The shared cache, or None if no URL is given.
+
+    Raises:
+        ValueError: If the URL has another scheme.
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL {url!r}, expected sqlite:/// or redis://")
+
+
+# Cache shared by the workers, None when every cache stays in its worker
+shared_cache = create_shared_cache(SHARED_CACHE_URL)
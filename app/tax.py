@@ -0,0 +1,21 @@
+"""
+Tax calculation module.
+
+This module holds the tax rules shared by the routes that create entries, so that a
+single entry submitted through the form and a batch submitted through the bulk
+endpoint always get the same tax amount.
+"""
+
+
+def compute_tax_amount(expenses: float, tax_rate: float) -> float:
+    """
+    Calculate the tax amount of an entry.
+
+    Parameters:
+        expenses (float): The amount of expenses the tax applies to
+        tax_rate (float): The tax rate as a percentage
+
+    Returns:
+        float: The tax amount rounded to two decimals
+    """
+    return round(expenses * (tax_rate / 100), 2)
@@ -0,0 +1,194 @@
+"""
+Vectorized tax engine module.
+
+This module recomputes the tax of whole portfolios on columnar NumPy arrays instead
+of one entry at a time. The columns of `tax_info` are read in bulk batches, so a
+what-if scenario over millions of entries runs in constant memory, and every batch
+is computed with a few array operations.
+
+A scenario can replace the tax rate of every entry, change some tax rates, or apply
+a bracketed (progressive) schedule. Flat rates use the same formula as
+`compute_tax_amount` and the amounts are rounded with `round_amounts`, which gives
+exactly the same results as Python's `round(value, 2)` for every entry.
+
+Attributes:
+    SCENARIO_BATCH_SIZE (int): Number of entries read from the database per batch,
+                               read from the `SCENARIO_BATCH_SIZE` environment variable.
+"""
+
+import itertools  # Module used to flatten the fetched rows
+import os  # Module for interacting with the operating system
+from typing import Iterator  # Type hint for the column batches
+
+import numpy as np  # Array library used for the vectorized computation
+from sqlalchemy import select  # Core select used to fetch the columns
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .models import TaxInfo
+
+# Number of entries read from the database per batch
+SCENARIO_BATCH_SIZE = int(os.getenv("SCENARIO_BATCH_SIZE", "100000"))
+
+# Columns read from tax_info, in the order of the fetched rows
+COLUMNS = ("income", "expenses", "tax_rate", "tax_amount")
+
+
+def round_amounts(values: np.ndarray) -> np.ndarray:
+    """
+    Round amounts to two decimals exactly like Python's `round(value, 2)`.
+
+    `round` rounds the exact binary value of a float, while scaling by 100 in
+    floating point can move a value that is just below or above a half cent onto
+    the other side. The scaled values that are within a few units in the last place
+    of a half cent, or too large to scale exactly, are rounded again with `round`.
+
+    Args:
+        values (np.ndarray): The amounts to round.
+
+    Returns:
+        np.ndarray: The rounded amounts.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.abs(np.spacing(scaled))
+    ambiguous |= np.abs(scaled) >= 2 ** 52
+    for index in np.flatnonzero(ambiguous):
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def compute_tax_amounts(expenses: np.ndarray, tax_rates: np.ndarray) -> np.ndarray:
+    """
+    Calculate the tax amounts of many entries, like `compute_tax_amount` does for one.
+
+    Args:
+        expenses (np.ndarray): The expenses the tax applies to.
+        tax_rates (np.ndarray): The tax rates as percentages.
+
+    Returns:
+        np.ndarray: The tax amounts rounded to two decimals.
+    """
+    return round_amounts(np.asarray(expenses, dtype=np.float64) * (np.asarray(tax_rates, dtype=np.float64) / 100))
+
+
+def progressive_tax(base: np.ndarray, brackets: list[tuple[float | None, float]]) -> np.ndarray:
+    """
+    Calculate the tax of a bracketed schedule, where every rate applies to the part
+    of the base that falls into its bracket.
+
+    Args:
+        base (np.ndarray): The amounts the tax applies to.
+        brackets (list[tuple]): The brackets in ascending order, each a tuple of the
+            upper bound of the bracket (None for the last, open ended bracket) and
+            its rate as a percentage.
+
+    Returns:
+        np.ndarray: The tax amounts rounded to two decimals.
+    """
+    base = np.asarray(base, dtype=np.float64)
+    tax = np.zeros_like(base)
+    lower = 0.0
+    for upper, rate in brackets:
+        upper = np.inf if upper is None else upper
+        # Part of the base between the bounds of the bracket
+        tax += np.clip(base - lower, 0, upper - lower) * (rate / 100)
+        lower = upper
+    return round_amounts(tax)
+
+
+def iter_columns(db: Session, batch_size: int = SCENARIO_BATCH_SIZE) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Read the columns of every entry in batches of arrays.
+
+    Args:
+        db (Session): The database session.
+        batch_size (int): The number of entries per batch. Default is SCENARIO_BATCH_SIZE.
+
+    Yields:
+        dict: The income, expenses, tax_rate and tax_amount arrays of a batch.
+    """
+    result = db.connection().execute(select(*(getattr(TaxInfo, name) for name in COLUMNS)))
+    try:
+        # Fetch plain tuples from the DBAPI cursor, skipping the Row objects of the result
+        while rows := result.cursor.fetchmany(batch_size):
+            # Flatten the rows into one buffer instead of building an array per row
+            flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64, count=len(rows) * len(COLUMNS))
+            matrix = flat.reshape(len(rows), len(COLUMNS))
+            yield {name: matrix[:, index] for index, name in enumerate(COLUMNS)}
+    finally:
+        result.close()
+
+
+def scenario_tax(columns: dict[str, np.ndarray], scenario) -> np.ndarray:
+    """
+    Calculate the tax of a batch of entries under a scenario.
+
+    Args:
+        columns (dict): The arrays of a batch, as yielded by `iter_columns`.
+        scenario (TaxScenario): The scenario.
+
+    Returns:
+        np.ndarray: The tax amounts of the scenario.
+    """
+    base = columns[scenario.base]
+    if scenario.brackets:
+        return progressive_tax(base, [(bracket.up_to, bracket.rate) for bracket in scenario.brackets])
+
+    rates = columns["tax_rate"].copy()
+    for old_rate, new_rate in scenario.rate_changes.items():
+        rates[columns["tax_rate"] == old_rate] = new_rate
+    if scenario.rate is not None:
+        rates[:] = scenario.rate
+    return compute_tax_amounts(base, rates)
+
+
+def scenario_totals(db: Session, scenario, batch_size: int = SCENARIO_BATCH_SIZE) -> dict:
+    """
+    Calculate the totals of every entry under a scenario, next to the current totals.
+
+    Args:
+        db (Session): The database session.
+        scenario (TaxScenario): The scenario.
+        batch_size (int): The number of entries per batch. Default is SCENARIO_BATCH_SIZE.
+
+    Returns:
+        dict: The entry count, total income, total expenses, current and scenario
+            tax, their difference, and a breakdown of the tax per current tax rate.
+    """
+    groups = {}  # Maps a tax rate to an array [entry_count, current_tax, scenario_tax]
+    totals = np.zeros(3)  # Income, expenses and entry count
+    for columns in iter_columns(db, batch_size):
+        tax = scenario_tax(columns, scenario)
+        totals += (columns["income"].sum(), columns["expenses"].sum(), len(tax))
+
+        # Sum the tax per tax rate of the batch
+        rates, inverse = np.unique(columns["tax_rate"], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(rates))
+        current = np.bincount(inverse, weights=columns["tax_amount"], minlength=len(rates))
+        new = np.bincount(inverse, weights=tax, minlength=len(rates))
+        for index, rate in enumerate(rates.tolist()):
+            groups.setdefault(rate, np.zeros(3))
+            groups[rate] += (counts[index], current[index], new[index])
+
+    breakdown = [
+        {
+            "tax_rate": rate,
+            "entry_count": int(count),
+            "current_tax": round(float(current), 2),
+            "scenario_tax": round(float(new), 2),
+        }
+        for rate, (count, current, new) in sorted(groups.items())
+    ]
+    current_tax = sum(float(group[1]) for group in groups.values())
+    new_tax = sum(float(group[2]) for group in groups.values())
+    return {
+        "entry_count": int(totals[2]),
+        "total_income": round(float(totals[0]), 2),
+        "total_expenses": round(float(totals[1]), 2),
+        "current_tax": round(current_tax, 2),
+        "scenario_tax": round(new_tax, 2),
+        "difference": round(new_tax - current_tax, 2),
+        "breakdown": breakdown,
+    }
@@ -0,0 +1,275 @@
+"""
+Running totals module.
+
+This module maintains the `tax_totals` aggregate table, which stores the sums of
+income, expenses and tax per tax rate. The write routes call `add_to_totals` and
+`remove_from_totals` inside their own transaction so that the aggregate always
+matches the `tax_info` table, and the home page reads the totals with
+`get_totals` instead of summing every entry.
+
+The module can also be run as a command to rebuild or verify the aggregate:
+
+    python -m app.totals verify
+    python -m app.totals rebuild
+
+A rebuild ends with `notify_data_change`, so running web workers sharing the
+`SHARED_CACHE_URL` of the command drop the pages rendered from the old totals.
+"""
+
+import sys  # Module used for the command line arguments and exit code
+from sqlalchemy import func, update, delete  # SQL expression helpers
+from sqlalchemy.dialects import postgresql, sqlite  # Dialects supporting ON CONFLICT upserts
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .changes import notify_data_change
+from .database import SessionLocal
+from .models import TaxInfo, TaxTotals
+
+# Maximum difference tolerated between the aggregate and the recomputed sums
+TOTALS_TOLERANCE = 0.005
+
+
+def _upsert_totals(db: Session, tax_rate: float, count: int, income: float, expenses: float, tax: float):
+    """
+    Add the given amounts to the totals row of a tax rate, creating the row if needed.
+
+    SQLite and PostgreSQL use an atomic `INSERT ... ON CONFLICT DO UPDATE`, so
+    concurrent writers cannot race on the creation of the row. Other backends fall
+    back to a read followed by an update.
+
+    Args:
+        db (Session): The database session used by the current transaction.
+        tax_rate (float): The tax rate of the totals row.
+        count (int): Number of entries to add.
+        income (float): Income to add.
+        expenses (float): Expenses to add.
+        tax (float): Tax amount to add.
+    """
+    values = {
+        "tax_rate": tax_rate,
+        "entry_count": count,
+        "total_income": income,
+        "total_expenses": expenses,
+        "total_tax": tax,
+    }
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = insert(TaxTotals).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[TaxTotals.tax_rate],
+            set_={
+                "entry_count": TaxTotals.entry_count + statement.excluded.entry_count,
+                "total_income": TaxTotals.total_income + statement.excluded.total_income,
+                "total_expenses": TaxTotals.total_expenses + statement.excluded.total_expenses,
+                "total_tax": TaxTotals.total_tax + statement.excluded.total_tax,
+            },
+        )
+        db.execute(statement)
+        return
+
+    # Generic fallback for backends without ON CONFLICT support
+    row = db.get(TaxTotals, tax_rate)
+    if row is None:
+        db.add(TaxTotals(**values))
+    else:
+        row.entry_count += count
+        row.total_income += income
+        row.total_expenses += expenses
+        row.total_tax += tax
+
+
+def add_to_totals(db: Session, tax_rate: float, income: float, expenses: float, tax: float, count: int = 1):
+    """
+    Add one entry (or an already aggregated group of entries) to the running totals.
+
+    The change is not committed; it becomes part of the caller's transaction.
+
+    Args:
+        db (Session): The database session used by the current transaction.
+        tax_rate (float): The tax rate of the entries.
+        income (float): Income of the entries.
+        expenses (float): Expenses of the entries.
+        tax (float): Tax amount of the entries.
+        count (int): Number of entries represented by the amounts. Default is 1.
+    """
+    _upsert_totals(db, tax_rate, count, income, expenses, tax)
+
+
+def remove_from_totals(db: Session, tax_rate: float, income: float, expenses: float, tax: float, count: int = 1):
+    """
+    Subtract one entry (or an aggregated group of entries) from the running totals.
+
+    Rows whose entry count drops to zero are removed so that floating point
+    residue does not accumulate in rates that are no longer used. The change is not
+    committed; it becomes part of the caller's transaction.
+
+    Args:
+        db (Session): The database session used by the current transaction.
+        tax_rate (float): The tax rate of the entries.
+        income (float): Income of the entries.
+        expenses (float): Expenses of the entries.
+        tax (float): Tax amount of the entries.
+        count (int): Number of entries represented by the amounts. Default is 1.
+    """
+    db.execute(
+        update(TaxTotals)
+        .where(TaxTotals.tax_rate == tax_rate)
+        .values(
+            entry_count=TaxTotals.entry_count - count,
+            total_income=TaxTotals.total_income - income,
+            total_expenses=TaxTotals.total_expenses - expenses,
+            total_tax=TaxTotals.total_tax - tax,
+        )
+    )
+    db.execute(delete(TaxTotals).where(TaxTotals.tax_rate == tax_rate, TaxTotals.entry_count <= 0))
+
+
+def clear_totals(db: Session):
+    """
+    Remove every row of the running totals.
+
+    Used together with deleting all entries. The change is not committed.
+
+    Args:
+        db (Session): The database session used by the current transaction.
+    """
+    db.execute(delete(TaxTotals))
+
+
+def get_totals(db: Session) -> dict:
+    """
+    Read the overall totals and the per tax rate breakdown from the aggregate table.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        dict: A dictionary with the following keys:
+            - total_income: The total income of all entries.
+            - total_expenses: The total expenses of all entries.
+            - total_tax: The total tax amount of all entries.
+            - entry_count: The number of entries.
+            - breakdown: A list of dictionaries with the same totals per tax rate.
+    """
+    rows = db.query(TaxTotals).order_by(TaxTotals.tax_rate).all()
+    breakdown = [
+        {
+            "tax_rate": row.tax_rate,
+            "entry_count": row.entry_count,
+            "total_income": round(row.total_income, 2),
+            "total_expenses": round(row.total_expenses, 2),
+            "total_tax": round(row.total_tax, 2),
+        }
+        for row in rows
+    ]
+    return {
+        "total_income": round(sum(row.total_income for row in rows), 2),
+        "total_expenses": round(sum(row.total_expenses for row in rows), 2),
+        "total_tax": round(sum(row.total_tax for row in rows), 2),
+        "entry_count": sum(row.entry_count for row in rows),
+        "breakdown": breakdown,
+    }
+
+
+def compute_totals(db: Session) -> dict:
+    """
+    Recompute the totals per tax rate directly from the `tax_info` table.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        dict: A mapping of tax rate to a tuple (entry_count, income, expenses, tax).
+    """
+    rows = db.query(
+        TaxInfo.tax_rate,
+        func.count(TaxInfo.id),
+        func.sum(TaxInfo.income),
+        func.sum(TaxInfo.expenses),
+        func.sum(TaxInfo.tax_amount),
+    ).group_by(TaxInfo.tax_rate).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def rebuild_totals(db: Session):
+    """
+    Replace the aggregate table with totals recomputed from the `tax_info` table.
+
+    Args:
+        db (Session): The database session. The rebuild is committed.
+    """
+    clear_totals(db)
+    for tax_rate, (count, income, expenses, tax) in compute_totals(db).items():
+        db.add(TaxTotals(
+            tax_rate=tax_rate,
+            entry_count=count,
+            total_income=income,
+            total_expenses=expenses,
+            total_tax=tax,
+        ))
+    db.commit()
+
+
+def verify_totals(db: Session) -> list[str]:
+    """
+    Compare the aggregate table against totals recomputed from the `tax_info` table.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        list[str]: A description of every mismatching tax rate. Empty if the
+            aggregate is consistent.
+    """
+    expected = compute_totals(db)
+    stored = {
+        row.tax_rate: (row.entry_count, row.total_income, row.total_expenses, row.total_tax)
+        for row in db.query(TaxTotals).all()
+    }
+
+    mismatches = []
+    for tax_rate in sorted(set(expected) | set(stored)):
+        want = expected.get(tax_rate, (0, 0.0, 0.0, 0.0))
+        have = stored.get(tax_rate, (0, 0.0, 0.0, 0.0))
+        if want[0] != have[0] or any(abs(w - h) > TOTALS_TOLERANCE for w, h in zip(want[1:], have[1:])):
+            mismatches.append(f"Tax rate {tax_rate}: expected {want}, stored {have}")
+    return mismatches
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command line entry point to verify or rebuild the running totals.
+
+    Args:
+        argv (list[str], optional): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code, 1 if verification found mismatches.
+    """
+    args = sys.argv[1:] if argv is None else argv
+    command = args[0] if args else "verify"
+    if command not in ("verify", "rebuild"):
+        print("Usage: python -m app.totals [verify|rebuild]")
+        return 2
+
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            rebuild_totals(db)
+            notify_data_change()
+            print("Totals rebuilt.")
+            return 0
+
+        mismatches = verify_totals(db)
+        for mismatch in mismatches:
+            print(mismatch)
+        print("Totals are consistent." if not mismatches else f"{len(mismatches)} mismatching tax rate(s).")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Export and import module.
+
+This module moves the whole `tax_info` table in and out of the application as CSV,
+NDJSON or Parquet files. Exports read the entries in batches of STREAM_BATCH_SIZE
+rows with `yield_per`, which uses a server-side cursor where the database has one,
+and encode every batch to a chunk of the file as soon as it is fetched, so memory
+stays constant regardless of the size of the table. Parquet files get one row group
+per batch.
+
+Imports go through the bulk ingestion of `app.bulk`, with the same parsing and
+validation as the "/bulk/" route: CSV and NDJSON files are read line by line and
+Parquet files are memory-mapped and read one record batch at a time. The `id` and
+`tax_amount` columns of an exported file are ignored on import: the entries get new
+IDs and their tax is calculated again from their expenses and tax rate.
+
+The module can be run as a command line tool:
+
+    python -m app.transfer export entries.parquet [--format parquet]
+    python -m app.transfer import entries.parquet [--chunk-size 20000]
+
+The format is taken from the file extension unless `--format` is given, and "-"
+reads from the standard input or writes to the standard output (CSV and NDJSON only).
+An import ends with `notify_data_change`, so running web workers sharing the
+`SHARED_CACHE_URL` of the tool drop their cached pages and advice; workers without
+a shared cache keep serving their cached results until they are restarted.
+
+Attributes:
+    EXPORT_FORMATS (dict): The media type of every export format, keyed by name.
+    PARQUET_SCHEMA_FIELDS (tuple): The Arrow type name of every exported column.
+"""
+
+import argparse  # Module for parsing the command line arguments
+import csv  # Module used to write the CSV exports
+import io  # Module used to buffer the encoded chunks
+import os  # Module for interacting with the operating system
+import sys  # Module used to read and write the standard streams
+from typing import Callable, Iterable, Iterator  # Type hints for the session factory and generators
+import orjson  # Fast JSON encoder used for the NDJSON exports
+from sqlalchemy.orm import Session  # SQLAlchemy session type
+
+from .bulk import BULK_CHUNK_SIZE, ingest_rows, iter_csv, iter_ndjson
+from .listing import ENTRY_FIELDS, EntryFilter, iter_entry_batches
+
+# Media type of every export format
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# File extensions recognized for every format
+FORMAT_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".parquet": "parquet",
+}
+
+# Size above which a Parquet request body is spooled to disk, in bytes
+PARQUET_SPOOL_SIZE = 16 * 1024 * 1024
+
+# Arrow type of every exported column, in the order of ENTRY_FIELDS
+PARQUET_SCHEMA_FIELDS = (
+    ("id", "int64"),
+    ("income", "float64"),
+    ("expenses", "float64"),
+    ("tax_amount", "float64"),
+    ("tax_rate", "float64"),
+    ("description", "string"),
+)
+
+
+def format_from_filename(filename: str) -> str | None:
+    """
+    Return the format of a file from its extension.
+
+    Args:
+        filename (str): The file name.
+
+    Returns:
+        str: "csv", "ndjson" or "parquet", or None if the extension is not recognized.
+    """
+    return FORMAT_EXTENSIONS.get(os.path.splitext(filename.lower())[1])
+
+
+def load_parquet():
+    """
+    Import pyarrow and its Parquet module.
+
+    pyarrow is imported by the first Parquet export or import rather than by every
+    worker at startup.
+
+    Returns:
+        tuple: The `pyarrow` and `pyarrow.parquet` modules.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    return pyarrow, pyarrow.parquet
+
+
+def encode_csv(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """
+    Encode batches of entry rows as a CSV document with a header line.
+
+    Args:
+        batches (Iterable[list[tuple]]): The rows, with the columns of ENTRY_FIELDS.
+
+    Yields:
+        bytes: The header line, then one chunk per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(ENTRY_FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_ndjson(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """
+    Encode batches of entry rows as NDJSON, one object per line.
+
+    Args:
+        batches (Iterable[list[tuple]]): The rows, with the columns of ENTRY_FIELDS.
+
+    Yields:
+        bytes: One chunk per batch.
+    """
+    for rows in batches:
+        yield b"".join(orjson.dumps(dict(zip(ENTRY_FIELDS, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file collecting what the Parquet writer writes until it is drained.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def encode_parquet(batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    """
+    Encode batches of entry rows as a Parquet file, one row group per batch.
+
+    Args:
+        batches (Iterable[list[tuple]]): The rows, with the columns of ENTRY_FIELDS.
+
+    Yields:
+        bytes: The bytes of every row group as soon as it is written, then the footer.
+    """
+    pyarrow, parquet = load_parquet()
+    schema = pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in PARQUET_SCHEMA_FIELDS])
+    sink = _ChunkSink()
+    writer = parquet.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            if not rows:
+                continue
+            columns = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Encoder of every export format
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "parquet": encode_parquet,
+}
+
+
+def iter_export(db: Session, export_format: str, entry_filter: EntryFilter | None = None) -> Iterator[bytes]:
+    """
+    Export the entries in a format, one chunk per batch of rows read from the database.
+
+    Args:
+        db (Session): The database session.
+        export_format (str): "csv", "ndjson" or "parquet".
+        entry_filter (EntryFilter, optional): The filters and sort order. Every entry
+            is exported in ID order if not set.
+
+    Yields:
+        bytes: The chunks of the file.
+    """
+    yield from ENCODERS[export_format](iter_entry_batches(db, entry_filter=entry_filter))
+
+
+def stream_export(
+    session_factory: Callable[[], Session],
+    export_format: str,
+    entry_filter: EntryFilter | None = None,
+) -> Iterator[bytes]:
+    """
+    Stream an export from its own database session.
+
+    The generator owns its own database session because it keeps running after
+    the route function has returned, while the response body is being sent.
+
+    Args:
+        session_factory (Callable): A factory returning new database sessions.
+        export_format (str): "csv", "ndjson" or "parquet".
+        entry_filter (EntryFilter, optional): The filters and sort order.
+
+    Yields:
+        bytes: The chunks of the file.
+    """
+    db = session_factory()
+    try:
+        yield from iter_export(db, export_format, entry_filter)
+    finally:
+        db.close()
+
+
+def iter_parquet(source, batch_size: int = BULK_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Read the rows of a Parquet file one record batch at a time.
+
+    The footer of the file is read immediately, so a file that is not valid Parquet
+    is rejected before the first row is requested.
+
+    Args:
+        source: The path of the file, which is memory-mapped, or a seekable binary file.
+        batch_size (int): The number of rows decoded at a time. Default is BULK_CHUNK_SIZE.
+
+    Returns:
+        Iterator[dict]: The rows keyed by column name.
+
+    Raises:
+        ValueError: If the file is not a valid Parquet file.
+    """
+    _, parquet = load_parquet()
+    parquet_file = parquet.ParquetFile(source, memory_map=isinstance(source, str))
+    return (row for batch in parquet_file.iter_batches(batch_size=batch_size) for row in batch.to_pylist())
+
+
+def import_file(db: Session, path: str, import_format: str | None = None, chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Insert the entries of a CSV, NDJSON or Parquet file.
+
+    Args:
+        db (Session): The database session.
+        path (str): The path of the file, or "-" for the standard input (CSV and NDJSON only).
+        import_format (str, optional): The format of the file. Taken from the extension if not set.
+        chunk_size (int): The number of rows per transaction. Default is BULK_CHUNK_SIZE.
+
+    Returns:
+        dict: The number of `inserted` rows and the list of row `errors`.
+
+    Raises:
+        ValueError: If the format is unknown, or Parquet is read from the standard input.
+    """
+    import_format = import_format or format_from_filename(path)
+    if import_format not in ENCODERS:
+        raise ValueError(f"Unknown format for {path}, expected .csv, .ndjson, .jsonl or .parquet")
+
+    if import_format == "parquet":
+        if path == "-":
+            raise ValueError("Parquet files cannot be read from the standard input")
+        return ingest_rows(db, iter_parquet(path, chunk_size), chunk_size)
+
+    parse = iter_csv if import_format == "csv" else iter_ndjson
+    if path == "-":
+        text = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+        return ingest_rows(db, parse(text), chunk_size)
+    with open(path, encoding="utf-8-sig", newline="") as text:
+        return ingest_rows(db, parse(text), chunk_size)
+
+
+def export_file(db: Session, path: str, export_format: str | None = None) -> None:
+    """
+    Write every entry to a CSV, NDJSON or Parquet file.
+
+    Args:
+        db (Session): The database session.
+        path (str): The path of the file, or "-" for the standard output (CSV and NDJSON only).
+        export_format (str, optional): The format of the file. Taken from the extension if not set.
+
+    Raises:
+        ValueError: If the format is unknown, or Parquet is written to the standard output.
+    """
+    export_format = export_format or format_from_filename(path)
+    if export_format not in ENCODERS:
+        raise ValueError(f"Unknown format for {path}, expected .csv, .ndjson, .jsonl or .parquet")
+    if path == "-" and export_format == "parquet":
+        raise ValueError("Parquet files cannot be written to the standard output")
+
+    if path == "-":
+        for chunk in iter_export(db, export_format):
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return
+
+    with open(path, "wb") as output:
+        try:
+            for chunk in iter_export(db, export_format):
+                output.write(chunk)
+        except BaseException:
+            # Do not leave a truncated file behind, the file is only removed once opened
+            output.close()
+            os.remove(path)
+            raise
+
+
+def main():
+    """
+    Run the export or the import given on the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(ENCODERS), default=None)
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from .changes import notify_data_change
+    from .database import SessionLocal, ReadSessionLocal, engine
+    from .migrations import RUN_MIGRATIONS, run_migrations
+
+    try:
+        if args.command == "export":
+            with ReadSessionLocal() as db:
+                export_file(db, args.path, args.format)
+            return
+
+        if RUN_MIGRATIONS:
+            run_migrations(engine)
+        with SessionLocal() as db:
+            result = import_file(db, args.path, args.format, args.chunk_size)
+        if result["inserted"]:
+            notify_data_change()
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"{e}\n")
+
+    for error in result["errors"]:
+        print(f"Row {error['row']}: {error['detail']}", file=sys.stderr)
+    print(f"{result['inserted']} entries inserted, {len(result['errors'])} rows rejected", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
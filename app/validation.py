@@ -1,14 +1,29 @@
+import math
+
 from fastapi import HTTPException
 
 
+def validate_finite_number(value: float, field_name: str):
+    """
+    Check if a given number is finite and raise an exception if it is infinite or NaN
+
+    Parameters:
+        value (float): The value to be checked
+        field_name (str): The name of the value that is checked
+    """
+    if not math.isfinite(value):
+        raise HTTPException(status_code=400, detail=f"{field_name} must be a finite number")
+
+
 def validate_positive_number(value: float, field_name: str):
     """
-    Check if a given number is positive and raise an exception if it is a negative number
+    Check if a given number is finite and positive and raise an exception if it is not
 
     Parameters:
         value (float): The value to be checked
         field_name (str): The name of the value that is checked
     """
+    validate_finite_number(value, field_name)
     if value < 0:
         raise HTTPException(status_code=400, detail=f"{field_name} must be a positive number")
 
@@ -34,3 +49,44 @@ def validate_expenses(expenses: float):
     
     '''
     validate_positive_number(expenses, "Expenses")
+
+
+def validate_tax_rate(tax_rate: float):
+    '''
+    Invoke validate_finite_number() with the proper field name to raise an exception 
+
+    Parameters:
+        tax_rate (float): the tax rate in percent
+    
+    '''
+    validate_finite_number(tax_rate, "Tax rate")
+
+
+def validate_entries(rows: list[dict]) -> dict[int, str]:
+    '''
+    Validate the income and expenses of a batch of entries with the same rules as validate_income() and validate_expenses()
+
+    Each column is checked as a whole first, so a batch without invalid values costs one
+    min() and one isfinite() pass per column. Only columns holding a negative, infinite
+    or NaN value are checked row by row.
+
+    Parameters:
+        rows (list[dict]): the entries, each with an "income" and an "expenses" key
+
+    Returns:
+        dict[int, str]: the error detail of every invalid entry, keyed by its position in the batch
+    '''
+    errors = {}
+    for field, validate in (("income", validate_income), ("expenses", validate_expenses)):
+        column = [row[field] for row in rows]
+        # NaN compares false with everything, so min() alone can let it through
+        if not column or (min(column) >= 0 and all(map(math.isfinite, column))):
+            continue
+        for index, value in enumerate(column):
+            if index in errors:
+                continue
+            try:
+                validate(value)
+            except HTTPException as e:
+                errors[index] = e.detail
+    return errors
@@ -0,0 +1,68 @@
+"""
+Throughput benchmark for the bulk ingestion of tax entries.
+
+This benchmark inserts synthetic rows into a temporary SQLite database with
+`ingest_rows`, the function behind the "/bulk/" route, and reports the number of
+rows inserted per second for each chunk size. The target is at least 50k rows per
+second on one core.
+
+Usage:
+    python -m benchmarks.bench_bulk [--rows 200000] [--chunk-sizes 1000 5000 20000]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import tempfile  # Module used to create the temporary databases
+import time  # Module used to measure durations
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.bulk import ingest_rows
+from app.migrations import run_migrations
+
+
+def run(rows: int, chunk_size: int) -> float:
+    """
+    Insert the given number of rows into a new database.
+
+    Args:
+        rows (int): The number of rows to insert.
+        chunk_size (int): The number of rows per transaction.
+
+    Returns:
+        float: The number of rows inserted per second.
+    """
+    path = os.path.join(tempfile.mkdtemp(), "bench_bulk.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    raw = (
+        {"income": 1000 + i % 500, "expenses": 100 + i % 97, "tax_rate": (10, 24)[i % 2], "description": f"Row {i}"}
+        for i in range(rows)
+    )
+    start = time.perf_counter()
+    result = ingest_rows(db, raw, chunk_size)
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    assert result["inserted"] == rows and not result["errors"]
+    return rows / elapsed
+
+
+def main():
+    """
+    Run the benchmark for every chunk size and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    for chunk_size in args.chunk_sizes:
+        print(f"chunk size {chunk_size:>6}: {run(args.rows, chunk_size):10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Concurrent read/write benchmark for the database engine profiles.
+
+This benchmark runs a mix of writes, like the "/submit/" route (insert an entry and
+update the running totals), and reads, like the "/" route (one page of entries and
+the totals), from many threads against a temporary SQLite database. It compares:
+
+- default: the engine as it was created before the profiles, with a rollback
+  journal, `synchronous=FULL` and one pool shared by readers and writers.
+- profile: the write and read engines of `create_app_engine`, with WAL, tuned
+  pragmas and a single writer connection.
+
+For each profile it reports the operations per second, the p50/p99 latency of reads
+and writes, and the number of operations that failed with "database is locked".
+
+Usage:
+    python -m benchmarks.bench_concurrency [--threads 32] [--seconds 5] [--write-ratio 0.3]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import random  # Module used to pick the operation of every iteration
+import statistics  # Module used to compute latency percentiles
+import tempfile  # Module used to create the temporary databases
+import threading  # Module used to run the concurrent clients
+import time  # Module used to measure durations
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import create_app_engine
+from app.listing import fetch_page
+from app.migrations import run_migrations
+from app.models import TaxInfo
+from app.totals import add_to_totals, get_totals
+
+
+def write(session_factory):
+    """
+    Insert an entry and update the running totals, like the submit route.
+    """
+    db = session_factory()
+    try:
+        entry = TaxInfo(income=1000, expenses=100, tax_amount=24, tax_rate=24, description="Benchmark")
+        db.add(entry)
+        add_to_totals(db, entry.tax_rate, entry.income, entry.expenses, entry.tax_amount)
+        db.commit()
+    finally:
+        db.close()
+
+
+def read(session_factory):
+    """
+    Read a page of entries and the totals, like the home route.
+    """
+    db = session_factory()
+    try:
+        fetch_page(db, limit=50)
+        get_totals(db)
+    finally:
+        db.close()
+
+
+def run(name: str, write_factory, read_factory, threads: int, seconds: float, write_ratio: float):
+    """
+    Run the mixed workload from many threads and print the results.
+
+    Args:
+        name (str): The name of the profile.
+        write_factory (sessionmaker): The session factory used for writes.
+        read_factory (sessionmaker): The session factory used for reads.
+        threads (int): The number of concurrent clients.
+        seconds (float): The duration of the run.
+        write_ratio (float): The share of operations that are writes.
+    """
+    latencies = {"read": [], "write": []}
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def client(seed):
+        generator = random.Random(seed)
+        while time.perf_counter() < deadline:
+            kind = "write" if generator.random() < write_ratio else "read"
+            start = time.perf_counter()
+            try:
+                if kind == "write":
+                    write(write_factory)
+                else:
+                    read(read_factory)
+            except OperationalError as e:
+                errors.append(str(e.orig))
+                continue
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=client, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    operations = len(latencies["read"]) + len(latencies["write"])
+    print(f"{name:>8}: {operations / seconds:8.0f} ops/s, {len(errors)} errors")
+    for kind, values in latencies.items():
+        if len(values) > 1:
+            p99 = statistics.quantiles(values, n=100)[98]
+            print(f"          {kind:<5} {len(values):6d} ops  p50 {statistics.median(values):8.2f} ms  p99 {p99:8.2f} ms")
+
+
+def main():
+    """
+    Run the benchmark for both profiles.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'default.sqlite')}"
+    default_engine = create_engine(url, connect_args={"check_same_thread": False})
+    run_migrations(default_engine)
+    default_factory = sessionmaker(autocommit=False, autoflush=False, bind=default_engine)
+    run("default", default_factory, default_factory, args.threads, args.seconds, args.write_ratio)
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'profile.sqlite')}"
+    write_engine = create_app_engine(url)
+    run_migrations(write_engine)
+    read_engine = create_app_engine(url, read_only=True)
+    run(
+        "profile",
+        sessionmaker(autocommit=False, autoflush=False, bind=write_engine),
+        sessionmaker(autocommit=False, autoflush=False, bind=read_engine),
+        args.threads, args.seconds, args.write_ratio
+    )
+
+
+if __name__ == "__main__":
+    main()
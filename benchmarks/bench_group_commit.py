@@ -0,0 +1,113 @@
+"""
+Throughput benchmark of the "/submit/" route with and without group commit.
+
+This benchmark sends "/submit/" requests from 1, 10 and 100 concurrent clients,
+in-process through httpx's ASGI transport, against a temporary SQLite database
+with the engine settings of the application. It compares:
+
+- per-request: every submission commits its own transaction.
+- group: the submissions are queued for the group writer of `app.group_commit`,
+  which commits them together.
+
+For every mode and number of clients it reports the submissions per second, the
+p50/p99 latency of a submission and the average number of entries per transaction.
+The cost of a commit depends on the durability level, which is set with the
+`SQLITE_SYNCHRONOUS` environment variable (`FULL` syncs every commit to disk).
+
+Usage:
+    python -m benchmarks.bench_group_commit [--clients 1 10 100] [--seconds 3] [--max-rows 100] [--delay-ms 0]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import asyncio  # Module used to run the concurrent clients
+import os  # Module for interacting with the operating system
+import statistics  # Module used to compute latency percentiles
+import tempfile  # Module used to create the temporary databases
+import time  # Module used to measure durations
+
+import httpx  # HTTP client with an in-process ASGI transport
+from sqlalchemy.orm import sessionmaker
+
+from app import main as app_module
+from app.database import SQLITE_SYNCHRONOUS, create_app_engine
+from app.group_commit import GroupCommitWriter
+from app.main import app, get_db, get_session_factory
+from app.migrations import run_migrations
+
+
+async def run(clients: int, seconds: float, group: bool, max_rows: int, delay_ms: float) -> tuple:
+    """
+    Send submissions from concurrent clients for a fixed duration.
+
+    Args:
+        clients (int): The number of concurrent clients.
+        seconds (float): The duration of the run.
+        group (bool): Whether the submissions go through the group writer.
+        max_rows (int): The largest number of entries per transaction of the group writer.
+        delay_ms (float): The number of milliseconds the group writer waits for more entries.
+
+    Returns:
+        tuple: The number of submissions, their latencies in milliseconds and the
+            number of transactions.
+    """
+    engine = create_app_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'submit.sqlite')}")
+    run_migrations(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    writer = GroupCommitWriter(max_rows=max_rows, delay_ms=delay_ms)
+    app_module.GROUP_COMMIT = group
+    app_module.group_writer = writer
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def submit_loop(seed):
+            i = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post("/submit/", data={"income": 1000 + seed, "expenses": i % 900, "tax_rate": 24})
+                assert response.status_code == 303
+                latencies.append((time.perf_counter() - start) * 1000)
+                i += 1
+
+        await asyncio.gather(*(submit_loop(seed) for seed in range(clients)))
+    await writer.stop()
+    engine.dispose()
+    return len(latencies), latencies, writer.transactions if group else len(latencies)
+
+
+def main():
+    """
+    Run the benchmark for every number of clients, without and with group commit.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--max-rows", type=int, default=100)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    print(f"SQLITE_SYNCHRONOUS={SQLITE_SYNCHRONOUS}")
+    for clients in args.clients:
+        for group in (False, True):
+            count, latencies, transactions = asyncio.run(run(clients, args.seconds, group, args.max_rows, args.delay_ms))
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+            print(
+                f"{clients:>4} clients  {'group' if group else 'per-request':<12} {count / args.seconds:8.0f} submits/s  "
+                f"p50 {statistics.median(latencies):7.2f} ms  p99 {p99:7.2f} ms  "
+                f"{count / max(transactions, 1):6.1f} entries/transaction"
+            )
+
+
+if __name__ == "__main__":
+    main()
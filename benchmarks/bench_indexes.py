@@ -0,0 +1,131 @@
+"""
+Query plan and latency benchmark for the filtered and sorted entry listings.
+
+This benchmark fills a temporary SQLite database created by `run_migrations` with
+synthetic entries, then checks every kind of filter and sort order of the listing
+routes. For each query it prints the plan reported by `EXPLAIN QUERY PLAN`, asserts
+that the plan reads the expected index instead of scanning `tax_info`, and asserts
+that the median time of `fetch_page` stays under the target (10 ms at 1M rows).
+
+Usage:
+    python -m benchmarks.bench_indexes [--rows 1000000] [--repeat 20] [--target-ms 10]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import random  # Module used to generate the synthetic entries
+import statistics  # Module used to compute the median latency
+import tempfile  # Module used to create the temporary database
+import time  # Module used to measure durations
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.listing import EntryFilter, entries_statement, fetch_page
+from app.migrations import run_migrations
+from app.models import TaxInfo
+
+# Words the synthetic descriptions are made of
+WORDS = ["office", "travel", "rent", "software", "consulting", "insurance", "training", "equipment", "phone", "fuel"]
+
+# Queries checked by the benchmark: a name, the listing arguments and the index the plan must use
+QUERIES = [
+    ("tax rate", dict(entry_filter=EntryFilter(tax_rate=17)), "ix_tax_info_tax_rate_id"),
+    ("income range", dict(entry_filter=EntryFilter(min_income=500000, max_income=501000)), "ix_tax_info_income_id"),
+    ("expenses range", dict(entry_filter=EntryFilter(min_expenses=1000, max_expenses=1010)), "ix_tax_info_expenses_id"),
+    ("sort by income", dict(entry_filter=EntryFilter(sort="-income")), "ix_tax_info_income_id"),
+    ("sort by income after cursor", dict(entry_filter=EntryFilter(sort="income"), after=1, after_value=250000.0), "ix_tax_info_income_id"),
+    ("tax rate sorted by id", dict(entry_filter=EntryFilter(tax_rate=42, sort="-id"), after=900000), "ix_tax_info_tax_rate_id"),
+    ("description prefix", dict(entry_filter=EntryFilter(description="Consulting 12")), "ix_tax_info_description"),
+    ("full-text search", dict(entry_filter=EntryFilter(search="consulting supplier17")), "VIRTUAL TABLE INDEX"),
+]
+
+
+def populate(session_factory, rows: int):
+    """
+    Insert synthetic entries with random amounts, tax rates and descriptions.
+
+    Args:
+        session_factory (sessionmaker): The factory of the benchmark sessions.
+        rows (int): The number of entries to insert.
+    """
+    generator = random.Random(42)
+    db = session_factory()
+    for start in range(0, rows, 50000):
+        db.connection().execute(insert(TaxInfo.__table__), [
+            {
+                "income": round(generator.uniform(0, 1000000), 2),
+                "expenses": round(generator.uniform(0, 100000), 2),
+                "tax_amount": 0.0,
+                "tax_rate": float(generator.randrange(100)),
+                "description": f"{generator.choice(WORDS).capitalize()} from supplier{generator.randrange(1000)} {i}",
+            }
+            for i in range(start, min(start + 50000, rows))
+        ])
+        db.commit()
+    db.connection().exec_driver_sql("ANALYZE")
+    db.commit()
+    db.close()
+
+
+def query_plan(db: Session, arguments: dict) -> list[str]:
+    """
+    Return the plan of the query run by `fetch_page` for the given arguments.
+
+    Args:
+        db (Session): The database session.
+        arguments (dict): The keyword arguments of `fetch_page`.
+
+    Returns:
+        list[str]: The details of the plan, one line per step.
+    """
+    statement = entries_statement(db, arguments.get("after"), arguments["entry_filter"], arguments.get("after_value"))
+    compiled = statement.limit(51).compile(db.get_bind())
+    parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", parameters).all()
+    return [row[-1] for row in rows]
+
+
+def main():
+    """
+    Populate the database, then check the plan and the latency of every query.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_indexes.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    start = time.perf_counter()
+    populate(session_factory, args.rows)
+    print(f"inserted {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    failures = []
+    db = session_factory()
+    for name, arguments, index in QUERIES:
+        plan = query_plan(db, arguments)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fetch_page(db, limit=50, **arguments)
+            timings.append((time.perf_counter() - start) * 1000)
+        median = statistics.median(timings)
+
+        uses_index = any(index in step for step in plan)
+        print(f"{name:<28} {median:7.2f} ms  {'; '.join(plan)}")
+        if not uses_index:
+            failures.append(f"{name}: the plan does not use {index}")
+        if median > args.target_ms:
+            failures.append(f"{name}: {median:.2f} ms is over {args.target_ms} ms")
+    db.close()
+
+    assert not failures, "\n".join(failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Load benchmark for the request dispatch of the database routes.
+
+This benchmark compares two ways of serving the home page under concurrent load:
+
+- threadpool: the current `home` route, a plain `def` that FastAPI runs in its
+  threadpool while the event loop keeps accepting requests.
+- blocking: the same work called from an `async def` route, which is how the
+  routes were declared before and which blocks the event loop for every
+  database round trip.
+
+Requests are sent in-process through httpx's ASGI transport against a temporary
+SQLite database. A simulated network latency is added to every SQL statement to
+model a database server, since an in-process SQLite file answers too quickly to
+show the difference. The page cache is disabled, so every request renders the page.
+
+Usage:
+    python -m benchmarks.bench_load [--requests 400] [--concurrency 50] [--rows 1000] [--latency-ms 5]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import asyncio  # Module used to send concurrent requests
+import os  # Module for interacting with the operating system
+import statistics  # Module used to compute latency percentiles
+import tempfile  # Module used to create the temporary database
+import time  # Module used to measure durations
+
+import httpx  # HTTP client with an in-process ASGI transport
+from fastapi import Depends, FastAPI, Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.listing import PAGE_SIZE, EntryFilter
+from app.main import app, get_read_db, home
+from app.models import TaxInfo
+from app.page_cache import page_cache
+from app.totals import rebuild_totals
+
+
+def build_database(rows: int, latency: float, pool_size: int) -> sessionmaker:
+    """
+    Create and seed a temporary SQLite database with simulated statement latency.
+
+    The connection pool is sized to the concurrency. Otherwise the blocking mode
+    deadlocks: its event loop waits for a free connection while the sessions that
+    would return one wait for the event loop to close them.
+
+    Args:
+        rows (int): The number of entries to insert.
+        latency (float): The delay added to every SQL statement, in seconds.
+        pool_size (int): The number of pooled database connections.
+
+    Returns:
+        sessionmaker: A session factory bound to the temporary database.
+    """
+    path = os.path.join(tempfile.mkdtemp(), "bench_load.sqlite")
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=0
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = session_factory()
+    db.add_all(
+        TaxInfo(income=1000 + i, expenses=100 + i, tax_amount=round((100 + i) * 0.24, 2), tax_rate=24)
+        for i in range(rows)
+    )
+    db.commit()
+    rebuild_totals(db)
+    db.close()
+
+    # Simulate the round trip to a database server for every statement
+    @event.listens_for(engine, "before_cursor_execute")
+    def _delay(*args):
+        time.sleep(latency)
+
+    return session_factory
+
+
+def build_blocking_app() -> FastAPI:
+    """
+    Build an application serving the home page from an `async def` route.
+
+    Returns:
+        FastAPI: The application with the blocking home route.
+    """
+    blocking_app = FastAPI()
+
+    @blocking_app.get("/")
+    async def blocking_home(request: Request, db=Depends(get_read_db)):
+        # The synchronous route body runs directly on the event loop
+        return home(request, after=None, after_value=None, limit=PAGE_SIZE, entry_filter=EntryFilter(), db=db)
+
+    return blocking_app
+
+
+async def run_load(target: FastAPI, requests: int, concurrency: int) -> dict:
+    """
+    Send concurrent GET requests to the home page and measure the results.
+
+    Args:
+        target (FastAPI): The application to send the requests to.
+        requests (int): The total number of requests.
+        concurrency (int): The number of requests in flight at the same time.
+
+    Returns:
+        dict: The requests per second and the p50/p99 latencies in milliseconds.
+    """
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=target)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get("/")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    """
+    Run the benchmark for both dispatch modes and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    session_factory = build_database(args.rows, args.latency_ms / 1000, args.concurrency)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    blocking_app = build_blocking_app()
+    for target in (app, blocking_app):
+        target.dependency_overrides[get_read_db] = override_get_db
+    # Measure the dispatch of the route, not the page cache
+    page_cache.max_entries = 0
+
+    for name, target in (("threadpool", app), ("blocking", blocking_app)):
+        result = asyncio.run(run_load(target, args.requests, args.concurrency))
+        print(f"{name:>10}: {result['rps']:8.1f} req/s  p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the rendered page cache of the home page.
+
+This benchmark sends GET requests for a set of home page variants (filters, sort
+orders and pages) through httpx's ASGI transport against a temporary SQLite
+database, in three modes:
+
+- uncached: the page cache is disabled, so every request queries the entries and
+  the totals and renders the templates.
+- cached: the pages are served from the page cache after their first request.
+- revalidated: the client sends back the ETag of every page in `If-None-Match` and
+  gets an empty 304 response.
+
+For each mode it reports the requests per second, the p50/p99 latency and the CPU
+time per request, measured with `time.process_time`.
+
+Usage:
+    python -m benchmarks.bench_page_cache [--requests 2000] [--rows 10000] [--variants 20]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import asyncio  # Module used to run the ASGI client
+import statistics  # Module used to compute latency percentiles
+import time  # Module used to measure durations
+
+import httpx  # HTTP client with an in-process ASGI transport
+
+from app.main import app, get_read_db
+from app.page_cache import page_cache
+from benchmarks.bench_load import build_database
+
+
+def variants(count: int) -> list[dict]:
+    """
+    Build the query parameters of the home page variants requested by the clients.
+
+    Args:
+        count (int): The number of variants.
+
+    Returns:
+        list[dict]: The query parameters of every variant.
+    """
+    sorts = ("id", "-id", "income", "-expenses")
+    return [
+        {"sort": sorts[index % len(sorts)], "min_income": 1000 + 10 * index, "limit": 50}
+        for index in range(count)
+    ]
+
+
+async def run_mode(name: str, requests: int, pages: list[dict], revalidate: bool):
+    """
+    Request the variants in turn and print the results of a mode.
+
+    Args:
+        name (str): The name of the mode.
+        requests (int): The total number of requests.
+        pages (list[dict]): The query parameters of the variants.
+        revalidate (bool): Whether to send the ETag of the previous response of a variant.
+    """
+    etags = {}
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up the cache and collect the ETags
+        for index, params in enumerate(pages):
+            etags[index] = (await client.get("/", params=params)).headers["etag"]
+
+        cpu = time.process_time()
+        start = time.perf_counter()
+        for number in range(requests):
+            index = number % len(pages)
+            headers = {"If-None-Match": etags[index]} if revalidate else {}
+            request_start = time.perf_counter()
+            response = await client.get("/", params=pages[index], headers=headers)
+            latencies.append(time.perf_counter() - request_start)
+            assert response.status_code == (304 if revalidate else 200), response.status_code
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+    print(
+        f"{name:>11}: {requests / elapsed:8.1f} req/s  p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+        f"p99 {p99:6.2f} ms  cpu {cpu / requests * 1000:6.2f} ms/req"
+    )
+
+
+def main():
+    """
+    Run the benchmark for the three modes and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--variants", type=int, default=20)
+    args = parser.parse_args()
+
+    session_factory = build_database(args.rows, 0, 4)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_read_db] = override_get_db
+    pages = variants(args.variants)
+    max_entries = page_cache.max_entries
+
+    page_cache.max_entries = 0
+    asyncio.run(run_mode("uncached", args.requests, pages, revalidate=False))
+    page_cache.max_entries = max_entries
+    asyncio.run(run_mode("cached", args.requests, pages, revalidate=False))
+    asyncio.run(run_mode("revalidated", args.requests, pages, revalidate=True))
+    print(f"cache: {page_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
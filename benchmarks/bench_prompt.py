@@ -0,0 +1,95 @@
+"""
+Benchmark of the advice prompt size and build time.
+
+For every table size this benchmark builds the advice prompt in two ways and reports
+the build time, the prompt length and its estimated number of tokens:
+
+- legacy: every entry is loaded and listed in the prompt, as the advice route did
+  before the prompt building stage.
+- builder: `build_advice_prompt`, which lists small tables and aggregates larger
+  ones in SQL within the token budget.
+
+Usage:
+    python -m benchmarks.bench_prompt [--sizes 1000 100000 1000000]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import tempfile  # Module used to create the temporary databases
+import time  # Module used to measure durations
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.bulk import ingest_rows
+from app.database import Base
+from app.models import TaxInfo
+from app.prompt_builder import build_advice_prompt, detailed_prompt, estimate_tokens
+
+
+def seed(rows: int) -> sessionmaker:
+    """
+    Create a temporary database holding the given number of synthetic entries.
+
+    Args:
+        rows (int): The number of entries.
+
+    Returns:
+        sessionmaker: A session factory bound to the database.
+    """
+    path = os.path.join(tempfile.mkdtemp(), "bench_prompt.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    ingest_rows(db, (
+        {"income": (i * 7919) % 300000, "expenses": (i * 104729) % 50000, "tax_rate": (10, 13, 24)[i % 3]}
+        for i in range(rows)
+    ), chunk_size=20000)
+    db.close()
+    return session_factory
+
+
+def measure(build) -> tuple[float, str]:
+    """
+    Run a prompt builder and measure its duration.
+
+    Args:
+        build (Callable): A function returning the prompt text.
+
+    Returns:
+        tuple: The duration in seconds and the prompt.
+    """
+    start = time.perf_counter()
+    prompt = build()
+    return time.perf_counter() - start, prompt
+
+
+def main():
+    """
+    Run the benchmark for every table size and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    for rows in args.sizes:
+        session_factory = seed(rows)
+        db = session_factory()
+        legacy_time, legacy = measure(lambda: detailed_prompt(db.query(TaxInfo).all()))
+        db.close()
+
+        db = session_factory()
+        builder_time, advice_prompt = measure(lambda: build_advice_prompt(db))
+        db.close()
+
+        print(f"{rows:>8} rows")
+        print(f"    legacy : {legacy_time * 1000:9.1f} ms  {len(legacy):>11} chars  ~{estimate_tokens(legacy):>10} tokens")
+        print(
+            f"    builder: {builder_time * 1000:9.1f} ms  {len(advice_prompt.cache_text):>11} chars  "
+            f"~{estimate_tokens(advice_prompt.cache_text):>10} tokens  ({advice_prompt.mode})"
+        )
+
+
+if __name__ == "__main__":
+    main()
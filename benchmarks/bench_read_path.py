@@ -0,0 +1,122 @@
+"""
+Microbenchmark of the entry read path.
+
+This benchmark reads every entry of a temporary SQLite database and compares the
+ORM path the routes used before with the Core read path of `app.listing`:
+
+- orm objects: `TaxInfo` objects converted with `TaxInfoResponse.from_orm`, as the
+  home page did for every entry.
+- records: Core `select()` rows loaded into `EntryRecord` objects by `fetch_page`.
+- orm json: `TaxInfo` objects streamed with `yield_per` and encoded one by one with
+  `json.dumps`, as "/entries/" did.
+- core json: the chunks of `stream_entries_json`, rows encoded per batch with orjson.
+
+For each path it reports the rows per second and the peak memory allocated by
+Python, measured in a separate run with tracemalloc.
+
+Usage:
+    python -m benchmarks.bench_read_path [--rows 100000]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import json  # Module used by the previous JSON path
+import os  # Module for interacting with the operating system
+import tempfile  # Module used to create the temporary database
+import time  # Module used to measure durations
+import tracemalloc  # Module used to measure the peak memory
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.listing import fetch_page, stream_entries_json
+from app.models import TaxInfo, TaxInfoResponse
+
+
+def orm_objects(session_factory, rows: int) -> int:
+    """
+    Load ORM objects and convert them to Pydantic models.
+    """
+    db = session_factory()
+    try:
+        entries = [TaxInfoResponse.from_orm(entry) for entry in db.query(TaxInfo).order_by(TaxInfo.id).limit(rows)]
+        return len(entries)
+    finally:
+        db.close()
+
+
+def records(session_factory, rows: int) -> int:
+    """
+    Load Core rows into records with `fetch_page`.
+    """
+    db = session_factory()
+    try:
+        entries, _ = fetch_page(db, limit=rows)
+        return len(entries)
+    finally:
+        db.close()
+
+
+def orm_json(session_factory, rows: int) -> int:
+    """
+    Stream ORM objects and encode them one by one with the json module.
+    """
+    db = session_factory()
+    try:
+        chunks = ["["]
+        for entry in db.query(TaxInfo).order_by(TaxInfo.id).limit(rows).yield_per(1000):
+            chunks.append(json.dumps({
+                "id": entry.id,
+                "income": entry.income,
+                "expenses": entry.expenses,
+                "tax_amount": entry.tax_amount,
+                "tax_rate": entry.tax_rate,
+                "description": entry.description,
+            }))
+        return len(",".join(chunks))
+    finally:
+        db.close()
+
+
+def core_json(session_factory, rows: int) -> int:
+    """
+    Stream the JSON chunks of the "/entries/" route.
+    """
+    return len(b"".join(stream_entries_json(session_factory, limit=rows)))
+
+
+def main():
+    """
+    Run every read path, once for the duration and once for the peak memory.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_read_path.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(TaxInfo.__table__), [
+            {"income": 1000.5 + i, "expenses": 100.25 + i % 500, "tax_amount": 24.06, "tax_rate": 24.0, "description": f"Entry {i}"}
+            for i in range(args.rows)
+        ])
+
+    for name, read in (("orm objects", orm_objects), ("records", records), ("orm json", orm_json), ("core json", core_json)):
+        read(session_factory, args.rows)  # Warm up the statement caches
+
+        start = time.perf_counter()
+        read(session_factory, args.rows)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        read(session_factory, args.rows)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f"{name:<12} {args.rows / elapsed:10.0f} rows/s  peak {peak / 2 ** 20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark of the change notifications and page sharing between worker processes.
+
+This benchmark starts reader processes that each keep a `PageCache` on a shared
+SQLite cache (`app.shared_cache`) and serve a set of pages from it in a loop, while
+the main process plays a writer incrementing the data version at a fixed interval.
+It reports:
+
+- the cost of a cache lookup with the check of the shared version, compared with
+  a lookup of a cache without shared cache,
+- the invalidation latency: the time between a write and the first lookup of every
+  reader seeing it or a later write, p50/p99/max over all writes and readers,
+- the share of the renders of the readers answered by a page another reader rendered.
+
+Usage:
+    python -m benchmarks.bench_shared_cache [--readers 4] [--writes 200] [--interval-ms 10] [--pages 20]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import multiprocessing  # Module used to run the readers in their own processes
+import os  # Module for interacting with the operating system
+import statistics  # Module used to compute latency percentiles
+import tempfile  # Module used to create the temporary shared cache
+import time  # Module used to measure durations
+
+from app.changes import DATA_VERSION, sync_data_changes, use_shared_cache
+from app.page_cache import PageCache
+from app.shared_cache import SQLiteSharedCache
+
+
+def lookup_cost(path: str, lookups: int = 20000) -> tuple:
+    """
+    Measure the time of a cache hit without and with the shared cache.
+
+    Args:
+        path (str): The SQLite file of the shared cache.
+        lookups (int): The number of lookups per measure.
+
+    Returns:
+        tuple: The microseconds per lookup without and with the shared cache.
+    """
+    costs = []
+    for cache in (None, SQLiteSharedCache(path)):
+        use_shared_cache(cache)
+        pages = PageCache()
+        pages.get_or_render(("home",), lambda: "<p>home</p>")
+        start = time.perf_counter()
+        for _ in range(lookups):
+            pages.get_or_render(("home",), lambda: "<p>home</p>")
+        costs.append((time.perf_counter() - start) / lookups * 1e6)
+    use_shared_cache(None)
+    return tuple(costs)
+
+
+def reader(path: str, pages: int, stop, results):
+    """
+    Serve pages in a loop and record when every new data version is first seen.
+
+    Args:
+        path (str): The SQLite file of the shared cache.
+        pages (int): The number of distinct pages.
+        stop (Event): Set by the writer when it is done.
+        results (Queue): Receives the first sighting time of every version, and the counters.
+    """
+    use_shared_cache(SQLiteSharedCache(path))
+    cache = PageCache()
+    seen = {}
+    index = 0
+    while not stop.is_set():
+        version = sync_data_changes()
+        if version not in seen:
+            seen[version] = time.time()
+        cache.get_or_render(("page", index % pages), lambda: f"<p>{version}</p>" * 100)
+        index += 1
+    stats = cache.stats()
+    results.put((seen, stats["shared_hits"], stats["misses"]))
+
+
+def main():
+    """
+    Run the readers against a writer and report the lookup cost, latency and sharing.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "shared.sqlite")
+    local, shared = lookup_cost(path)
+    print(f"cache hit: {local:6.2f} us without shared cache, {shared:6.2f} us with the shared version check")
+
+    writer = SQLiteSharedCache(path)
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=reader, args=(path, args.pages, stop, results)) for _ in range(args.readers)]
+    for process in processes:
+        process.start()
+    # Let the readers start serving before the first write
+    time.sleep(1)
+
+    writes = {}
+    for _ in range(args.writes):
+        writes[writer.bump_version(DATA_VERSION)] = time.time()
+        time.sleep(args.interval_ms / 1000)
+    time.sleep(0.1)
+    stop.set()
+
+    latencies, shared_hits, misses = [], 0, 0
+    for _ in processes:
+        seen, hits, renders = results.get()
+        shared_hits += hits
+        misses += renders
+        # A reader may see two writes at once, the later version covers the earlier one
+        for version, written in writes.items():
+            sightings = [seen_at for seen_version, seen_at in seen.items() if seen_version >= version]
+            if sightings:
+                latencies.append((min(sightings) - written) * 1000)
+    for process in processes:
+        process.join()
+
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+    print(
+        f"invalidation: {len(latencies)}/{len(writes) * args.readers} writes seen, p50 {statistics.median(latencies):.2f} ms  "
+        f"p99 {p99:.2f} ms  max {max(latencies):.2f} ms"
+    )
+    print(f"sharing: {shared_hits / max(shared_hits + misses, 1):.0%} of the page renders served from another reader")
+
+
+if __name__ == "__main__":
+    main()
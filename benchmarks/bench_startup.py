@@ -0,0 +1,109 @@
+"""
+Startup benchmark of the application.
+
+This benchmark starts fresh Python processes, like a server spawning its workers,
+and measures in each of them:
+
+- import: the time to import `app.main`.
+- startup: the time to run the startup of the lifespan (migrations and template
+  loading) through a test client.
+- first request: the time of the first request to the home page.
+- process: the total time of the process, including the interpreter start.
+
+Every process uses its own empty SQLite database and all of them share a template
+bytecode cache, so the first run compiles the templates and the next ones load them
+from the cache, as workers started after the first one do.
+
+With `--max-seconds`, the benchmark exits with an error when the median time to
+import and start the application is above the budget. The CI workflow runs it this
+way to catch regressions of the startup time.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--max-seconds 3]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import json  # Module used to read the measurements of the child processes
+import os  # Module for interacting with the operating system
+import statistics  # Module used to compute the medians
+import subprocess  # Module used to start the child processes
+import sys  # Module used to find the Python interpreter
+import tempfile  # Module used to create the temporary databases and cache
+import time  # Module used to measure durations
+
+# Code run by every child process, printing its measurements as JSON
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+ready = time.perf_counter()
+with client:
+    started = time.perf_counter()
+    client.get("/").raise_for_status()
+    first = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - ready,
+    "first request": first - started,
+    "openai imported": "openai" in __import__("sys").modules,
+}))
+"""
+
+
+def run_child(directory: str, cache_dir: str, index: int) -> dict:
+    """
+    Start the application in a new process and return its measurements.
+
+    Args:
+        directory (str): The directory of the temporary databases.
+        cache_dir (str): The directory of the template bytecode cache.
+        index (int): The number of the run, used to name its database.
+
+    Returns:
+        dict: The import, startup, first request and process times in seconds.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(directory, f'startup_{index}.sqlite')}",
+        TEMPLATE_CACHE_DIR=cache_dir,
+        PYTHONDONTWRITEBYTECODE="",
+    )
+    env.pop("DATABASE_READ_URL", None)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    """
+    Run the processes, print the medians and check the budget.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    cache_dir = os.path.join(directory, "templates")
+    os.makedirs(cache_dir)
+    results = [run_child(directory, cache_dir, index) for index in range(args.runs)]
+
+    for name in ("import", "startup", "first request", "process"):
+        values = [result[name] * 1000 for result in results]
+        print(f"{name:>13}: median {statistics.median(values):8.1f} ms  first run {values[0]:8.1f} ms")
+    print(f"openai imported at startup: {any(result['openai imported'] for result in results)}")
+
+    ready = statistics.median(result["import"] + result["startup"] for result in results)
+    if args.max_seconds is not None and ready > args.max_seconds:
+        sys.exit(f"import and startup took {ready:.2f} s, over the budget of {args.max_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Benchmark suite of the endpoints at realistic data sizes.
+
+This benchmark seeds temporary SQLite databases with synthetic entries (1k and 100k
+by default, 1M with `--sizes 1000,100000,1000000`) and measures every endpoint of
+the application against them, in process through the test client:
+
+- home: GET / (with the page cache disabled, so every request renders the page)
+- submit: POST /submit/
+- delete: POST /delete/{id}
+- clear_all: POST /clear_all/, on a fresh copy of the database every time
+- advice: GET /get_all_advice/ with a stubbed LLM and the advice cache cleared,
+  so every request builds the prompt from the entries
+
+For every endpoint and size it reports the p50/p95 latency, the throughput of
+sequential requests and the peak memory allocated by Python, measured in a separate
+run with tracemalloc. The results are written to a JSON file.
+
+With `--compare`, the results are checked against a baseline file written by an
+earlier run. Latencies are scaled by a CPU calibration loop timed on both machines,
+so a baseline recorded on a faster or slower machine can still be used. A result
+fails when its scaled p50 latency is more than `--max-slowdown` above the baseline
+(default 50%) plus `--min-slowdown-ms` (default 5 ms, so that the requests of a few
+milliseconds do not fail on scheduling noise), or its peak memory more than
+`--max-memory-growth` above it (default 25%), and the benchmark then exits with an
+error. The CI workflow runs it this way against `benchmarks/baseline.json`, which is
+recorded with the Python version of the workflow.
+
+Usage:
+    python -m benchmarks.bench_suite [--sizes 1000,100000] [--requests 30] [--output benchmark-results.json]
+                                     [--compare benchmarks/baseline.json]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import json  # Module used to write and read the results
+import os  # Module for interacting with the operating system
+import platform  # Module used to describe the machine in the results
+import shutil  # Module used to copy the seeded databases
+import statistics  # Module used to compute latency percentiles
+import sys  # Module used to exit with an error on regressions
+import tempfile  # Module used to create the temporary databases
+import time  # Module used to measure durations
+import tracemalloc  # Module used to measure the peak memory
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.advice import advice_cache
+from app.bulk import ingest_rows
+from app.database import create_app_engine
+from app.llm_client import advice_client
+from app.main import app, get_db, get_read_db, get_read_session_factory, get_session_factory
+from app.migrations import run_migrations
+from app.page_cache import page_cache
+
+# Number of requests of the endpoints that are too slow to repeat many times at large sizes
+SLOW_ENDPOINT_REQUESTS = {"clear_all": 3, "advice": 5}
+
+# Number of entries from which the slow endpoints get fewer requests
+SLOW_ENDPOINT_MIN_ROWS = 100000
+
+
+def calibrate() -> float:
+    """
+    Time a fixed pure Python workload, to compare the speed of two machines.
+
+    Returns:
+        float: The best duration of the workload out of ten runs, in seconds.
+    """
+    timings = []
+    for _ in range(10):
+        start = time.perf_counter()
+        values = {}
+        for i in range(300000):
+            values[str(i % 1000)] = values.get(str(i % 1000), 0) + i * 0.24
+        sorted(values.items())
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def seed(directory: str, rows: int) -> str:
+    """
+    Create a database file holding the given number of synthetic entries.
+
+    The entries are inserted by the bulk ingestion, so their tax amounts and the
+    running totals are consistent with the submit route.
+
+    Args:
+        directory (str): The directory of the file.
+        rows (int): The number of entries.
+
+    Returns:
+        str: The path of the database file.
+    """
+    path = os.path.join(directory, f"seed_{rows}.sqlite")
+    engine = create_app_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    descriptions = ("Office rent", "Consulting", "Travel", "Equipment", "Software", None)
+    ingest_rows(db, (
+        {
+            "income": 1000 + (i * 7919) % 300000,
+            "expenses": (i * 104729) % 50000 / 3,
+            "tax_rate": (10, 13, 24)[i % 3],
+            "description": descriptions[i % len(descriptions)],
+        }
+        for i in range(rows)
+    ), chunk_size=20000)
+    db.close()
+    # Closing the last connection checkpoints the write-ahead log into the file
+    engine.dispose()
+    return path
+
+
+class Target:
+    """
+    The application bound to a copy of a seeded database.
+
+    Attributes:
+        client (TestClient): The client sending the requests.
+        path (str): The path of the database copy.
+    """
+
+    def __init__(self, seed_path: str, directory: str, name: str):
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        shutil.copyfile(seed_path, self.path)
+        self.write_engine = create_app_engine(f"sqlite:///{self.path}")
+        self.read_engine = create_app_engine(f"sqlite:///{self.path}", read_only=True)
+        write_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.write_engine)
+        read_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+
+        def session(factory):
+            def dependency():
+                db = factory()
+                try:
+                    yield db
+                finally:
+                    db.close()
+            return dependency
+
+        app.dependency_overrides[get_db] = session(write_factory)
+        app.dependency_overrides[get_read_db] = session(read_factory)
+        app.dependency_overrides[get_session_factory] = lambda: write_factory
+        app.dependency_overrides[get_read_session_factory] = lambda: read_factory
+        self.client = TestClient(app)
+
+    def close(self):
+        self.client.close()
+        self.write_engine.dispose()
+        self.read_engine.dispose()
+        app.dependency_overrides.clear()
+
+
+def request_plan(endpoint: str, rows: int, count: int) -> list:
+    """
+    Build the requests of an endpoint, as (method, url, form data) tuples.
+
+    Args:
+        endpoint (str): The name of the endpoint.
+        rows (int): The number of entries of the database.
+        count (int): The number of requests.
+
+    Returns:
+        list[tuple]: The requests.
+    """
+    if endpoint == "home":
+        return [("GET", "/", None)] * count
+    if endpoint == "submit":
+        return [("POST", "/submit/", {"income": 50000 + i, "expenses": 1000 + i, "tax_rate": 24}) for i in range(count)]
+    if endpoint == "delete":
+        # Spread the deleted entries over the table; the entry 1 is deleted by the warm-up
+        return [("POST", f"/delete/{2 + i * max(1, (rows - 1) // count)}", None) for i in range(count)]
+    if endpoint == "clear_all":
+        return [("POST", "/clear_all/", None)] * count
+    return [("GET", "/get_all_advice/", None)] * count
+
+
+def run_requests(target: Target, plan: list, reset=None) -> list[float]:
+    """
+    Send the requests of a plan one after the other and return their latencies.
+
+    Args:
+        target (Target): The application to send the requests to.
+        plan (list[tuple]): The requests.
+        reset (Callable, optional): A function called before every request, not timed.
+
+    Returns:
+        list[float]: The latency of every request, in seconds.
+    """
+    latencies = []
+    for method, url, data in plan:
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        response = target.client.request(method, url, data=data, follow_redirects=False)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code in (200, 303), (url, response.status_code)
+    return latencies
+
+
+def measure(endpoint: str, seed_path: str, directory: str, rows: int, requests: int) -> dict:
+    """
+    Measure an endpoint on a copy of a seeded database.
+
+    Args:
+        endpoint (str): The name of the endpoint.
+        seed_path (str): The path of the seeded database.
+        directory (str): The directory of the copies.
+        rows (int): The number of entries of the seeded database.
+        requests (int): The number of requests.
+
+    Returns:
+        dict: The p50/p95 latency in milliseconds, the requests per second and the peak memory in MiB.
+    """
+    # Small sizes are fast enough to take every sample, a median of 3 requests is too noisy to gate on
+    count = min(requests, SLOW_ENDPOINT_REQUESTS.get(endpoint, requests)) if rows >= SLOW_ENDPOINT_MIN_ROWS else requests
+    plan = request_plan(endpoint, rows, count)
+    results = {}
+
+    for run in ("timed", "memory"):
+        target = Target(seed_path, directory, f"{endpoint}_{rows}_{run}")
+        reset = None
+        if endpoint == "clear_all":
+            def reset():
+                # Every clear starts from the full table
+                target.write_engine.dispose()
+                target.read_engine.dispose()
+                shutil.copyfile(seed_path, target.path)
+        elif endpoint == "advice":
+            reset = advice_cache.clear
+        try:
+            # Warm up the statement and template caches
+            run_requests(target, [("POST", "/delete/1", None)] if endpoint == "delete" else plan[:1], reset)
+            if run == "timed":
+                latencies = run_requests(target, plan, reset)
+            else:
+                tracemalloc.start()
+                run_requests(target, plan, reset)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        finally:
+            target.close()
+
+    latencies.sort()
+    results["p50_ms"] = round(statistics.median(latencies) * 1000, 3)
+    results["p95_ms"] = round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 3)
+    results["rps"] = round(len(latencies) / sum(latencies), 1)
+    results["peak_mib"] = round(peak / 2 ** 20, 2)
+    return results
+
+
+def compare(results: dict, baseline: dict, max_slowdown: float, max_memory_growth: float, min_slowdown_ms: float = 5) -> list[str]:
+    """
+    Compare results with a baseline and return the regressions.
+
+    Args:
+        results (dict): The results of this run, as written to the output file.
+        baseline (dict): The results of the baseline run.
+        max_slowdown (float): The accepted growth of the scaled p50 latency, as a fraction.
+        max_memory_growth (float): The accepted growth of the peak memory, as a fraction.
+        min_slowdown_ms (float): The accepted growth of the p50 latency in milliseconds,
+            added to the relative one.
+
+    Returns:
+        list[str]: A description of every regression.
+    """
+    # Scale the baseline latencies to the speed of this machine
+    speed = results["calibration_seconds"] / baseline["calibration_seconds"]
+    regressions = []
+    for name, expected in baseline["results"].items():
+        actual = results["results"].get(name)
+        if actual is None:
+            continue
+        # Like the memory check, an absolute margin keeps fast requests from failing on noise
+        limit = expected["p50_ms"] * speed * (1 + max_slowdown) + min_slowdown_ms
+        status = "ok"
+        if actual["p50_ms"] > limit:
+            status = "SLOWER"
+            regressions.append(f"{name}: p50 {actual['p50_ms']:.2f} ms, limit {limit:.2f} ms")
+        # A small absolute margin keeps tiny allocations from failing on noise
+        memory_limit = expected["peak_mib"] * (1 + max_memory_growth) + 0.5
+        if actual["peak_mib"] > memory_limit:
+            status = "MORE MEMORY"
+            regressions.append(f"{name}: peak {actual['peak_mib']:.2f} MiB, limit {memory_limit:.2f} MiB")
+        print(f"{name:>20}: p50 {actual['p50_ms']:9.2f} ms (baseline {expected['p50_ms'] * speed:9.2f} ms scaled)  "
+              f"peak {actual['peak_mib']:7.2f} MiB (baseline {expected['peak_mib']:7.2f})  {status}")
+    return regressions
+
+
+def main():
+    """
+    Seed the databases, measure every endpoint, write the results and compare them.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--endpoints", default="home,submit,delete,clear_all,advice")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--max-slowdown", type=float, default=0.5)
+    parser.add_argument("--max-memory-growth", type=float, default=0.25)
+    parser.add_argument("--min-slowdown-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    # Measure the work of the routes rather than the caches in front of them
+    page_cache.max_entries = 0
+
+    async def stub_backend(model, messages):
+        return "Keep your receipts.\nReview your deductions."
+    advice_client.backend = stub_backend
+
+    directory = tempfile.mkdtemp()
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration_seconds": round(calibrate(), 4),
+        "results": {},
+    }
+    for rows in (int(size) for size in args.sizes.split(",")):
+        start = time.perf_counter()
+        seed_path = seed(directory, rows)
+        print(f"seeded {rows} entries in {time.perf_counter() - start:.1f} s")
+        for endpoint in args.endpoints.split(","):
+            name = f"{endpoint}@{rows}"
+            results["results"][name] = measure(endpoint, seed_path, directory, rows, args.requests)
+            result = results["results"][name]
+            print(f"{name:>20}: p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"{result['rps']:8.1f} req/s  peak {result['peak_mib']:7.2f} MiB")
+
+    # The best of a calibration before and after the measurements is the least disturbed
+    results["calibration_seconds"] = round(min(results["calibration_seconds"], calibrate()), 4)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("python") != results["python"]:
+            print(f"warning: the baseline was recorded with Python {baseline.get('python')}, this run uses {results['python']}")
+        regressions = compare(results, baseline, args.max_slowdown, args.max_memory_growth, args.min_slowdown_ms)
+        if regressions:
+            sys.exit("performance regressions:\n" + "\n".join(regressions))
+        print("no regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
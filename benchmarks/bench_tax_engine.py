@@ -0,0 +1,111 @@
+"""
+Benchmark of the vectorized tax engine against per-entry Python arithmetic.
+
+This benchmark fills a temporary SQLite database with synthetic entries and
+recalculates the tax of every entry under a what-if scenario (every 24% rate
+raised to 30%) in two ways:
+
+- python: the entries are read row by row and `compute_tax_amount` is called for
+  each of them, as the routes do for a single entry.
+- engine: `scenario_totals` reads the columns in batches of arrays and computes
+  them with NumPy.
+
+It checks that both give the same tax for every entry and the same totals, and
+reports the time of each, end to end and for the arithmetic alone.
+
+Usage:
+    python -m benchmarks.bench_tax_engine [--rows 1000000]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import random  # Module used to generate the synthetic entries
+import tempfile  # Module used to create the temporary database
+import time  # Module used to measure durations
+
+import numpy as np
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import TaxInfo, TaxScenario
+from app.tax import compute_tax_amount
+from app.tax_engine import iter_columns, scenario_tax, scenario_totals
+
+
+def populate(session_factory, rows: int):
+    """
+    Insert synthetic entries with random expenses and tax rates.
+
+    Args:
+        session_factory (sessionmaker): The factory of the benchmark sessions.
+        rows (int): The number of entries to insert.
+    """
+    generator = random.Random(7)
+    db = session_factory()
+    for start in range(0, rows, 50000):
+        batch = []
+        for _ in range(start, min(start + 50000, rows)):
+            expenses = round(generator.uniform(0, 50000), 2)
+            tax_rate = generator.choice((10, 12.5, 24, 33.3))
+            batch.append({
+                "income": round(generator.uniform(0, 200000), 2),
+                "expenses": expenses,
+                "tax_amount": compute_tax_amount(expenses, tax_rate),
+                "tax_rate": tax_rate,
+            })
+        db.connection().execute(insert(TaxInfo.__table__), batch)
+        db.commit()
+    db.close()
+
+
+def main():
+    """
+    Run the scenario both ways, compare the results and print the timings.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_tax_engine.sqlite")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    populate(session_factory, args.rows)
+    scenario = TaxScenario(rate_changes={24: 30})
+    db = session_factory()
+
+    start = time.perf_counter()
+    python_tax = [
+        compute_tax_amount(expenses, 30 if tax_rate == 24 else tax_rate)
+        for expenses, tax_rate in db.execute(select(TaxInfo.expenses, TaxInfo.tax_rate))
+    ]
+    python_total = round(sum(python_tax), 2)
+    python_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    totals = scenario_totals(db, scenario)
+    engine_seconds = time.perf_counter() - start
+
+    # Time the arithmetic alone, on columns already in memory
+    batches = list(iter_columns(db))
+    db.close()
+    start = time.perf_counter()
+    engine_tax = np.concatenate([scenario_tax(columns, scenario) for columns in batches])
+    compute_seconds = time.perf_counter() - start
+    expenses = np.concatenate([columns["expenses"] for columns in batches]).tolist()
+    rates = np.concatenate([columns["tax_rate"] for columns in batches]).tolist()
+    start = time.perf_counter()
+    [compute_tax_amount(e, 30 if r == 24 else r) for e, r in zip(expenses, rates)]
+    loop_seconds = time.perf_counter() - start
+
+    assert engine_tax.tolist() == python_tax, "the engine and compute_tax_amount differ"
+    assert abs(totals["scenario_tax"] - python_total) <= 0.01, (totals["scenario_tax"], python_total)
+    print(f"python: {python_seconds:6.2f} s ({args.rows / python_seconds:10.0f} entries/s)")
+    print(f"engine: {engine_seconds:6.2f} s ({args.rows / engine_seconds:10.0f} entries/s)")
+    print(f"arithmetic only: python {loop_seconds:.2f} s, engine {compute_seconds:.2f} s")
+    print(f"scenario tax {totals['scenario_tax']}, identical per-entry amounts")
+
+
+if __name__ == "__main__":
+    main()
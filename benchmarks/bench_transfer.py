@@ -0,0 +1,89 @@
+"""
+Throughput and memory benchmark of the export and import of tax entries.
+
+This benchmark fills a temporary SQLite database, then for every format (CSV,
+NDJSON and Parquet) exports the whole table to a file with `export_file` and
+imports the file into a new database with `import_file`, the functions behind
+`python -m app.transfer`. It reports the rows per second of both directions, the
+size of the file and the peak Python memory of the export, measured in a separate
+run with tracemalloc. The peak memory of the export does not grow with `--rows`.
+
+Usage:
+    python -m benchmarks.bench_transfer [--rows 200000] [--chunk-size 20000] [--formats csv ndjson parquet]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import os  # Module for interacting with the operating system
+import tempfile  # Module used to create the temporary databases and files
+import time  # Module used to measure durations
+import tracemalloc  # Module used to measure the peak memory
+
+from sqlalchemy.orm import sessionmaker
+
+from app.bulk import ingest_rows
+from app.database import create_app_engine
+from app.migrations import run_migrations
+from app.transfer import export_file, import_file
+
+
+def new_database(directory: str, name: str) -> sessionmaker:
+    """
+    Create a migrated SQLite database with the engine settings of the application.
+
+    Args:
+        directory (str): The directory of the database file.
+        name (str): The name of the database file.
+
+    Returns:
+        sessionmaker: The session factory of the database.
+    """
+    engine = create_app_engine(f"sqlite:///{os.path.join(directory, name)}")
+    run_migrations(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main():
+    """
+    Export and import the table in every format and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "ndjson", "parquet"])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    source = new_database(directory, "source.sqlite")
+    with source() as db:
+        ingest_rows(db, (
+            {"income": 1000 + i % 5000, "expenses": i % 900, "tax_rate": (10, 24)[i % 2], "description": f"Entry {i}"}
+            for i in range(args.rows)
+        ), args.chunk_size)
+
+    for export_format in args.formats:
+        path = os.path.join(directory, f"entries.{export_format}")
+        with source() as db:
+            start = time.perf_counter()
+            export_file(db, path, export_format)
+            export_seconds = time.perf_counter() - start
+
+            tracemalloc.start()
+            export_file(db, path, export_format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        target = new_database(directory, f"target_{export_format}.sqlite")
+        with target() as db:
+            start = time.perf_counter()
+            result = import_file(db, path, export_format, args.chunk_size)
+            import_seconds = time.perf_counter() - start
+        assert result["inserted"] == args.rows and not result["errors"]
+
+        print(
+            f"{export_format:<8} export {args.rows / export_seconds:10.0f} rows/s  peak {peak / 2 ** 20:6.1f} MiB  "
+            f"file {os.path.getsize(path) / 2 ** 20:7.1f} MiB  import {args.rows / import_seconds:10.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
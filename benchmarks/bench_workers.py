@@ -0,0 +1,185 @@
+"""
+Load test of the multi-worker serving mode.
+
+This benchmark starts the application with gunicorn and the configuration of
+`app/gunicorn_conf.py` for an increasing number of workers, against a temporary
+SQLite database, and sends it a mix of requests over HTTP:
+
+- GET / with one of several filter variants, as readers browsing the entries.
+- POST /submit/ with a new entry, as writers (a share set by `--write-ratio`).
+
+The requests are sent by several client processes, each running many concurrent
+connections with aiohttp, so that the load generator is not the bottleneck. For
+every number of workers it reports the requests per second, the p50/p99 latency and
+the number of failed requests. With enough cores the throughput grows with the
+workers until the single SQLite writer limits the writes.
+
+Usage:
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--seconds 10] [--connections 64] [--clients 2] [--write-ratio 0.1]
+"""
+
+import argparse  # Module for parsing the command line arguments
+import asyncio  # Module used to run the concurrent connections
+import multiprocessing  # Module used to run the client processes
+import os  # Module for interacting with the operating system
+import random  # Module used to pick the request of every iteration
+import socket  # Module used to find a free port
+import statistics  # Module used to compute latency percentiles
+import subprocess  # Module used to start gunicorn
+import sys  # Module used to find the Python interpreter
+import tempfile  # Module used to create the temporary databases
+import time  # Module used to measure durations
+
+import aiohttp  # HTTP client of the load generator
+
+from app.gunicorn_conf import available_cores
+
+
+def free_port() -> int:
+    """
+    Return a TCP port that is free on the loopback interface.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, directory: str) -> subprocess.Popen:
+    """
+    Start gunicorn with the given number of workers and wait until it answers.
+
+    Args:
+        workers (int): The number of worker processes.
+        port (int): The port to listen on.
+        directory (str): The directory of the temporary database.
+
+    Returns:
+        subprocess.Popen: The gunicorn process.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(directory, f'workers_{workers}.sqlite')}",
+        WEB_CONCURRENCY=str(workers),
+        BIND=f"127.0.0.1:{port}",
+    )
+    env.pop("DATABASE_READ_URL", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:app.gunicorn_conf", "app.main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    # Wait until every worker had time to start and the home page answers
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        server.kill()
+        raise RuntimeError("gunicorn did not start")
+    time.sleep(1 + 0.2 * workers)
+    return server
+
+
+async def run_connections(url: str, seconds: float, connections: int, write_ratio: float, seed: int) -> dict:
+    """
+    Send requests from many concurrent connections until the time is up.
+
+    Args:
+        url (str): The base URL of the server.
+        seconds (float): The duration of the run.
+        connections (int): The number of concurrent connections.
+        write_ratio (float): The share of requests that submit an entry.
+        seed (int): The seed of the random choices.
+
+    Returns:
+        dict: The latencies of the successful requests and the number of errors.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    variants = [{}, {"sort": "-id"}, {"tax_rate": 24}, {"min_income": 50000, "sort": "-income"}]
+
+    async def connection(session, generator):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if generator.random() < write_ratio:
+                    data = {"income": generator.randint(1000, 100000), "expenses": generator.randint(0, 900), "description": "Load test"}
+                    async with session.post(f"{url}/submit/", data=data, allow_redirects=False) as response:
+                        await response.read()
+                        ok = response.status == 303
+                else:
+                    async with session.get(f"{url}/", params=generator.choice(variants)) as response:
+                        await response.read()
+                        ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(connection(session, random.Random(seed * 1000 + index)) for index in range(connections)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def client_process(args: tuple) -> dict:
+    """
+    Run the connections of one client process.
+
+    Args:
+        args (tuple): The arguments of `run_connections`.
+
+    Returns:
+        dict: The latencies of the successful requests and the number of errors.
+    """
+    return asyncio.run(run_connections(*args))
+
+
+def main():
+    """
+    Run the load test for every number of workers and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = available_cores()
+    default_workers = ",".join(str(n) for n in sorted({1, max(1, cores // 2), cores}))
+    parser.add_argument("--workers", default=default_workers)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    print(f"{cores} cores available")
+    for workers in (int(value) for value in args.workers.split(",")):
+        port = free_port()
+        server = start_server(workers, port, directory)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            per_client = max(1, args.connections // args.clients)
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.map(client_process, [
+                    (url, args.seconds, per_client, args.write_ratio, seed) for seed in range(args.clients)
+                ])
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = sorted(latency for result in results for latency in result["latencies"])
+        errors = sum(result["errors"] for result in results)
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        print(
+            f"{workers:>3} workers: {len(latencies) / args.seconds:8.1f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000 if latencies else 0:8.1f} ms  p99 {p99 * 1000:8.1f} ms  {errors} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
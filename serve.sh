@@ -0,0 +1,13 @@
+#!/bin/sh
+# Start the application in the container.
+# SERVER_MODE=dev runs a single uvicorn process with live-reload, for development.
+# Any other value runs gunicorn with one uvicorn worker per core (app/gunicorn_conf.py).
+set -e
+
+# Bring the database schema up to date once, before any worker starts
+python -m app.migrations
+
+if [ "$SERVER_MODE" = "dev" ]; then
+    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+fi
+exec gunicorn -c python:app.gunicorn_conf app.main:app
@@ -8,15 +8,25 @@ and configuring the FastAPI test client.
 Fixtures:
     test_db: A pytest fixture that sets up and tears down the test database.
     test_client: A pytest fixture that provides a test client for making requests to the FastAPI application.
+    fake_openai: A pytest fixture that replaces the OpenAI chat completion API with a local stub.
+    openai_stub_server: A pytest fixture that runs a local HTTP server imitating the OpenAI API.
 """
 
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+from aiohttp import web
+import openai
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.main import app, get_db
+from app.main import app, get_db, get_read_db, get_session_factory, get_read_session_factory
 from app.database import Base
+from app.migrations import run_migrations
+from app.changes import notify_data_change
 
 # SQLAlchemy database URL for testing (using SQLite in-memory database)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -27,8 +37,8 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread
 # Create a sessionmaker factory for the test database
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create all database tables for the test database
-Base.metadata.create_all(bind=engine)
+# Create all database tables and indexes for the test database
+run_migrations(engine)
 
 @pytest.fixture(scope="module")
 def test_db():
@@ -44,7 +54,9 @@ def test_db():
     """
     # Drop all tables and recreate them before running the tests
     Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    # Drop the pages cached from the tables of the previous module
+    notify_data_change()
     db = TestingSessionLocal()
     try:
         yield db
@@ -56,8 +68,8 @@ def test_client():
     """
     Pytest fixture to provide a test client for the FastAPI application.
 
-    This fixture overrides the `get_db` dependency to use the test database session. 
-    It then creates a TestClient for making requests to the FastAPI application.
+    This fixture overrides the database session and session factory dependencies to 
+    use the test database. It then creates a TestClient for making requests to the FastAPI application.
 
     Yields:
         TestClient: A test client for making requests to the FastAPI application.
@@ -79,6 +91,144 @@ def test_client():
 
     # Override the get_db dependency in the FastAPI app to use the test database
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # Override the session factories used by streamed responses
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    app.dependency_overrides[get_read_session_factory] = lambda: TestingSessionLocal
     # Create a TestClient for the FastAPI app
     client = TestClient(app)
     yield client
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """
+    Pytest fixture replacing the OpenAI chat completion API with a local stub.
+
+    The stub answers every prompt with two lines of advice, streamed word by word 
+    when `stream=True` is requested, and records the keyword arguments of every 
+    call, so tests can check how often the model was called. The advice cache is 
+    cleared before and after the test.
+
+    Yields:
+        list[dict]: The keyword arguments of every call made to the stub.
+    """
+    from app.advice import advice_cache
+
+    calls = []
+
+    async def acreate(**kwargs):
+        calls.append(kwargs)
+        content = f"Advice {len(calls)}\nKeep your receipts."
+        if kwargs.get("stream"):
+            return stream_chunks(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": content})])
+
+    async def stream_chunks(content):
+        for piece in content.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": piece + " "})])
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    advice_cache.clear()
+    yield calls
+    advice_cache.clear()
+
+
+class StubOpenAIServer:
+    """
+    Local HTTP server imitating the OpenAI chat completion endpoint.
+
+    Streamed completions (`"stream": true`) are sent as Server-Sent Events in the 
+    OpenAI format, one word per event.
+
+    The server runs its own event loop in a background thread, so it can be used 
+    by tests whatever event loop the client runs on.
+
+    Attributes:
+        base_url (str): The API base URL to give to the OpenAI client.
+        delay (float): The number of seconds every completion takes.
+        fail_next (int): The number of upcoming requests answered with a 503 error.
+        requests (int): The number of requests received.
+        active (int): The number of requests being answered.
+        max_active (int): The highest number of requests answered at the same time.
+    """
+
+    def __init__(self):
+        self.delay = 0.0
+        self.fail_next = 0
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _completions(self, request):
+        body = await request.json()
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return web.json_response({"error": {"message": "Overloaded", "type": "server_error"}}, status=503)
+            prompt = body["messages"][-1]["content"]
+            if body.get("stream"):
+                return await self._stream(request, f"Advice for {prompt}")
+            return web.json_response({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": f"Advice for {prompt}"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            })
+        finally:
+            self.active -= 1
+
+    async def _stream(self, request, content):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for piece in content.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await asyncio.sleep(self.delay)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def _start(self):
+        application = web.Application()
+        application.router.add_post("/v1/chat/completions", self._completions)
+        self._runner = web.AppRunner(application)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+@pytest.fixture
+def openai_stub_server(monkeypatch):
+    """
+    Pytest fixture running a local server imitating the OpenAI API.
+
+    The OpenAI client is pointed at the server for the duration of the test.
+
+    Yields:
+        StubOpenAIServer: The running server.
+    """
+    server = StubOpenAIServer()
+    server.start()
+    monkeypatch.setattr(openai, "api_base", server.base_url)
+    monkeypatch.setattr(openai, "api_key", "test-key")
+    try:
+        yield server
+    finally:
+        server.stop()
@@ -0,0 +1,163 @@
+import asyncio  # Import asyncio to call the cache from a coroutine
+import sqlite3  # Import sqlite3 to track the connections of the on-disk tier
+import threading  # Import threading to check where the disk tier is used
+import time  # Import time to wait for entries to expire
+from app import main  # Import the application module, whose advice mode is switched
+from app.advice_cache import AdviceCache  # Import the advice cache
+
+def test_lru_eviction_and_ttl():
+    """
+    Test that the in-memory tier evicts the least recently used entry and expires old entries.
+    """
+    cache = AdviceCache(max_entries=2, ttl=0.05)
+    cache.set("a", "advice a")
+    cache.set("b", "advice b")
+    assert cache.get("a") == "advice a"  # Check a hit, which makes "a" the most recently used entry
+    cache.set("c", "advice c")
+    assert cache.get("b") is None  # Check the least recently used entry was evicted
+    assert cache.stats()["evictions"] == 1  # Check the eviction is counted
+
+    time.sleep(0.06)
+    assert cache.get("a") is None  # Check the entry expired
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2  # Check the counters
+
+def test_disk_tier(tmp_path):
+    """
+    Test that entries are shared through the on-disk tier and removed by clear().
+
+    Args:
+        tmp_path (Path): A temporary directory provided by pytest.
+    """
+    path = str(tmp_path / "advice_cache.sqlite")
+    first = AdviceCache(path=path)
+    second = AdviceCache(path=path)
+
+    first.set("key", "advice")
+    assert second.get("key") == "advice"  # Check the other cache reads the entry from disk
+    assert second.stats()["disk_hits"] == 1  # Check the disk hit is counted
+
+    first.clear()
+    assert AdviceCache(path=path).get("key") is None  # Check the entry is removed from disk
+
+def test_disk_connections_closed(tmp_path, monkeypatch):
+    """
+    Test that every connection opened by the on-disk tier is closed.
+
+    Args:
+        tmp_path (Path): A temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Pytest fixture used to track the connections.
+    """
+    connections = []
+
+    class TrackedConnection(sqlite3.Connection):
+        closed = False
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    def connect(*args, **kwargs):
+        connections.append(sqlite3_connect(*args, factory=TrackedConnection, **kwargs))
+        return connections[-1]
+
+    sqlite3_connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, "connect", connect)
+    cache = AdviceCache(path=str(tmp_path / "advice_cache.sqlite"))
+    cache.set("key", "advice")
+    AdviceCache(path=cache.path).get("key")
+    cache.clear()
+    assert len(connections) == 5  # Check the table creation, set, second table creation, get and clear connected
+    assert all(connection.closed for connection in connections)  # Check every connection was closed
+
+def test_async_tiers_off_the_loop(tmp_path, monkeypatch):
+    """
+    Test that coroutines read and write the on-disk tier in the threadpool, and memory on the loop.
+
+    Args:
+        tmp_path (Path): A temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Pytest fixture used to record the threads of the disk tier.
+    """
+    cache = AdviceCache(path=str(tmp_path / "advice_cache.sqlite"))
+    threads = []
+    for name in ("_get_stored", "_set_stored"):
+        method = getattr(cache, name)
+        def record(*args, method=method):
+            threads.append(threading.current_thread())
+            return method(*args)
+        monkeypatch.setattr(cache, name, record)
+
+    async def run():
+        missing = await cache.aget("key")
+        await cache.aset("key", "advice")
+        return missing, await cache.aget("key")
+
+    assert asyncio.run(run()) == (None, "advice")  # Check the lookups and the store
+    assert len(threads) == 2 and threading.main_thread() not in threads  # Check the disk was only used off the loop thread
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1  # Check the counters
+
+def test_advice_route_uses_cache(test_client, test_db, fake_openai, monkeypatch):
+    """
+    Test that repeated advice requests are answered from the cache until an entry is written.
+
+    In the incremental mode, only the new entry is advised on after the write, before the
+    overall advice is requested.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        fake_openai (list): The calls made to the OpenAI stub.
+        monkeypatch (MonkeyPatch): Pytest fixture used to turn the incremental mode on.
+    """
+    monkeypatch.setattr(main, "INCREMENTAL_ADVICE", True)
+    test_client.post("/submit/", data={"income": 5000, "expenses": 1500, "tax_rate": 24})
+
+    first = test_client.get("/get_all_advice/")
+    second = test_client.get("/get_all_advice/")
+    assert first.status_code == 200  # Check if the status code is 200
+    assert "Advice 2" in second.text  # Check the cached advice is served
+    assert len(fake_openai) == 2  # Check the model was called for the entry and for the overall advice
+    assert test_client.get("/advice_cache/stats").json()["hits"] >= 1  # Check the hit is counted
+
+    # A write invalidates the cached advice, but not the advice stored for the first entry
+    test_client.post("/submit/", data={"income": 100, "expenses": 10, "tax_rate": 24})
+    assert "Advice 4" in test_client.get("/get_all_advice/").text  # Check the advice is requested again
+    assert len(fake_openai) == 4  # Check the model was called for the new entry and for the overall advice
+    piece_prompt = fake_openai[2]["messages"][-1]["content"]
+    assert "Income = 100.0" in piece_prompt and "Income = 5000.0" not in piece_prompt  # Check only the new entry is sent
+    assert "Advice 1" in fake_openai[3]["messages"][-1]["content"]  # Check the stored advice is reused
+
+def test_advice_route_single_prompt(test_client, fake_openai):
+    """
+    Test that the advice routes send the entries in a single prompt by default.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        fake_openai (list): The calls made to the OpenAI stub.
+    """
+    test_client.post("/submit/", data={"income": 700, "expenses": 70, "tax_rate": 24})
+    assert "Advice 1" in test_client.get("/get_all_advice/").text  # Check the advice is requested
+    assert len(fake_openai) == 1  # Check the model was called once for every entry
+    assert "Income = 700.0" in fake_openai[0]["messages"][-1]["content"]  # Check the entries are in the prompt
+
+def test_streamed_advice(test_client, fake_openai):
+    """
+    Test the Server-Sent Events advice stream and the page that displays it.
+
+    The streamed advice should be cached, so a second stream and the full render are 
+    served without calling the model again.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        fake_openai (list): The calls made to the OpenAI stub.
+    """
+    response = test_client.get("/get_all_advice/stream")
+    assert response.headers["content-type"].startswith("text/event-stream")  # Check the media type
+    assert response.text.count("data: ") > 2  # Check the advice is sent in several events
+    assert response.text.endswith('event: done\ndata: ""\n\n')  # Check the stream ends with a done event
+
+    test_client.get("/get_all_advice/stream")
+    assert "Advice 1" in test_client.get("/get_all_advice/").text  # Check the full render reuses the streamed advice
+    assert len(fake_openai) == 1  # Check the model was called once
+
+    page = test_client.get("/get_all_advice/", params={"stream": True})
+    assert "EventSource" in page.text  # Check the streaming page loads the advice stream
@@ -0,0 +1,114 @@
+import asyncio  # Import asyncio to run the advice coroutine
+import openai  # Import the OpenAI module whose chat completion API is replaced
+from types import SimpleNamespace  # Import SimpleNamespace to build the stub responses
+from sqlalchemy.orm import Session, sessionmaker  # Import SQLAlchemy session and session factory
+from app import prompt_builder  # Import the prompt builder module
+from app.advice import advice_cache, get_advice  # Import the advice cache and function
+from app.advice_store import load_pieces, piece_key, store_pieces  # Import the advice store
+from app.bulk import ingest_rows  # Import the bulk insert used to seed entries
+from app.prompt_builder import build_advice_prompt, parse_batch_advice  # Import the prompt builder
+
+def numbered_openai(monkeypatch) -> list[str]:
+    """
+    Replace the OpenAI chat completion API with a stub numbering its advice like the prompt.
+
+    Args:
+        monkeypatch (MonkeyPatch): Pytest fixture used to replace the API.
+
+    Returns:
+        list[str]: The prompt of every call made to the stub.
+    """
+    prompts = []
+
+    async def acreate(**kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        prompts.append(prompt)
+        items = [line.split(".")[0] for line in prompt.splitlines()[1:] if line[:1].isdigit()]
+        content = "\n".join(f"{item}. Advice {len(prompts)}.{item}" for item in items) or f"Advice {len(prompts)}"
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": content})])
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    return prompts
+
+def test_parse_batch_advice():
+    """
+    Test that the reply to a batch prompt is split by item number.
+    """
+    reply = "Here is the advice:\n1. Deduct more.\n3) Keep receipts\nfor five years.\n7. Unknown item."
+    assert parse_batch_advice(reply, 3) == ["Deduct more.", None, "Keep receipts for five years."]  # Check the numbered lines
+    assert parse_batch_advice(" Deduct more. ", 1) == ["Deduct more."]  # Check a single piece takes the whole reply
+
+def test_incremental_entries(test_db: Session, monkeypatch):
+    """
+    Test that entries are advised on in batches and only new entries are sent again.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to replace the OpenAI API.
+    """
+    prompts = numbered_openai(monkeypatch)
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    ingest_rows(test_db, [{"income": 1000 * i, "expenses": 100 * i, "tax_rate": 24} for i in range(1, 6)])
+
+    advice_prompt = build_advice_prompt(test_db, incremental=True)
+    assert advice_prompt.mode == "incremental"  # Check the incremental mode
+    assert len(advice_prompt.units) == 5  # Check there is one piece per entry
+    assert asyncio.run(get_advice(advice_prompt, session_factory=session_factory)) == "Advice 2"  # Check the overall advice
+    assert len(prompts) == 2  # Check the entries are advised on in one batch
+    assert "Entry 3: Income = 3000.0, Expenses = 300.0, Tax Rate = 24.0% Advice: Advice 1.3" in prompts[1]  # Check the pieces are given
+
+    ingest_rows(test_db, [{"income": 1000, "expenses": 100, "tax_rate": 24}, {"income": 7000, "expenses": 700, "tax_rate": 24}])
+    asyncio.run(get_advice(build_advice_prompt(test_db, incremental=True), session_factory=session_factory))
+    assert len(prompts) == 4  # Check the new entries are advised on in one batch
+    assert prompts[2].count("\n") == 1 and "Income = 7000.0" in prompts[2]  # Check only the new, distinct entry is sent
+    assert "Entry 6: Income = 1000.0, Expenses = 100.0, Tax Rate = 24.0% Advice: Advice 1.1" in prompts[3]  # Check identical entries share advice
+
+def test_incremental_buckets(test_db: Session, monkeypatch):
+    """
+    Test that larger tables are advised on per summary line and over-budget pieces are summarized.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to lower the detail limit and budget.
+    """
+    prompts = numbered_openai(monkeypatch)
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    monkeypatch.setattr(prompt_builder, "DETAIL_MAX_ROWS", 3)
+
+    advice_prompt = build_advice_prompt(test_db, incremental=True)
+    assert all(label is None for label, _ in advice_prompt.units)  # Check the pieces are summary lines
+    asyncio.run(get_advice(advice_prompt, session_factory=session_factory))
+    assert len(prompts) == 2  # Check the summary lines are advised on in one batch
+
+    # A new entry only changes the lines of its tax rate and income band
+    ingest_rows(test_db, [{"income": 30000, "expenses": 100, "tax_rate": 10}])
+    asyncio.run(get_advice(build_advice_prompt(test_db, incremental=True), session_factory=session_factory))
+    assert len(prompts) == 4  # Check the changed lines are advised on in one batch
+    assert prompts[2].count("\n") < len(advice_prompt.units)  # Check the unchanged lines are not sent again
+
+    # Pieces over the budget are summarized in chunks, which are stored too
+    monkeypatch.setattr(prompt_builder, "PROMPT_TOKEN_BUDGET", 100)
+    advice_cache.clear()
+    asyncio.run(get_advice(build_advice_prompt(test_db, incremental=True), session_factory=session_factory))
+    chunks = len(prompts) - 5
+    assert chunks > 1 and "Part 1: Advice" in prompts[-1]  # Check the advice uses the chunk summaries
+    advice_cache.clear()
+    asyncio.run(get_advice(build_advice_prompt(test_db, incremental=True), session_factory=session_factory))
+    assert len(prompts) == 4 + chunks + 2  # Check the stored chunk summaries are reused
+
+def test_expired_pieces(test_db: Session):
+    """
+    Test that expired pieces are ignored and deleted when new pieces are stored.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    key = piece_key("model", "Income = 1")
+    store_pieces(test_db, "model", {key: "Old advice"})
+    assert load_pieces(test_db, [key]) == {key: "Old advice"}  # Check the piece is stored
+    store_pieces(test_db, "model", {key: "New advice"})
+    assert load_pieces(test_db, [key]) == {key: "Old advice"}  # Check a stored piece is kept
+    assert load_pieces(test_db, [key], ttl=-1) == {}  # Check an expired piece is ignored
+
+    store_pieces(test_db, "model", {piece_key("model", "Income = 2"): "Advice"}, ttl=-1)
+    assert load_pieces(test_db, [key]) == {}  # Check the expired piece is deleted
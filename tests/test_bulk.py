@@ -0,0 +1,149 @@
+import json  # Import json to build NDJSON bodies
+from sqlalchemy import create_engine, insert, text  # Import the engine factory, insert statement and raw SQL
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.bulk import insert_mappings  # Import the bulk insert
+from app.migrations import FTS_TABLE, run_migrations  # Import the migrations and the full-text table
+from app.models import TaxInfo  # Import the TaxInfo model
+from app.totals import verify_totals  # Import the totals verification
+
+def test_bulk_json(test_client, test_db: Session):
+    """
+    Test submitting a JSON array where some rows are invalid.
+
+    The valid rows should be inserted with the same tax amount as the submit route, 
+    and the invalid rows should be reported without aborting the batch.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    response = test_client.post("/bulk/", params={"chunk_size": 2}, json=[
+        {"income": 5000, "expenses": 1500, "tax_rate": 24, "description": "Bulk 1"},
+        {"income": -1, "expenses": 100},
+        {"income": 300, "expenses": 100.555, "tax_rate": 10},
+        {"income": "abc", "expenses": 100},
+        {"expenses": 100},
+    ])
+    assert response.status_code == 200  # Check if the status code is 200
+    body = response.json()
+    assert body["inserted"] == 2  # Check only the valid rows are inserted
+    assert [error["row"] for error in body["errors"]] == [2, 4, 5]  # Check the rejected rows
+    assert body["errors"][0]["detail"] == "Income must be a positive number"  # Check the validation message
+
+    entry = test_db.query(TaxInfo).filter_by(description="Bulk 1").first()
+    assert entry.tax_amount == round(1500 * 0.24, 2)  # Check the tax amount matches the submit route
+    assert verify_totals(test_db) == []  # Check the running totals include the batch
+
+def test_bulk_ndjson_and_csv(test_client, test_db: Session):
+    """
+    Test submitting NDJSON and CSV bodies, and a CSV file upload.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    ndjson = "\n".join(json.dumps({"income": 100 * i, "expenses": 10 * i}) for i in range(1, 4)) + "\nnot json"
+    response = test_client.post("/bulk/", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert response.json()["inserted"] == 3  # Check the NDJSON rows are inserted
+    assert response.json()["errors"] == [{"row": 4, "detail": "Invalid JSON"}]  # Check the invalid line is reported
+
+    csv_body = "income,expenses,tax_rate,description\n1000,200,24,Bulk CSV\n500,-5,24,\n"
+    response = test_client.post("/bulk/", content=csv_body, headers={"content-type": "text/csv"})
+    assert response.json()["inserted"] == 1  # Check the valid CSV row is inserted
+    assert response.json()["errors"][0]["row"] == 2  # Check the invalid CSV row is reported
+
+    response = test_client.post("/bulk/", files={"file": ("entries.csv", csv_body, "text/csv")})
+    assert response.json()["inserted"] == 1  # Check the uploaded CSV row is inserted
+
+    assert test_db.query(TaxInfo).filter_by(description="Bulk CSV").count() == 2  # Check both CSV rows were saved
+    assert verify_totals(test_db) == []  # Check the running totals include every batch
+
+def test_bulk_non_finite_values(test_client, test_db: Session):
+    """
+    Test that infinite and NaN amounts are reported as row errors and the totals stay usable.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    csv_body = "income,expenses,tax_rate,description\n1000,inf,24,\n1000,200,24,Finite\nnan,200,24,\n100,10,-inf,\n"
+    response = test_client.post("/bulk/", content=csv_body, headers={"content-type": "text/csv"})
+    assert response.status_code == 200  # Check the upload is not aborted
+    body = response.json()
+    assert body["inserted"] == 1  # Check only the finite row is inserted
+    assert [error["row"] for error in body["errors"]] == [1, 3, 4]  # Check the non-finite rows are reported
+    assert body["errors"][0]["detail"] == "income, expenses and tax_rate must be finite numbers"  # Check the message
+
+    response = test_client.post("/bulk/", content='[{"income": NaN, "expenses": 1}, {"income": 1, "expenses": Infinity}]',
+                                headers={"content-type": "application/json"})
+    assert response.status_code == 200 and response.json()["inserted"] == 0  # Check the JSON literals are rejected too
+    assert len(response.json()["errors"]) == 2  # Check both rows are reported
+    assert verify_totals(test_db) == []  # Check the running totals match the entries
+
+    entry = test_db.query(TaxInfo).filter_by(description="Finite").first()
+    assert test_client.post(f"/delete/{entry.id}").status_code == 200  # Check the totals can still be adjusted
+
+def test_bulk_unsupported_content_type(test_client):
+    """
+    Test that unsupported bodies are rejected.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+    """
+    response = test_client.post("/bulk/", content="income", headers={"content-type": "text/plain"})
+    assert response.status_code == 415  # Check the content type is rejected
+
+    response = test_client.post("/bulk/", json={"income": 1})
+    assert response.status_code == 400  # Check a JSON object instead of an array is rejected
+
+def test_bulk_large_chunk_search(test_client, test_db: Session):
+    """
+    Test that the descriptions of a large chunk, indexed in one statement on SQLite, can be searched.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    schema_version = test_db.execute(text("PRAGMA schema_version")).scalar()
+    rows = [{"income": 100 + i, "expenses": i, "description": f"Invoice {i} quarterly"} for i in range(1500)]
+    response = test_client.post("/bulk/", params={"chunk_size": 1500}, json=rows)
+    assert response.json()["inserted"] == 1500  # Check every row is inserted in one chunk
+    test_db.commit()
+    assert test_db.execute(text("PRAGMA schema_version")).scalar() == schema_version  # Check the schema was not changed
+
+    response = test_client.get("/entries/", params={"search": "quarterly"})
+    assert len(response.json()) == 1500  # Check every description was added to the full-text index
+
+    test_client.post("/submit/", data={"income": 10, "expenses": 1, "description": "Single quarterly"})
+    response = test_client.get("/entries/", params={"search": "quarterly single"})
+    assert [entry["description"] for entry in response.json()] == ["Single quarterly"]  # Check the insert trigger is on again
+
+def test_migrations_replace_fts_insert_trigger(tmp_path):
+    """
+    Test that migrating a database with the insert trigger of an earlier version adds the pause condition.
+
+    Args:
+        tmp_path (Path): Pytest fixture providing a temporary directory.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'upgrade.sqlite'}")
+    run_migrations(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TRIGGER tax_info_fts_insert"))
+        connection.execute(text("DROP TABLE tax_info_fts_paused"))
+        connection.execute(text(
+            f"CREATE TRIGGER tax_info_fts_insert AFTER INSERT ON tax_info BEGIN "
+            f"INSERT INTO {FTS_TABLE} (rowid, description) VALUES (new.id, new.description); END"
+        ))
+        connection.execute(insert(TaxInfo.__table__), [{"income": 10, "expenses": 1, "tax_amount": 0.24, "tax_rate": 24, "description": "Before upgrade"}])
+
+    run_migrations(engine)
+    rows = [{"income": 10, "expenses": 1, "tax_amount": 0.24, "tax_rate": 24, "description": f"Bulk {i}"} for i in range(1000)]
+    with Session(engine) as db:
+        insert_mappings(db, rows)
+        db.add(TaxInfo(income=10, expenses=1, tax_amount=0.24, tax_rate=24, description="After upgrade"))
+        db.commit()
+        search = text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :words")
+        assert db.execute(search, {"words": "upgrade"}).scalar() == 2  # Check the entries before and after are indexed once
+        assert db.execute(search, {"words": "bulk"}).scalar() == 1000  # Check the bulk rows are indexed once
+        assert db.execute(text("SELECT count(*) FROM tax_info_fts_paused")).scalar() == 0  # Check the trigger is not left paused
+    engine.dispose()
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor  # Import the thread pool for concurrent writers
+import pytest  # Import pytest for the expected errors
+from sqlalchemy import text  # Import the raw SQL helper
+from sqlalchemy.exc import OperationalError  # Import the error raised by SQLite
+from sqlalchemy.orm import sessionmaker  # Import the session factory
+from app.database import Base, create_app_engine  # Import the engine profiles
+from app.models import TaxInfo  # Import the TaxInfo model
+
+def test_sqlite_profile(tmp_path):
+    """
+    Test the pragmas of the SQLite profile, the read-only engine and concurrent writers.
+
+    Args:
+        tmp_path (Path): A temporary directory provided by pytest.
+    """
+    url = f"sqlite:///{tmp_path / 'profile.sqlite'}"
+    write_engine = create_app_engine(url)
+    read_engine = create_app_engine(url, read_only=True)
+    Base.metadata.create_all(bind=write_engine)
+
+    with write_engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"  # Check write-ahead logging
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # Check synchronous=NORMAL
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000  # Check the busy timeout
+    assert write_engine.pool.size() == 1  # Check the single writer connection
+
+    # Writers of many threads queue for the single connection instead of failing
+    WriteSession = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+    def write(i):
+        with WriteSession() as db:
+            db.add(TaxInfo(income=i, expenses=0, tax_amount=0, tax_rate=24))
+            db.commit()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(write, range(200)))
+
+    with read_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM tax_info")).scalar() == 200  # Check every write succeeded
+        with pytest.raises(OperationalError):
+            connection.execute(text("DELETE FROM tax_info"))  # Check the read engine cannot write
+
+def test_sqlite_memory_profile():
+    """
+    Test that in-memory SQLite databases keep the default pool.
+    """
+    memory_engine = create_app_engine("sqlite://")
+    with memory_engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"  # Check no WAL is requested
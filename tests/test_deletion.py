@@ -0,0 +1,74 @@
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.deletion import delete_entries  # Import the chunked deletion
+from app.models import TaxInfo, TaxInfoArchive  # Import the models
+from app.totals import get_totals, verify_totals  # Import the totals functions
+
+def add_entries(test_client, count: int, tax_rate: float = 24, description: str = "Entry") -> list[int]:
+    """
+    Insert entries through the bulk route and return their IDs.
+    """
+    test_client.post("/bulk/", json=[
+        {"income": 1000 + i, "expenses": 100 + i, "tax_rate": tax_rate, "description": f"{description} {i}"} for i in range(count)
+    ])
+    response = test_client.get("/entries/", params={"description": description})
+    return [entry["id"] for entry in response.json()]
+
+def test_bulk_delete(test_client, test_db: Session):
+    """
+    Test deleting entries by ID, by filter and both, and archiving them instead.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    ids = add_entries(test_client, 6, tax_rate=10, description="Ids")
+    add_entries(test_client, 4, tax_rate=30, description="Filtered")
+
+    response = test_client.post("/bulk_delete/", json={"ids": ids[:2] + [10 ** 9]})
+    assert response.json() == {"deleted": 2, "archived": False}  # Check only the existing IDs are counted
+
+    response = test_client.post("/bulk_delete/", params={"tax_rate": 30}, json={"ids": ids[2:4]})
+    assert response.json()["deleted"] == 0  # Check IDs not matching the filters are kept
+
+    response = test_client.post("/bulk_delete/", params={"tax_rate": 30})
+    assert response.json()["deleted"] == 4  # Check every entry matching the filter is deleted
+
+    response = test_client.post("/bulk_delete/", params={"archive": True}, json={"ids": ids[2:4]})
+    assert response.json() == {"deleted": 2, "archived": True}  # Check the entries are archived
+    archived = test_db.query(TaxInfoArchive).order_by(TaxInfoArchive.entry_id).all()
+    assert [entry.entry_id for entry in archived] == ids[2:4]  # Check the archived entries keep their ID
+    assert archived[0].description == "Ids 2"  # Check the archived entries keep their fields
+
+    assert test_client.post("/bulk_delete/").status_code == 400  # Check a delete without IDs or filters is rejected
+    assert test_client.post("/bulk_delete/", params={"sort": "-id"}).status_code == 400  # Check the sort order is not a filter
+
+    assert test_db.query(TaxInfo).count() == 2  # Check the remaining entries
+    assert get_totals(test_db)["entry_count"] == 2  # Check the totals only count the remaining entries
+    assert verify_totals(test_db) == []  # Check the running totals match the entries
+
+def test_chunked_clear_and_archive(test_client, test_db: Session):
+    """
+    Test clearing the entries in chunks and archiving the oldest entries.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    add_entries(test_client, 7, description="Chunked")
+    assert delete_entries(test_db, archive=False, chunk_size=3) == 9  # Check every entry is deleted over several chunks
+    assert test_db.query(TaxInfo).count() == 0  # Check the table is empty
+    assert get_totals(test_db)["entry_count"] == 0  # Check the totals are empty
+
+    ids = add_entries(test_client, 5, description="Old")
+    response = test_client.post("/archive/", params={"keep": 2})
+    assert response.json() == {"deleted": 3, "archived": True}  # Check all but the newest entries are archived
+    assert [entry.id for entry in test_db.query(TaxInfo).order_by(TaxInfo.id)] == ids[3:]  # Check the newest entries are kept
+    assert test_client.post("/archive/", params={"keep": 2}).json()["deleted"] == 0  # Check nothing more is archived
+    archived = test_db.query(TaxInfoArchive).filter(TaxInfoArchive.description.like("Old %")).order_by(TaxInfoArchive.entry_id)
+    assert [entry.entry_id for entry in archived] == ids[:3]  # Check the oldest entries are in the archive
+
+    response = test_client.post("/clear_all/", follow_redirects=False)
+    assert response.status_code == 303  # Check the clear redirects to the home page
+    assert test_db.query(TaxInfo).count() == 0  # Check every entry is cleared
+    assert test_client.get("/entries/", params={"search": "old"}).json() == []  # Check the full-text index is cleared
+    assert verify_totals(test_db) == []  # Check the running totals match the entries
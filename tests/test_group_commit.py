@@ -0,0 +1,116 @@
+import asyncio  # Import asyncio to run the writer outside of the application
+import pytest  # Import pytest to check the transaction errors
+from concurrent.futures import ThreadPoolExecutor  # Import the executor sending concurrent requests
+from fastapi.testclient import TestClient  # Import the test client
+from sqlalchemy.orm import Session, sessionmaker  # Import SQLAlchemy session and session factory
+from app import group_commit, main  # Import the application modules, whose group writer and notification are replaced
+from app.group_commit import GroupCommitWriter  # Import the group writer
+from app.models import TaxInfo  # Import the entry model
+from app.totals import get_totals, verify_totals  # Import the totals functions
+
+def test_group_commit_route(test_client, test_db: Session, monkeypatch):
+    """
+    Test that concurrent submissions are committed together and every request is answered.
+
+    Args:
+        test_client (TestClient): A test client, used here to install the test database overrides.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to enable the group writer.
+    """
+    writer = GroupCommitWriter(max_rows=8, delay_ms=50)
+    monkeypatch.setattr(main, "GROUP_COMMIT", True)
+    monkeypatch.setattr(main, "group_writer", writer)
+
+    # A client used as a context manager keeps one event loop, on which the writer runs
+    with TestClient(main.app) as client:
+        def submit(i):
+            return client.post("/submit/", data={"income": 1000 + i, "expenses": 100, "tax_rate": 24}, follow_redirects=False)
+
+        with ThreadPoolExecutor(20) as executor:
+            responses = list(executor.map(submit, range(20)))
+        assert all(response.status_code == 303 for response in responses)  # Check every submission is acknowledged
+        assert writer.rows == 20  # Check every entry went through the writer
+        assert writer.transactions < 20  # Check entries share transactions
+
+    assert test_db.query(TaxInfo).count() == 20  # Check every entry is stored
+    assert get_totals(test_db)["entry_count"] == 20  # Check the totals are updated
+    assert verify_totals(test_db) == []  # Check the totals match the entries
+
+def test_group_commit_error(test_db: Session):
+    """
+    Test that a failed transaction fails the submissions it holds and the writer keeps running.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    writer = GroupCommitWriter(max_rows=4, delay_ms=0)
+    valid = {"income": 10, "expenses": 1, "tax_amount": 0.24, "tax_rate": 24, "description": None}
+
+    async def run():
+        with pytest.raises(Exception):
+            await writer.submit(dict(valid, income=None), session_factory)
+        await writer.submit(valid, session_factory)
+        await writer.stop()
+
+    asyncio.run(run())
+    assert (writer.transactions, writer.rows) == (1, 1)  # Check only the valid entry is counted
+    assert test_db.query(TaxInfo).filter(TaxInfo.income == 10).count() == 1  # Check the valid entry is stored
+
+def test_group_commit_isolates_bad_entry(test_db: Session):
+    """
+    Test that a bad entry sharing a batch only fails its own submission.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    # The delay lets every submission join the same batch
+    writer = GroupCommitWriter(max_rows=8, delay_ms=50)
+    valid = {"income": 20, "expenses": 2, "tax_amount": 0.48, "tax_rate": 24, "description": "Shared batch"}
+    entries = [valid] * 3 + [dict(valid, income=None)] + [valid] * 2
+
+    async def run():
+        results = await asyncio.gather(*(writer.submit(values, session_factory) for values in entries), return_exceptions=True)
+        await writer.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert [isinstance(result, Exception) for result in results] == [False] * 3 + [True] + [False] * 2  # Check only the bad entry failed
+    assert writer.rows == 5  # Check every valid entry went through the writer
+    assert test_db.query(TaxInfo).filter(TaxInfo.description == "Shared batch").count() == 5  # Check the valid entries are stored
+    assert verify_totals(test_db) == []  # Check the totals match the entries
+
+def test_group_commit_survives_notify_error(test_db: Session, monkeypatch):
+    """
+    Test that a failed notification does not stop the writer, and that a restarted writer writes the queued entries.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to make the notification fail.
+    """
+    def fail():
+        raise RuntimeError("shared cache unavailable")
+
+    monkeypatch.setattr(group_commit, "notify_data_change", fail)
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    writer = GroupCommitWriter(max_rows=4, delay_ms=0)
+    valid = {"income": 30, "expenses": 3, "tax_amount": 0.72, "tax_rate": 24, "description": "Restarted writer"}
+
+    async def run():
+        await writer.submit(valid, session_factory)
+        await writer.submit(valid, session_factory)
+        alive = not writer._task.done()
+
+        # An entry left on the queue of a writer that ended is written by the next one
+        writer._task.cancel()
+        await asyncio.gather(writer._task, return_exceptions=True)
+        left = asyncio.get_running_loop().create_future()
+        writer._queue.put_nowait((valid, left))
+        await asyncio.wait_for(writer.submit(valid, session_factory), 5)
+        await asyncio.wait_for(left, 5)
+        await writer.stop()
+        return alive
+
+    assert asyncio.run(run())  # Check the writer survived the failed notifications
+    assert test_db.query(TaxInfo).filter(TaxInfo.description == "Restarted writer").count() == 4  # Check every entry is stored
@@ -0,0 +1,32 @@
+import importlib  # Import importlib to read the configuration again with other settings
+import os  # Import os to read the environment variables set by the configuration
+import pytest  # Import pytest for the monkeypatch fixture
+from app import database  # Import the database module to change the database URL
+
+gunicorn_conf = pytest.importorskip("app.gunicorn_conf")  # Gunicorn is not available on Windows
+
+def test_worker_settings(monkeypatch):
+    """
+    Test the number of workers and the caches shared, or disabled, when there are several workers.
+
+    Args:
+        monkeypatch (MonkeyPatch): A pytest fixture to change settings for the test.
+    """
+    # Setting the variables first makes monkeypatch restore them after the configuration changed them
+    for name in ("PAGE_CACHE_SIZE", "ADVICE_CACHE_SIZE", "SHARED_CACHE_URL"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    monkeypatch.setattr(database, "DATABASE_URL", "sqlite:///./workers.sqlite")
+    conf = importlib.reload(gunicorn_conf)
+    assert conf.workers == 3 and conf.preload_app is False  # Check the workers are set from WEB_CONCURRENCY
+    assert os.environ["SHARED_CACHE_URL"] == f"sqlite:///{conf.default_shared_cache}"  # Check the workers get a shared cache
+    assert "PAGE_CACHE_SIZE" not in os.environ and "ADVICE_CACHE_SIZE" not in os.environ  # Check the caches stay enabled
+
+    monkeypatch.setenv("SHARED_CACHE_URL", "")
+    conf = importlib.reload(gunicorn_conf)
+    assert conf.default_shared_cache is None  # Check an empty URL disables the shared cache
+    assert os.environ["PAGE_CACHE_SIZE"] == "0" and os.environ["ADVICE_CACHE_SIZE"] == "0"  # Check the per-worker caches are disabled
+
+    monkeypatch.setattr(database, "DATABASE_URL", "sqlite://")
+    assert importlib.reload(gunicorn_conf).workers == 1  # Check an in-memory database is served by one worker
@@ -0,0 +1,139 @@
+import asyncio  # Import asyncio to run the worker pool outside of the application
+import time  # Import time to poll the job status
+from fastapi.testclient import TestClient  # Import the test client
+from sqlalchemy.exc import OperationalError  # Import the error raised by a locked database
+from sqlalchemy.orm import Session, sessionmaker  # Import SQLAlchemy session and session factory
+from app.jobs import JobWorkerPool, claim_job, create_job, finish_job  # Import the job queue functions and worker pool
+from app.main import app  # Import the FastAPI application
+from app.prompt_builder import AdvicePrompt  # Import the advice prompt
+
+def test_job_queue(test_db: Session, fake_openai):
+    """
+    Test queueing, deduplicating, claiming and finishing advice jobs.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        fake_openai (list): The calls made to the OpenAI stub, which keeps the advice cache empty.
+    """
+    first = create_job(test_db, AdvicePrompt("detailed", "prompt 1"))
+    duplicate = create_job(test_db, AdvicePrompt("detailed", "prompt 1"))
+    other = create_job(test_db, AdvicePrompt("detailed", "prompt 2"))
+    assert duplicate.id == first.id  # Check an identical pending job is reused
+    assert other.id != first.id  # Check a different prompt gets its own job
+
+    claimed = claim_job(test_db)
+    assert claimed.id == first.id and claimed.status == "running"  # Check the oldest job is claimed
+    assert create_job(test_db, AdvicePrompt("detailed", "prompt 1")).id == first.id  # Check a running job is reused
+    assert claim_job(test_db).id == other.id  # Check the next claim gets the next job
+    assert claim_job(test_db) is None  # Check the queue is empty
+
+    finish_job(test_db, first.id, result="Advice")
+    finish_job(test_db, other.id, error="Failure")
+    test_db.expire_all()
+    assert (first.status, first.result) == ("done", "Advice")  # Check the result is stored
+    assert (other.status, other.error) == ("failed", "Failure")  # Check the error is stored
+    assert create_job(test_db, AdvicePrompt("detailed", "prompt 1")).id != first.id  # Check a finished job is not reused
+
+def test_advice_job_routes(test_client, test_db: Session, fake_openai):
+    """
+    Test creating an advice job through the API and polling it until it is done.
+
+    Args:
+        test_client (TestClient): A test client, used here to install the test database overrides.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        fake_openai (list): The calls made to the OpenAI stub.
+    """
+    # A client used as a context manager keeps one event loop, on which the workers run
+    with TestClient(app) as client:
+        assert client.post("/advice_jobs/").status_code == 400  # Check a job needs entries
+
+        client.post("/submit/", data={"income": 5000, "expenses": 1500, "tax_rate": 24})
+        response = client.post("/advice_jobs/")
+        assert response.status_code == 202  # Check the job is accepted
+        job_id = response.json()["job_id"]
+
+        deadline = time.time() + 5
+        while (job := client.get(f"/advice_jobs/{job_id}").json())["status"] not in ("done", "failed"):
+            assert time.time() < deadline  # Check the job finishes in time
+            time.sleep(0.01)
+
+        assert job["advice_list"] == [f"Advice {len(fake_openai)}", "Keep your receipts."]  # Check the advice of the job
+        assert client.get("/advice_jobs/unknown").status_code == 404  # Check unknown jobs are not found
+
+def test_worker_survives_queue_errors(test_db: Session):
+    """
+    Test that a worker keeps claiming jobs after the queue fails, and that a finished task is restarted.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    sessions = []
+
+    def flaky_factory():
+        sessions.append(1)
+        # The first sessions fail like a locked database would
+        if len(sessions) <= 2:
+            raise OperationalError("BEGIN IMMEDIATE", {}, Exception("database is locked"))
+        return session_factory()
+
+    pool = JobWorkerPool(workers=1, poll_interval=0.01)
+
+    async def run():
+        pool.ensure_started(flaky_factory)
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if len(sessions) > 4:
+                break
+        alive = not pool._tasks[0].done()
+
+        first = pool._tasks[0]
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        pool.ensure_started(flaky_factory)
+        restarted = pool._tasks[0] is not first and not pool._tasks[0].done()
+        await pool.stop()
+        return alive, restarted
+
+    alive, restarted = asyncio.run(run())
+    assert len(sessions) > 4  # Check the worker kept claiming after the errors
+    assert alive  # Check the worker task did not end
+    assert restarted  # Check a finished task is replaced
+
+def test_idle_workers_poll_on_read_sessions(test_db: Session, fake_openai):
+    """
+    Test that idle workers poll the queue on read sessions and only open a write session to claim a job.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        fake_openai (list): The calls made to the OpenAI stub.
+    """
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    reads, writes = [], []
+
+    def read_factory():
+        reads.append(1)
+        return session_factory()
+
+    def write_factory():
+        writes.append(1)
+        return session_factory()
+
+    pool = JobWorkerPool(workers=2, poll_interval=0.01)
+
+    async def run():
+        pool.ensure_started(write_factory, read_factory)
+        while len(reads) < 10:
+            await asyncio.sleep(0.01)
+        idle_writes = len(writes)
+
+        create_job(test_db, AdvicePrompt("detailed", "prompt 3"))
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if writes:
+                break
+        await pool.stop()
+        return idle_writes
+
+    assert asyncio.run(run()) == 0  # Check the idle workers did not open write sessions
+    assert writes  # Check a write session was opened to claim the queued job
@@ -0,0 +1,154 @@
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.models import TaxInfo  # Import the TaxInfo model
+from app.listing import EntryFilter, EntryRecord, entry_to_dict, fetch_page  # Import the listing helpers
+
+def _add_entries(test_db: Session, count: int) -> list[int]:
+    """
+    Add the given number of entries to the test database.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        count (int): The number of entries to add.
+
+    Returns:
+        list[int]: The IDs of the new entries.
+    """
+    entries = [
+        TaxInfo(income=100 * i, expenses=10 * i, tax_amount=2.4 * i, tax_rate=24, description=f"Page {i}")
+        for i in range(1, count + 1)
+    ]
+    test_db.add_all(entries)
+    test_db.commit()
+    return [entry.id for entry in entries]
+
+def test_fetch_page_keyset(test_db: Session):
+    """
+    Test that keyset pagination walks the table in ID order without repeating entries.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    ids = _add_entries(test_db, 5)
+
+    first, cursor = fetch_page(test_db, limit=2)
+    assert [entry.id for entry in first] == ids[:2]  # Check the first page
+    assert cursor == ids[1]  # Check the cursor points at the last entry of the page
+
+    second, cursor = fetch_page(test_db, after=cursor, limit=2)
+    assert [entry.id for entry in second] == ids[2:4]  # Check the second page
+
+    last, cursor = fetch_page(test_db, after=cursor, limit=2)
+    assert [entry.id for entry in last] == ids[4:]  # Check the last page
+    assert cursor is None  # Check there is no page after the last one
+
+def test_home_pagination(test_client):
+    """
+    Test that the home page shows a link to the next page when there are more entries.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+    """
+    response = test_client.get("/", params={"limit": 2})
+    assert response.status_code == 200  # Check if the status code is 200
+    assert "Next Page" in response.text  # Check the next page link is shown
+
+    response = test_client.get("/", params={"limit": 0})
+    assert response.status_code == 422  # Check invalid page sizes are rejected
+
+def test_list_entries_json(test_client):
+    """
+    Test the streamed JSON listing with and without a cursor and limit.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+    """
+    response = test_client.get("/entries/")
+    assert response.status_code == 200  # Check if the status code is 200
+    entries = response.json()
+    assert len(entries) == 5  # Check all entries are returned
+    assert entries[0]["description"] == "Page 1"  # Check the entries are in ID order
+
+    response = test_client.get("/entries/", params={"after": entries[0]["id"], "limit": 2})
+    assert [entry["description"] for entry in response.json()] == ["Page 2", "Page 3"]  # Check the cursor and limit
+
+def _entry_id(test_db: Session, description: str) -> int:
+    """
+    Return the ID of the entry with the given description.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        description (str): The description of the entry.
+
+    Returns:
+        int: The ID of the entry.
+    """
+    return test_db.query(TaxInfo.id).filter(TaxInfo.description == description).scalar()
+
+def test_fetch_page_filters(test_db: Session):
+    """
+    Test the range, equality, prefix and full-text filters and the sorted keyset pagination.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    test_db.add_all([
+        TaxInfo(income=900, expenses=90, tax_amount=9, tax_rate=10, description="Office rent"),
+        TaxInfo(income=700, expenses=70, tax_amount=7, tax_rate=10, description="Office chairs"),
+        TaxInfo(income=800, expenses=80, tax_amount=8, tax_rate=10, description="Travel to the office"),
+    ])
+    test_db.commit()
+
+    def descriptions(**filters):
+        rows, _ = fetch_page(test_db, limit=10, entry_filter=EntryFilter(**filters))
+        return [entry.description for entry in rows]
+
+    assert descriptions(tax_rate=10) == ["Office rent", "Office chairs", "Travel to the office"]  # Check the equality filter
+    assert descriptions(min_income=700, max_income=800) == ["Office chairs", "Travel to the office"]  # Check the range filter
+    assert descriptions(max_expenses=50) == ["Page 1", "Page 2", "Page 3", "Page 4", "Page 5"]  # Check the expenses filter
+    assert descriptions(description="Office") == ["Office rent", "Office chairs"]  # Check the prefix filter
+    assert descriptions(search="office") == ["Office rent", "Office chairs", "Travel to the office"]  # Check the full-text search
+    assert descriptions(search='chairs "office') == ["Office chairs"]  # Check every word must match and quotes are literal
+
+    # Walk the entries with a tax rate of 10 by descending income, one entry per page
+    entry_filter = EntryFilter(tax_rate=10, sort="-income")
+    walked = []
+    after = after_value = None
+    while True:
+        rows, after = fetch_page(test_db, after, 1, entry_filter, after_value)
+        walked.extend(entry.income for entry in rows)
+        if after is None:
+            break
+        after_value = entry_filter.sort_value(rows[-1])
+    assert walked == [900, 800, 700]  # Check the sorted pages
+
+    rows, _ = fetch_page(test_db, after=_entry_id(test_db, "Office rent"), limit=10, entry_filter=entry_filter)
+    assert [entry.income for entry in rows] == [800, 700]  # Check the sort value is looked up from the cursor entry
+
+def test_list_entries_filters(test_client):
+    """
+    Test the filter and sort query parameters of the listing routes.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+    """
+    response = test_client.get("/entries/", params={"search": "office", "sort": "expenses"})
+    assert [entry["expenses"] for entry in response.json()] == [70, 80, 90]  # Check the filtered and sorted listing
+
+    response = test_client.get("/", params={"tax_rate": 10, "sort": "-income", "limit": 1})
+    assert "Office rent" in response.text and "Office chairs" not in response.text  # Check the filtered page
+    assert "after_value=900.0" in response.text and "tax_rate=10.0" in response.text  # Check the next link keeps the filters
+
+    response = test_client.get("/entries/", params={"sort": "description"})
+    assert response.status_code == 422  # Check unknown sort columns are rejected
+
+def test_entry_records(test_db: Session):
+    """
+    Test that pages are read as lightweight records holding the column values.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    rows, _ = fetch_page(test_db, limit=1)
+    entry = test_db.get(TaxInfo, rows[0].id)
+    assert isinstance(rows[0], EntryRecord) and not hasattr(rows[0], "__dict__")  # Check records have slots only
+    assert entry_to_dict(rows[0]) == entry_to_dict(entry)  # Check the record holds the same values as the ORM object
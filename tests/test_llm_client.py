@@ -0,0 +1,141 @@
+import asyncio  # Import asyncio to run the client
+import time  # Import time to measure the throughput
+import openai  # Import openai for its error types
+import pytest  # Import pytest for testing
+from app.llm_client import AdviceClient  # Import the async LLM client
+
+MESSAGES = [{"role": "user", "content": "prompt"}]
+
+def test_concurrent_requests_are_limited(openai_stub_server):
+    """
+    Test 100 concurrent advice requests against the local stub server.
+
+    All requests should succeed, never more than the concurrency limit should reach 
+    the server at the same time, and the calls should overlap instead of running 
+    one after the other.
+
+    Args:
+        openai_stub_server (StubOpenAIServer): The local server imitating the OpenAI API.
+    """
+    openai_stub_server.delay = 0.05
+    client = AdviceClient(max_concurrency=20, timeout=5)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(
+                client.complete("gpt-3.5-turbo", [{"role": "user", "content": f"prompt {i}"}])
+                for i in range(100)
+            ))
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert results[7] == "Advice for prompt 7"  # Check every caller gets its own completion
+    assert openai_stub_server.requests == 100  # Check every distinct prompt was sent
+    assert openai_stub_server.max_active <= 20  # Check the concurrency limit
+    assert elapsed < 100 * 0.05 / 2  # Check the calls overlapped
+
+def test_identical_requests_are_coalesced(openai_stub_server):
+    """
+    Test that concurrent identical requests share a single call to the server.
+
+    Args:
+        openai_stub_server (StubOpenAIServer): The local server imitating the OpenAI API.
+    """
+    openai_stub_server.delay = 0.05
+    client = AdviceClient()
+
+    async def run():
+        try:
+            return await asyncio.gather(*(client.complete("gpt-3.5-turbo", MESSAGES) for _ in range(50)))
+        finally:
+            await client.close()
+
+    results = asyncio.run(run())
+    assert set(results) == {"Advice for prompt"}  # Check every caller gets the completion
+    assert openai_stub_server.requests == 1  # Check a single call was made
+
+def test_transient_errors_are_retried(openai_stub_server):
+    """
+    Test that a 503 answer is retried and that retries stop after the configured number.
+
+    Args:
+        openai_stub_server (StubOpenAIServer): The local server imitating the OpenAI API.
+    """
+    client = AdviceClient(retries=2, backoff=0.01)
+
+    async def run():
+        try:
+            return await client.complete("gpt-3.5-turbo", MESSAGES)
+        finally:
+            await client.close()
+
+    openai_stub_server.fail_next = 2
+    assert asyncio.run(run()) == "Advice for prompt"  # Check the call succeeds after two retries
+
+    openai_stub_server.fail_next = 3
+    with pytest.raises(openai.error.ServiceUnavailableError):  # Check the error is raised once retries run out
+        asyncio.run(run())
+
+def test_timeout():
+    """
+    Test that a call taking longer than the timeout fails after the retries.
+    """
+    async def slow_backend(model, messages):
+        await asyncio.sleep(1)
+
+    client = AdviceClient(timeout=0.01, retries=1, backoff=0.01, backend=slow_backend)
+    with pytest.raises(asyncio.TimeoutError):  # Check the timeout is raised
+        asyncio.run(client.complete("gpt-3.5-turbo", MESSAGES))
+
+def test_stream(openai_stub_server):
+    """
+    Test that a streamed completion from the stub server arrives piece by piece.
+
+    Args:
+        openai_stub_server (StubOpenAIServer): The local server imitating the OpenAI API.
+    """
+    client = AdviceClient()
+
+    async def run():
+        try:
+            return [piece async for piece in client.stream("gpt-3.5-turbo", MESSAGES)]
+        finally:
+            await client.close()
+
+    pieces = asyncio.run(run())
+    assert len(pieces) == 3  # Check the completion arrives in several pieces
+    assert "".join(pieces).strip() == "Advice for prompt"  # Check the pieces form the completion
+
+def test_session_closed_when_loop_changes(openai_stub_server):
+    """
+    Test that the pooled session of a previous event loop is closed when the client moves to a new loop.
+
+    Args:
+        openai_stub_server (StubOpenAIServer): The local server imitating the OpenAI API.
+    """
+    client = AdviceClient()
+
+    async def call():
+        result = await client.complete("gpt-3.5-turbo", MESSAGES)
+        return result, client._session
+
+    first_result, first_session = asyncio.run(call())
+    assert not first_session.closed  # Check the session is left open when its loop ends
+
+    async def run():
+        try:
+            result, session = await call()
+            # Let the closing task of the previous session run
+            await asyncio.sleep(0)
+            return result, session
+        finally:
+            await client.close()
+
+    second_result, second_session = asyncio.run(run())
+    assert first_result == second_result == "Advice for prompt"  # Check both loops get the completion
+    assert second_session is not first_session  # Check the new loop gets its own session
+    assert first_session.closed  # Check the session of the previous loop is closed
@@ -1,3 +1,6 @@
+import os  # Import os to locate the repository
+import subprocess  # Import subprocess to start the application in a new process
+import sys  # Import sys to find the Python interpreter
 from sqlalchemy.orm import Session  # Import SQLAlchemy session
 from app.models import TaxInfo  # Import the TaxInfo model
 
@@ -43,6 +46,21 @@ def test_submit_tax_info(test_client, test_db):
     assert entry.expenses == 1500  # Check if the expenses are correct
     assert entry.tax_amount == round(1500 * 0.24, 2)  # Check if the tax amount is correct
 
+def test_submit_non_finite_values(test_client, test_db: Session):
+    """
+    Test that infinite and NaN amounts are rejected by the submit route.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    count = test_db.query(TaxInfo).count()
+    for data in ({"income": "nan", "expenses": 10}, {"income": 10, "expenses": "inf"}, {"income": 10, "expenses": 1, "tax_rate": "nan"}):
+        response = test_client.post("/submit/", data=data)
+        assert response.status_code == 400  # Check the entry is rejected as a client error
+        assert "finite number" in response.json()["detail"]  # Check the validation message
+    assert test_db.query(TaxInfo).count() == count  # Check no entry was saved
+
 def test_delete_entry(test_client, test_db: Session):
     """
     Test deleting a specific tax information entry by ID.
@@ -93,3 +111,24 @@ def test_clear_all_entries(test_client, test_db: Session):
     # Query the database to check if all entries are deleted
     entries = test_db.query(TaxInfo).all()
     assert len(entries) == 0  # Check if the number of entries is 0 (cleared)
+
+def test_import_outside_repository(tmp_path):
+    """
+    Test that the application starts from another working directory without importing OpenAI.
+
+    Args:
+        tmp_path (Path): A temporary directory provided by pytest.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        "import sys\n"
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    assert client.get('/').status_code == 200\n"
+        "assert 'openai' not in sys.modules\n"
+    )
+    env = dict(os.environ, PYTHONPATH=root, DATABASE_URL=f"sqlite:///{tmp_path / 'start.sqlite'}", TEMPLATE_CACHE_DIR=str(tmp_path))
+    env.pop("DATABASE_READ_URL", None)
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr  # Check the templates and the schema are found and created
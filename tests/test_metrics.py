@@ -0,0 +1,94 @@
+import asyncio  # Import asyncio to run a coroutine route function beside another task
+from app import profiling  # Import the profiling module to switch its mode
+from app.metrics import Histogram, LLM_SECONDS  # Import the metric types and the LLM histogram
+
+def test_histogram_exposition():
+    """
+    Test that a histogram counts observations in cumulative buckets in the Prometheus format.
+    """
+    histogram = Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, route="/")
+    histogram.observe(0.1, route="/")
+    histogram.observe(5, route="/")
+    lines = histogram.expose()
+    assert 'test_seconds_bucket{route="/",le="0.1"} 2' in lines  # Check the bucket bounds are inclusive
+    assert 'test_seconds_bucket{route="/",le="1.0"} 2' in lines  # Check the buckets are cumulative
+    assert 'test_seconds_bucket{route="/",le="+Inf"} 3' in lines and 'test_seconds_count{route="/"} 3' in lines  # Check every observation is counted
+    assert histogram.count(route="/") == 3  # Check the count of the labels
+
+def test_metrics_route(test_client, test_db, fake_openai):
+    """
+    Test that requests, queries, templates and LLM calls are reported on "/metrics".
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        fake_openai (list): The calls made to the stubbed OpenAI API.
+    """
+    calls = LLM_SECONDS.count(model="gpt-3.5-turbo", outcome="ok")
+    test_client.get("/", params={"min_income": 12345})
+    test_client.get("/get_all_advice/")
+    text = test_client.get("/metrics").text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in text  # Check the route latency
+    assert 'http_request_db_queries_bucket{route="/",le="+Inf"}' in text  # Check the queries per request
+    assert 'db_query_duration_seconds_count{statement="SELECT"}' in text  # Check the query durations
+    assert 'template_render_duration_seconds_count{template="_entries.html"}' in text  # Check the template render time
+    assert LLM_SECONDS.count(model="gpt-3.5-turbo", outcome="ok") == calls + len(fake_openai)  # Check the LLM calls
+
+    test_client.get("/no_such_page/42")
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}' in test_client.get("/metrics").text  # Check unknown paths share one label
+
+def test_profile_header(test_client, monkeypatch):
+    """
+    Test that a request with the X-Profile header is answered with its profile.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        monkeypatch (MonkeyPatch): A pytest fixture to change settings for the test.
+    """
+    assert "Tax Information" in test_client.get("/", headers={"X-Profile": "1"}).text  # Check profiling is off by default
+
+    monkeypatch.setattr(profiling, "PROFILING", "header")
+    response = test_client.get("/", params={"max_income": 54321}, headers={"X-Profile": "1"})
+    assert response.headers["x-profiled-status"] == "200"  # Check the status of the profiled response
+    assert "function calls" in response.text and "fetch_page" in response.text  # Check the threadpool route was profiled
+    assert "Tax Information" in test_client.get("/").text  # Check requests without the header are unchanged
+
+def test_async_profile_excludes_other_tasks():
+    """
+    Test that the profile of a coroutine route function leaves out the tasks the event loop runs while it awaits.
+    """
+    def other_request_work():
+        return sum(range(1000))
+
+    def own_work():
+        return sum(range(1000))
+
+    async def other_request():
+        for _ in range(5):
+            other_request_work()
+            await asyncio.sleep(0)
+
+    @profiling.profiled
+    async def route():
+        own_work()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        own_work()
+        return "done"
+
+    async def run():
+        profiles = []
+        token = profiling._request_profiles.set(profiles)
+        try:
+            result, _ = await asyncio.gather(route(), other_request())
+        finally:
+            profiling._request_profiles.reset(token)
+        return result, profiles
+
+    result, profiles = asyncio.run(run())
+    report = profiling.format_report(profiles)
+    assert result == "done"  # Check the result of the route function is returned
+    assert "own_work" in report  # Check the route function is profiled
+    assert "other_request_work" not in report  # Check the other task is not part of the profile
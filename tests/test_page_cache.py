@@ -0,0 +1,57 @@
+from app.page_cache import PageCache, page_cache  # Import the page cache
+
+def test_lru_eviction_and_invalidation():
+    """
+    Test that the cache evicts the least recently used page and drops every page on a write.
+    """
+    cache = PageCache(max_entries=2)
+    renders = []
+
+    def render(name):
+        renders.append(name)
+        return f"<p>{name}</p>"
+
+    cache.get_or_render(("a",), lambda: render("a"))
+    cache.get_or_render(("b",), lambda: render("b"))
+    assert cache.get_or_render(("a",), lambda: render("a")) == "<p>a</p>"  # Check a hit, which makes "a" the most recently used page
+    cache.get_or_render(("c",), lambda: render("c"))
+    cache.get_or_render(("b",), lambda: render("b"))
+    assert renders == ["a", "b", "c", "b"]  # Check the least recently used page was evicted
+    assert cache.stats()["evictions"] == 2  # Check the evictions are counted
+
+    etag = cache.etag(("a",))
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0  # Check every page was dropped
+    assert cache.etag(("a",)) != etag  # Check the ETag changes with the data version
+
+    small = PageCache(max_bytes=20)
+    small.get_or_render(("a",), lambda: "x" * 15)
+    small.get_or_render(("b",), lambda: "y" * 15)
+    assert small.stats()["entries"] == 1 and small.stats()["size"] == 15  # Check the size bound
+
+def test_home_etag(test_client, test_db):
+    """
+    Test that an unchanged home page is answered with 304 and a write serves a fresh page.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    response = test_client.get("/")
+    etag = response.headers["etag"]
+    assert response.status_code == 200 and response.headers["cache-control"] == "no-cache"  # Check the page is revalidated
+
+    hits = page_cache.stats()["hits"]
+    assert test_client.get("/").text == response.text  # Check the cached page is served
+    assert page_cache.stats()["hits"] == hits + 1  # Check the page came from the cache
+
+    response = test_client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["etag"] == etag  # Check the unchanged page is not sent again
+
+    test_client.get("/", params={"tax_rate": 55})
+    assert page_cache.stats()["hits"] == hits + 2  # Check the other page reused the cached totals
+
+    test_client.post("/submit/", data={"income": 4321, "expenses": 1234, "tax_rate": 24, "description": "Cached page"})
+    response = test_client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag  # Check the write invalidated the page
+    assert "Cached page" in response.text and "4321.0" in response.text  # Check the new entry and totals are shown
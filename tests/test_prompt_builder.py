@@ -0,0 +1,58 @@
+import asyncio  # Import asyncio to run the advice coroutine
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app import prompt_builder  # Import the prompt builder module
+from app.advice import get_advice  # Import the advice function
+from app.bulk import ingest_rows  # Import the bulk insert used to seed entries
+from app.prompt_builder import build_advice_prompt, estimate_tokens  # Import the prompt builder
+
+def test_empty_table(test_db: Session):
+    """
+    Test that no prompt is built without entries.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    assert build_advice_prompt(test_db) is None  # Check no prompt is built
+
+def test_detailed_and_summary_prompts(test_db: Session, monkeypatch):
+    """
+    Test that small tables are listed entry by entry and larger ones are summarized.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to lower the detail limit.
+    """
+    ingest_rows(test_db, [
+        {"income": 1000 * i, "expenses": 100 * i, "tax_rate": (10, 24)[i % 2]} for i in range(1, 31)
+    ])
+
+    advice_prompt = build_advice_prompt(test_db)
+    assert advice_prompt.mode == "detailed"  # Check a small table is listed
+    assert advice_prompt.text.count("Entry ") == 30  # Check every entry is in the prompt
+
+    monkeypatch.setattr(prompt_builder, "DETAIL_MAX_ROWS", 10)
+    advice_prompt = build_advice_prompt(test_db)
+    assert advice_prompt.mode == "summary"  # Check a larger table is summarized
+    assert "Entries: 30" in advice_prompt.text  # Check the overall totals
+    assert "Tax Rate 10.0%: 15 entries" in advice_prompt.text  # Check the totals per tax rate
+    assert "Income 10000 to 25000: 15 entries" in advice_prompt.text  # Check the income bands
+    assert "Large income: Entry" in advice_prompt.text  # Check the largest entries
+
+def test_map_reduce_prompt(test_db: Session, monkeypatch, fake_openai):
+    """
+    Test that a summary over the token budget is split into chunks summarized separately.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        monkeypatch (MonkeyPatch): Pytest fixture used to lower the detail limit.
+        fake_openai (list): The calls made to the OpenAI stub.
+    """
+    monkeypatch.setattr(prompt_builder, "DETAIL_MAX_ROWS", 10)
+    advice_prompt = build_advice_prompt(test_db, budget=100)
+    assert advice_prompt.mode == "map-reduce"  # Check the summary is split
+    assert len(advice_prompt.chunks) > 1  # Check there are several chunks
+    assert all(estimate_tokens(chunk) <= 100 for chunk in advice_prompt.chunks)  # Check every chunk fits the budget
+
+    asyncio.run(get_advice(advice_prompt))
+    assert len(fake_openai) == len(advice_prompt.chunks) + 1  # Check one call per chunk and one for the advice
+    assert "Part 1: Advice" in fake_openai[-1]["messages"][-1]["content"]  # Check the advice uses the chunk summaries
@@ -0,0 +1,130 @@
+import threading  # Import threading to check where the notifications run
+import pytest  # Import pytest for the fixtures
+from fastapi.testclient import TestClient  # Import the test client
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.advice_cache import AdviceCache  # Import the advice cache
+from app.changes import DATA_VERSION, _listeners, on_data_change, sync_data_changes, use_shared_cache  # Import the change bus
+from app.main import app  # Import the FastAPI application
+from app.page_cache import PageCache, page_cache  # Import the page cache
+from app.shared_cache import SQLiteSharedCache, create_shared_cache  # Import the shared cache
+
+@pytest.fixture
+def shared(tmp_path):
+    """
+    Pytest fixture to share a SQLite cache between the caches of the test.
+
+    Args:
+        tmp_path (Path): Pytest fixture providing a temporary directory.
+
+    Yields:
+        SQLiteSharedCache: The shared cache, as seen by another worker.
+    """
+    path = str(tmp_path / "shared.sqlite")
+    use_shared_cache(SQLiteSharedCache(path))
+    try:
+        yield SQLiteSharedCache(path)
+    finally:
+        use_shared_cache(None)
+
+def test_sqlite_shared_cache(tmp_path):
+    """
+    Test the values and version counters of the SQLite shared cache.
+
+    Args:
+        tmp_path (Path): Pytest fixture providing a temporary directory.
+    """
+    cache = create_shared_cache(f"sqlite:///{tmp_path / 'shared.sqlite'}")
+    other = SQLiteSharedCache(cache.path)
+    cache.set("a", "value", ttl=60)
+    cache.set("b", "expired", ttl=-1)
+    assert (other.get("a"), other.get("b"), other.get("c")) == ("value", None, None)  # Check the values are shared and expire
+
+    version = cache.get_version("data")
+    assert other.get_version("data") == version  # Check the counter is created once
+    assert other.bump_version("data") == version + 1 and cache.get_version("data") == version + 1  # Check the increments are shared
+    with pytest.raises(ValueError):
+        create_shared_cache("memcached://localhost")
+
+def test_page_cache_shared(shared: SQLiteSharedCache):
+    """
+    Test that the workers share the rendered pages and their ETags, and see each other's writes.
+
+    Args:
+        shared (SQLiteSharedCache): The shared cache, as seen by another worker.
+    """
+    first, second = PageCache(), PageCache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f"<p>{len(renders)}</p>"
+
+    assert first.get_or_render(("a",), render) == "<p>1</p>"
+    assert second.get_or_render(("a",), render) == "<p>1</p>"  # Check the page rendered by the other worker is served
+    assert len(renders) == 1 and second.stats()["shared_hits"] == 1  # Check it came from the shared cache
+    assert first.etag(("a",)) == second.etag(("a",))  # Check the workers issue the same ETag
+
+    etag = first.etag(("a",))
+    shared.bump_version(DATA_VERSION)
+    assert first.etag(("a",)) != etag  # Check a write of another worker changes the ETag
+    assert second.get_or_render(("a",), render) == "<p>2</p>"  # Check the page is rendered again from the new data
+
+def test_home_sees_other_worker_writes(test_client, test_db: Session, shared: SQLiteSharedCache):
+    """
+    Test that the home page of a worker is not served from its cache after another worker wrote.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        shared (SQLiteSharedCache): The shared cache, as seen by another worker.
+    """
+    response = test_client.get("/")
+    etag = response.headers["etag"]
+    assert test_client.get("/", headers={"If-None-Match": etag}).status_code == 304  # Check the page is unchanged
+
+    version = sync_data_changes()
+    test_client.post("/submit/", data={"income": 5555, "expenses": 55, "tax_rate": 24})
+    assert sync_data_changes() == version + 1  # Check a write increments the shared version
+
+    # Another worker writes the same way: it commits, then increments the shared version
+    hits = page_cache.stats()["hits"]
+    shared.bump_version(DATA_VERSION)
+    response = test_client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag  # Check the page is sent again
+    assert "5555.0" in response.text and page_cache.stats()["hits"] == hits  # Check it was not served from the cache
+
+def test_advice_cache_shared(shared: SQLiteSharedCache):
+    """
+    Test that advice completed by one worker is served by the others.
+
+    Args:
+        shared (SQLiteSharedCache): The shared cache, as seen by another worker.
+    """
+    first, second = AdviceCache(), AdviceCache()
+    key = AdviceCache.make_key("model", "prompt")
+    first.set(key, "Keep your receipts.")
+    first.clear()
+    assert second.get(key) == "Keep your receipts."  # Check the advice is shared and survives a clear
+    assert second.get(key) == "Keep your receipts."
+    assert second.stats()["shared_hits"] == 1 and second.stats()["hits"] == 1  # Check the advice is kept in memory after
+
+def test_async_routes_notify_off_the_loop(test_client, test_db: Session):
+    """
+    Test that the async write routes notify the caches from the threadpool, not the event loop.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    threads = []
+    listener = on_data_change(lambda: threads.append(threading.current_thread()))
+    try:
+        with TestClient(app) as client:
+            loop_thread = client.portal.call(threading.current_thread)
+            client.post("/submit/", data={"income": 10, "expenses": 1, "tax_rate": 24})
+            client.post("/bulk/", json=[{"income": 10, "expenses": 1}])
+            client.post("/bulk/", content='{"income": 10, "expenses": 1}', headers={"content-type": "application/x-ndjson"})
+    finally:
+        _listeners.remove(listener)
+    assert len(threads) == 3  # Check every write notified the caches
+    assert loop_thread not in threads  # Check no notification ran on the event loop
@@ -0,0 +1,55 @@
+import numpy as np  # Import NumPy for the test arrays
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.models import TaxInfo  # Import the TaxInfo model
+from app.tax import compute_tax_amount  # Import the per-entry tax calculation
+from app.tax_engine import compute_tax_amounts, progressive_tax, round_amounts  # Import the vectorized engine
+
+def test_compute_tax_amounts_matches_per_entry():
+    """
+    Test that the vectorized tax matches the per-entry calculation exactly, half cents included.
+    """
+    generator = np.random.default_rng(0)
+    expenses = np.round(generator.uniform(0, 100000, 100000), 2)
+    expenses[:1000] = np.arange(1000) / 100  # Small amounts, where half cents are frequent
+    rates = generator.choice([0, 5, 12.5, 17, 24, 33.3, 99.99], len(expenses))
+
+    expected = [compute_tax_amount(e, r) for e, r in zip(expenses.tolist(), rates.tolist())]
+    assert compute_tax_amounts(expenses, rates).tolist() == expected  # Check every amount is identical
+    assert round_amounts(np.array([1.005, 2.675, 0.125, -0.125, 1e16])).tolist() == [
+        round(1.005, 2), round(2.675, 2), round(0.125, 2), round(-0.125, 2), 1e16
+    ]  # Check values close to half a cent round like round()
+
+def test_progressive_tax():
+    """
+    Test that every rate of a progressive schedule applies to its own bracket.
+    """
+    brackets = [(10000, 0), (40000, 20), (None, 40)]
+    tax = progressive_tax(np.array([5000, 10000, 25000, 100000]), brackets)
+    assert tax.tolist() == [0, 0, 3000, 30000]  # Check 20% of 10k-40k and 40% above 40k
+
+def test_tax_scenario_route(test_client, test_db: Session):
+    """
+    Test the scenario totals route with a flat rate, rate changes and brackets.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    for expenses, rate in ((1000, 24), (2000, 24), (500, 10)):
+        test_client.post("/submit/", data={"income": 10000, "expenses": expenses, "tax_rate": rate})
+
+    response = test_client.post("/tax_scenarios/", json={"rate_changes": {"24": 30}})
+    assert response.status_code == 200  # Check if the status code is 200
+    totals = response.json()
+    assert totals["entry_count"] == 3 and totals["total_expenses"] == 3500  # Check the totals of the entries
+    assert totals["current_tax"] == 770 and totals["scenario_tax"] == 950  # Check 30% instead of 24% on 3000
+    assert totals["difference"] == 180  # Check the difference
+    assert [row["scenario_tax"] for row in totals["breakdown"]] == [50, 900]  # Check the tax per rate
+
+    response = test_client.post("/tax_scenarios/", json={"base": "income", "brackets": [{"up_to": 5000, "rate": 0}, {"rate": 10}]})
+    assert response.json()["scenario_tax"] == 1500  # Check 10% of the income above 5000 for every entry
+
+    response = test_client.post("/tax_scenarios/", json={"brackets": [{"rate": 10}, {"up_to": 5000, "rate": 0}]})
+    assert response.status_code == 422  # Check brackets out of order are rejected
+
+    assert test_db.query(TaxInfo).filter(TaxInfo.tax_rate == 30).count() == 0  # Check the entries are unchanged
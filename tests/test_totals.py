@@ -0,0 +1,83 @@
+from sqlalchemy import create_engine, insert  # Import the engine factory and insert statement
+from sqlalchemy.orm import Session  # Import SQLAlchemy session
+from app.migrations import run_migrations  # Import the migrations
+from app.models import TaxInfo, TaxTotals  # Import the models
+from app.totals import get_totals, rebuild_totals, verify_totals  # Import the totals helpers
+
+def test_totals_follow_write_routes(test_client, test_db: Session):
+    """
+    Test that the running totals are updated by the submit, delete and clear routes.
+
+    This test submits entries with two different tax rates, checks the totals and the
+    per tax rate breakdown, deletes one entry and finally clears all entries.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    test_client.post("/submit/", data={"income": 1000, "expenses": 200, "tax_rate": 24, "description": "Totals 1"})
+    test_client.post("/submit/", data={"income": 500, "expenses": 100, "tax_rate": 10, "description": "Totals 2"})
+
+    totals = get_totals(test_db)
+    assert totals["total_income"] == 1500  # Check the total income
+    assert totals["total_expenses"] == 300  # Check the total expenses
+    assert totals["total_tax"] == round(200 * 0.24 + 100 * 0.10, 2)  # Check the total tax
+    assert [row["tax_rate"] for row in totals["breakdown"]] == [10, 24]  # Check the breakdown rates
+    assert verify_totals(test_db) == []  # Check the aggregate matches the entries
+
+    # Delete the 10% entry, its totals row should disappear
+    entry = test_db.query(TaxInfo).filter_by(description="Totals 2").first()
+    test_client.post(f"/delete/{entry.id}")
+    test_db.expire_all()
+    totals = get_totals(test_db)
+    assert totals["total_income"] == 1000  # Check the remaining income
+    assert [row["tax_rate"] for row in totals["breakdown"]] == [24]  # Check the remaining rates
+
+    # Clear everything, the totals should be empty
+    test_client.post("/clear_all/")
+    test_db.expire_all()
+    assert get_totals(test_db)["entry_count"] == 0  # Check no entries remain in the totals
+    assert test_db.query(TaxTotals).count() == 0  # Check the totals table is empty
+
+def test_rebuild_totals(test_db: Session):
+    """
+    Test verifying and rebuilding the running totals after entries were written directly.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    # Add entries without going through the routes, leaving the totals stale
+    test_db.add_all([
+        TaxInfo(income=1000, expenses=300, tax_amount=72, tax_rate=24, description="Rebuild 1"),
+        TaxInfo(income=1500, expenses=400, tax_amount=96, tax_rate=24, description="Rebuild 2")
+    ])
+    test_db.commit()
+    assert verify_totals(test_db) != []  # Check the stale totals are detected
+
+    rebuild_totals(test_db)
+    assert verify_totals(test_db) == []  # Check the rebuilt totals are consistent
+    assert get_totals(test_db)["total_tax"] == 168  # Check the rebuilt total tax
+
+def test_migrations_fill_totals(tmp_path):
+    """
+    Test that migrating a database whose entries predate the totals table computes its totals.
+
+    Args:
+        tmp_path (Path): Pytest fixture providing a temporary directory.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'upgrade.sqlite'}")
+    # A database of the first version of the application only has the entries table
+    TaxInfo.__table__.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(TaxInfo.__table__), [{"income": 1000, "expenses": 500, "tax_amount": 50, "tax_rate": 10}])
+
+    run_migrations(engine)
+    with Session(engine) as db:
+        totals = get_totals(db)
+        assert (totals["total_income"], totals["total_expenses"], totals["total_tax"]) == (1000, 500, 50)  # Check the totals of the existing entry
+        assert verify_totals(db) == []  # Check the totals match the entries
+
+    run_migrations(engine)
+    with Session(engine) as db:
+        assert get_totals(db)["entry_count"] == 1  # Check running the migrations again does not count the entry twice
+    engine.dispose()
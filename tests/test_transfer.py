@@ -0,0 +1,131 @@
+import csv  # Import csv to read the exported CSV
+import io  # Import io to read the exported files
+import json  # Import json to read the exported NDJSON
+import sys  # Import sys to pass the command line arguments
+import pyarrow.parquet as pq  # Import pyarrow to read the exported Parquet files
+import pytest  # Import pytest to check the export errors
+from sqlalchemy.orm import Session, sessionmaker  # Import SQLAlchemy session and session factory
+from app import database, migrations, totals, transfer  # Import the modules used by the command line tools
+from app.changes import DATA_VERSION, use_shared_cache  # Import the change bus
+from app.models import TaxInfo  # Import the TaxInfo model
+from app.shared_cache import SQLiteSharedCache  # Import the shared cache
+from app.totals import verify_totals  # Import the totals verification
+from app.transfer import export_file, import_file  # Import the file export and import of the command line tool
+
+ENTRIES = [
+    {"income": 5000, "expenses": 1500, "tax_rate": 24, "description": "Export 1"},
+    {"income": 300, "expenses": 100.5, "tax_rate": 10, "description": None},
+    {"income": 800, "expenses": 200, "tax_rate": 24, "description": "Export, \"quoted\""},
+]
+
+def test_export_formats(test_client, test_db: Session):
+    """
+    Test exporting the entries as CSV, NDJSON and Parquet, with the same rows in every format.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+    """
+    test_client.post("/bulk/", json=ENTRIES)
+    expected = [(e.id, e.income, e.expenses, e.tax_amount, e.tax_rate, e.description) for e in test_db.query(TaxInfo).order_by(TaxInfo.id)]
+
+    response = test_client.get("/export/", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"  # Check the media type
+    assert 'filename="tax_entries.ndjson"' in response.headers["content-disposition"]  # Check the file name
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [tuple(row.values()) for row in rows] == expected  # Check every entry is exported in ID order
+
+    response = test_client.get("/export/", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["description"] for row in rows] == ["Export 1", "", "Export, \"quoted\""]  # Check the CSV quoting
+
+    response = test_client.get("/export/", params={"format": "parquet"})
+    table = pq.read_table(io.BytesIO(response.content))
+    assert [tuple(row.values()) for row in table.to_pylist()] == expected  # Check the Parquet rows and types
+
+    response = test_client.get("/export/", params={"format": "parquet", "tax_rate": 10})
+    assert pq.read_table(io.BytesIO(response.content)).num_rows == 1  # Check the filters apply to the export
+
+    assert test_client.get("/export/", params={"format": "xml"}).status_code == 422  # Check unknown formats are rejected
+
+def test_import_round_trip(test_client, test_db: Session, tmp_path):
+    """
+    Test importing exported files through the bulk route and the command line import.
+
+    Args:
+        test_client (TestClient): A test client for making requests to the FastAPI application.
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        tmp_path (Path): A temporary directory provided by pytest.
+    """
+    parquet = test_client.get("/export/", params={"format": "parquet"}).content
+    count = test_db.query(TaxInfo).count()
+
+    response = test_client.post("/bulk/", content=parquet, headers={"content-type": "application/vnd.apache.parquet"})
+    assert response.json() == {"inserted": count, "errors": []}  # Check the Parquet body is imported
+
+    response = test_client.post("/bulk/", files={"file": ("entries.parquet", parquet, "application/octet-stream")})
+    assert response.json()["inserted"] == count  # Check the Parquet upload is imported
+
+    response = test_client.post("/bulk/", content=b"not parquet", headers={"content-type": "application/vnd.apache.parquet"})
+    assert response.status_code == 400  # Check invalid Parquet files are rejected
+
+    path = tmp_path / "entries.csv"
+    path.write_bytes(test_client.get("/export/", params={"format": "csv"}).content + b"1,-5,1,0,24,\n")
+    result = import_file(test_db, str(path), chunk_size=2)
+    assert result["inserted"] == 3 * count  # Check the CSV file is imported
+    assert result["errors"] == [{"row": 3 * count + 1, "detail": "Income must be a positive number"}]  # Check the validation applies
+
+    assert test_db.query(TaxInfo).filter_by(description="Export 1").count() == 6  # Check every import inserted the entries
+    assert verify_totals(test_db) == []  # Check the running totals include every import
+
+def test_command_line_writes_notify_workers(test_db: Session, tmp_path, monkeypatch):
+    """
+    Test that the command line import and totals rebuild increment the shared data version.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        tmp_path (Path): A temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Pytest fixture used to point the commands at the test database.
+    """
+    session_factory = sessionmaker(bind=test_db.get_bind())
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    monkeypatch.setattr(totals, "SessionLocal", session_factory)
+    monkeypatch.setattr(migrations, "RUN_MIGRATIONS", False)
+    path = tmp_path / "entries.csv"
+    path.write_text("income,expenses,tax_rate,description\n100,10,24,Command line\n")
+
+    worker = SQLiteSharedCache(str(tmp_path / "shared.sqlite"))
+    use_shared_cache(SQLiteSharedCache(worker.path))
+    try:
+        version = worker.get_version(DATA_VERSION)
+        monkeypatch.setattr(sys, "argv", ["app.transfer", "import", str(path)])
+        transfer.main()
+        assert worker.get_version(DATA_VERSION) == version + 1  # Check the import reached the other workers
+        assert totals.main(["rebuild"]) == 0
+        assert worker.get_version(DATA_VERSION) == version + 2  # Check the rebuild reached the other workers
+    finally:
+        use_shared_cache(None)
+    assert test_db.query(TaxInfo).filter_by(description="Command line").count() == 1  # Check the entry was imported
+
+def test_export_file_errors(test_db: Session, tmp_path, monkeypatch):
+    """
+    Test that a failed export reports its own error and only removes the file it created.
+
+    Args:
+        test_db (Session): A SQLAlchemy session connected to the test database.
+        tmp_path (Path): A temporary directory provided by pytest.
+        monkeypatch (MonkeyPatch): Pytest fixture used to make the export fail midway.
+    """
+    with pytest.raises(FileNotFoundError) as error:
+        export_file(test_db, str(tmp_path / "missing" / "entries.csv"))
+    assert error.value.__context__ is None  # Check the error of the open is not hidden by the cleanup
+
+    def failing_export(db, export_format):
+        yield b"income,expenses\n"
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(transfer, "iter_export", failing_export)
+    path = tmp_path / "entries.csv"
+    with pytest.raises(RuntimeError):
+        export_file(test_db, str(path))
+    assert not path.exists()  # Check the truncated file is removed
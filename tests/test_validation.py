@@ -1,6 +1,6 @@
 import pytest  # Import pytest for testing
 from fastapi import HTTPException  # Import HTTPException for exception handling
-from app.validation import validate_income, validate_expenses  # Import validation functions
+from app.validation import validate_income, validate_expenses, validate_entries  # Import validation functions
 
 def test_validate_income_positive():
     """
@@ -39,3 +39,20 @@ def test_validate_expenses_negative():
     """
     with pytest.raises(HTTPException):  # Check if HTTPException is raised
         validate_expenses(-100.0)  # Validate negative expenses
+
+def test_validate_entries():
+    """
+    Test validate_entries function with a batch containing invalid values.
+
+    This test ensures that validate_entries reports every invalid entry once, with
+    the same message as the single entry validation functions.
+    """
+    errors = validate_entries([
+        {"income": 100.0, "expenses": 10.0},
+        {"income": -1.0, "expenses": -1.0},
+        {"income": 5.0, "expenses": -2.0},
+    ])
+    assert errors == {1: "Income must be a positive number", 2: "Expenses must be a positive number"}  # Check the reported entries
+    assert validate_entries([{"income": 1.0, "expenses": 1.0}]) == {}  # Check a valid batch has no errors
+    errors = validate_entries([{"income": float("nan"), "expenses": 1.0}, {"income": 1.0, "expenses": float("inf")}])
+    assert errors == {0: "Income must be a finite number", 1: "Expenses must be a finite number"}  # Check non-finite values are reported